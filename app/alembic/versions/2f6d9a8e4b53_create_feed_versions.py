@@ -0,0 +1,37 @@
+"""Create feed version sequence and feed_versions table
+
+Revision ID: 2f6d9a8e4b53
+Revises: e9a4b6f1c027
+Create Date: 2024-10-10 10:05:36.774920
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "2f6d9a8e4b53"
+down_revision: Union[str, None] = "e9a4b6f1c027"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(sa.schema.CreateSequence(sa.Sequence("feed_version_seq")))
+    op.create_table(
+        "feed_versions",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("version", sa.BigInteger(), server_default="1", nullable=False),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["users.id"],
+        ),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("feed_versions")
+    op.execute(sa.schema.DropSequence(sa.Sequence("feed_version_seq")))
@@ -0,0 +1,175 @@
+"""Partition tweets by id range and likes by tweet_id hash
+
+Revision ID: 4d7b2c9e6f18
+Revises: 8c1e4f7a2d90
+Create Date: 2024-10-12 14:37:05.118342
+
+Таблицы пересоздаются секционированными и данные копируются, на время
+миграции запись в tweets и likes блокируется. Диапазоны id для tweets,
+а не created_at: на tweets.id ссылаются внешние ключи, а уникальный ключ
+секционированной таблицы должен включать ключ секционирования
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+from config import LIKES_PARTITIONS, TWEETS_PARTITION_SIZE, TWEETS_PARTITIONS_AHEAD
+
+# revision identifiers, used by Alembic.
+revision: str = "4d7b2c9e6f18"
+down_revision: Union[str, None] = "8c1e4f7a2d90"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("LOCK TABLE tweets, likes, comments IN EXCLUSIVE MODE")
+
+    # Старые таблицы освобождают имена таблиц, ограничений и индексов
+    op.execute("ALTER TABLE likes DROP CONSTRAINT likes_tweet_id_fkey")
+    op.execute("ALTER TABLE comments DROP CONSTRAINT comments_tweet_id_fkey")
+    op.execute("ALTER TABLE tweets RENAME TO tweets_old")
+    op.execute(
+        "ALTER TABLE tweets_old RENAME CONSTRAINT tweets_pkey TO tweets_old_pkey"
+    )
+    op.execute("DROP INDEX ix_tweets_score_id, ix_tweets_created_at")
+    op.execute("ALTER TABLE likes RENAME TO likes_old")
+    op.execute("ALTER TABLE likes_old RENAME CONSTRAINT likes_pkey TO likes_old_pkey")
+    op.execute("ALTER TABLE likes_old DROP CONSTRAINT uq_user_tweet")
+    op.execute("DROP INDEX ix_likes_tweet_id_id")
+
+    op.execute(
+        """
+        CREATE TABLE tweets (
+            id integer NOT NULL DEFAULT nextval('tweets_id_seq'),
+            user_id integer NOT NULL REFERENCES users (id),
+            text varchar NOT NULL,
+            my_array integer[],
+            created_at timestamptz NOT NULL DEFAULT now(),
+            score double precision NOT NULL DEFAULT 0,
+            CONSTRAINT tweets_pkey PRIMARY KEY (id)
+        ) PARTITION BY RANGE (id)
+        """
+    )
+    op.execute("ALTER SEQUENCE tweets_id_seq OWNED BY tweets.id")
+
+    max_id = (
+        op.get_bind()
+        .exec_driver_sql(
+            "SELECT greatest((SELECT coalesce(max(id), 0) FROM tweets_old), "
+            "(SELECT last_value FROM tweets_id_seq))"
+        )
+        .scalar()
+    )
+    upper = (max_id // TWEETS_PARTITION_SIZE + 1 + TWEETS_PARTITIONS_AHEAD) * (
+        TWEETS_PARTITION_SIZE
+    )
+    for lower in range(0, upper, TWEETS_PARTITION_SIZE):
+        op.execute(
+            f"CREATE TABLE tweets_from_{lower} PARTITION OF tweets "
+            f"FOR VALUES FROM ({lower}) TO ({lower + TWEETS_PARTITION_SIZE})"
+        )
+
+    op.execute(
+        "INSERT INTO tweets (id, user_id, text, my_array, created_at, score) "
+        "SELECT id, user_id, text, my_array, created_at, score FROM tweets_old"
+    )
+    op.execute("CREATE INDEX ix_tweets_score_id ON tweets (score DESC, id)")
+    op.execute("CREATE INDEX ix_tweets_created_at ON tweets (created_at DESC)")
+
+    op.execute(
+        """
+        CREATE TABLE likes (
+            id integer NOT NULL DEFAULT nextval('likes_id_seq'),
+            user_id integer NOT NULL REFERENCES users (id),
+            tweet_id integer NOT NULL REFERENCES tweets (id),
+            created_at timestamptz NOT NULL DEFAULT now(),
+            CONSTRAINT likes_pkey PRIMARY KEY (id, tweet_id),
+            CONSTRAINT uq_user_tweet UNIQUE (user_id, tweet_id)
+        ) PARTITION BY HASH (tweet_id)
+        """
+    )
+    op.execute("ALTER SEQUENCE likes_id_seq OWNED BY likes.id")
+    for remainder in range(LIKES_PARTITIONS):
+        op.execute(
+            f"CREATE TABLE likes_p{remainder} PARTITION OF likes "
+            f"FOR VALUES WITH (MODULUS {LIKES_PARTITIONS}, REMAINDER {remainder})"
+        )
+
+    op.execute(
+        "INSERT INTO likes (id, user_id, tweet_id, created_at) "
+        "SELECT id, user_id, tweet_id, created_at FROM likes_old"
+    )
+    op.execute("CREATE INDEX ix_likes_tweet_id_id ON likes (tweet_id, id)")
+
+    op.execute(
+        "ALTER TABLE comments ADD CONSTRAINT comments_tweet_id_fkey "
+        "FOREIGN KEY (tweet_id) REFERENCES tweets (id)"
+    )
+    op.execute("DROP TABLE likes_old")
+    op.execute("DROP TABLE tweets_old")
+    op.execute("ANALYZE tweets")
+    op.execute("ANALYZE likes")
+
+
+def downgrade() -> None:
+    op.execute("LOCK TABLE tweets, likes, comments IN EXCLUSIVE MODE")
+
+    op.execute("ALTER TABLE comments DROP CONSTRAINT comments_tweet_id_fkey")
+    op.execute("ALTER TABLE likes RENAME TO likes_old")
+    op.execute("ALTER TABLE likes_old RENAME CONSTRAINT likes_pkey TO likes_old_pkey")
+    op.execute("ALTER TABLE likes_old DROP CONSTRAINT uq_user_tweet")
+    op.execute("DROP INDEX ix_likes_tweet_id_id")
+    op.execute("ALTER TABLE tweets RENAME TO tweets_old")
+    op.execute(
+        "ALTER TABLE tweets_old RENAME CONSTRAINT tweets_pkey TO tweets_old_pkey"
+    )
+    op.execute("DROP INDEX ix_tweets_score_id, ix_tweets_created_at")
+
+    op.execute(
+        """
+        CREATE TABLE tweets (
+            id integer NOT NULL DEFAULT nextval('tweets_id_seq'),
+            user_id integer NOT NULL REFERENCES users (id),
+            text varchar NOT NULL,
+            my_array integer[],
+            created_at timestamptz NOT NULL DEFAULT now(),
+            score double precision NOT NULL DEFAULT 0,
+            CONSTRAINT tweets_pkey PRIMARY KEY (id)
+        )
+        """
+    )
+    op.execute("ALTER SEQUENCE tweets_id_seq OWNED BY tweets.id")
+    op.execute(
+        "INSERT INTO tweets (id, user_id, text, my_array, created_at, score) "
+        "SELECT id, user_id, text, my_array, created_at, score FROM tweets_old"
+    )
+    op.execute("CREATE INDEX ix_tweets_score_id ON tweets (score DESC, id)")
+    op.execute("CREATE INDEX ix_tweets_created_at ON tweets (created_at DESC)")
+
+    op.execute(
+        """
+        CREATE TABLE likes (
+            id integer NOT NULL DEFAULT nextval('likes_id_seq'),
+            user_id integer NOT NULL REFERENCES users (id),
+            tweet_id integer NOT NULL REFERENCES tweets (id),
+            created_at timestamptz NOT NULL DEFAULT now(),
+            CONSTRAINT likes_pkey PRIMARY KEY (id),
+            CONSTRAINT uq_user_tweet UNIQUE (user_id, tweet_id)
+        )
+        """
+    )
+    op.execute("ALTER SEQUENCE likes_id_seq OWNED BY likes.id")
+    op.execute(
+        "INSERT INTO likes (id, user_id, tweet_id, created_at) "
+        "SELECT id, user_id, tweet_id, created_at FROM likes_old"
+    )
+    op.execute("CREATE INDEX ix_likes_tweet_id_id ON likes (tweet_id, id)")
+
+    op.execute(
+        "ALTER TABLE comments ADD CONSTRAINT comments_tweet_id_fkey "
+        "FOREIGN KEY (tweet_id) REFERENCES tweets (id)"
+    )
+    op.execute("DROP TABLE likes_old")
+    op.execute("DROP TABLE tweets_old")
@@ -0,0 +1,25 @@
+"""Add likes (tweet_id, id) index
+
+Revision ID: 8c1e4f7a2d90
+Revises: 2f6d9a8e4b53
+Create Date: 2024-10-11 09:12:48.301554
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8c1e4f7a2d90"
+down_revision: Union[str, None] = "2f6d9a8e4b53"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_likes_tweet_id_id", "likes", ["tweet_id", "id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_likes_tweet_id_id", table_name="likes")
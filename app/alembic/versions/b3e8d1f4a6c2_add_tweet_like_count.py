@@ -0,0 +1,34 @@
+"""Add tweets.like_count
+
+Revision ID: b3e8d1f4a6c2
+Revises: 4d7b2c9e6f18
+Create Date: 2024-10-14 16:02:11.480297
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b3e8d1f4a6c2"
+down_revision: Union[str, None] = "4d7b2c9e6f18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "tweets",
+        sa.Column("like_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.execute(
+        "UPDATE tweets SET like_count = counts.likes "
+        "FROM (SELECT tweet_id, count(*) AS likes FROM likes GROUP BY tweet_id) counts "
+        "WHERE tweets.id = counts.tweet_id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("tweets", "like_count")
@@ -0,0 +1,66 @@
+"""Add created_at to tweets, likes, followers and tweet score
+
+Revision ID: c41d7e2a9b10
+Revises: 7a5e055239d5
+Create Date: 2024-10-02 12:10:41.318204
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c41d7e2a9b10"
+down_revision: Union[str, None] = "7a5e055239d5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("tweets", "likes", "followers")
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        op.add_column(
+            table,
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=True),
+        )
+
+    # Backfill: истинное время создания старых записей неизвестно,
+    # лайки и подписки не могут быть старше связанного твита
+    op.execute("UPDATE tweets SET created_at = now()")
+    op.execute(
+        "UPDATE likes SET created_at = tweets.created_at "
+        "FROM tweets WHERE tweets.id = likes.tweet_id"
+    )
+    op.execute("UPDATE followers SET created_at = now()")
+
+    for table in TABLES:
+        op.alter_column(
+            table, "created_at", nullable=False, server_default=sa.text("now()")
+        )
+
+    op.add_column(
+        "tweets",
+        sa.Column("score", sa.Float(), server_default="0", nullable=False),
+    )
+    op.execute(
+        "UPDATE tweets SET score = ("
+        "SELECT count(likes.id) FROM likes WHERE likes.tweet_id = tweets.id"
+        ") / power(extract(epoch FROM now() - tweets.created_at) / 3600 + 2, 1.5)"
+    )
+    op.create_index(
+        "ix_tweets_score_id", "tweets", [sa.text("score DESC"), "id"], unique=False
+    )
+    op.create_index(
+        "ix_tweets_created_at", "tweets", [sa.text("created_at DESC")], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_tweets_created_at", table_name="tweets")
+    op.drop_index("ix_tweets_score_id", table_name="tweets")
+    op.drop_column("tweets", "score")
+    for table in TABLES:
+        op.drop_column(table, "created_at")
@@ -0,0 +1,55 @@
+"""Create tweet_media table and add medias.created_at
+
+Revision ID: d7a2c5e8f391
+Revises: b3e8d1f4a6c2
+Create Date: 2024-10-15 12:21:37.904516
+
+Ссылки заполняются из tweets.my_array. Уже загруженные медиа получают
+created_at на момент миграции, поэтому период ожидания сборщика
+отсчитывается от нее
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d7a2c5e8f391"
+down_revision: Union[str, None] = "b3e8d1f4a6c2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "medias",
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+    )
+    op.create_table(
+        "tweet_media",
+        sa.Column("tweet_id", sa.Integer(), nullable=False),
+        sa.Column("position", sa.Integer(), nullable=False),
+        sa.Column("media_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["tweet_id"], ["tweets.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("tweet_id", "position"),
+    )
+    op.execute(
+        "INSERT INTO tweet_media (tweet_id, position, media_id) "
+        "SELECT t.id, a.position, a.media_id FROM tweets t "
+        "CROSS JOIN unnest(t.my_array) WITH ORDINALITY AS a(media_id, position) "
+        "WHERE a.media_id IS NOT NULL"
+    )
+    op.create_index("ix_tweet_media_media_id", "tweet_media", ["media_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_tweet_media_media_id", table_name="tweet_media")
+    op.drop_table("tweet_media")
+    op.drop_column("medias", "created_at")
@@ -0,0 +1,41 @@
+"""Create user_suggestions table
+
+Revision ID: e9a4b6f1c027
+Revises: 5b8f0c3d2e71
+Create Date: 2024-10-07 11:48:52.204166
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e9a4b6f1c027"
+down_revision: Union[str, None] = "5b8f0c3d2e71"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_suggestions",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("rank", sa.Integer(), nullable=False),
+        sa.Column("candidate_id", sa.Integer(), nullable=False),
+        sa.Column("score", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["candidate_id"],
+            ["users.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["users.id"],
+        ),
+        sa.PrimaryKeyConstraint("user_id", "rank"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("user_suggestions")
@@ -0,0 +1,30 @@
+"""Order tweet score ties by recency
+
+Revision ID: f2b7c4d9a1e3
+Revises: d7a2c5e8f391
+Create Date: 2024-10-16 10:04:51.218377
+
+При равном рейтинге (в том числе нулевом у твитов без лайков и вне окна
+пересчета) лента показывает сначала новые твиты
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f2b7c4d9a1e3"
+down_revision: Union[str, None] = "d7a2c5e8f391"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("DROP INDEX ix_tweets_score_id")
+    op.execute("CREATE INDEX ix_tweets_score_id ON tweets (score DESC, id DESC)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX ix_tweets_score_id")
+    op.execute("CREATE INDEX ix_tweets_score_id ON tweets (score DESC, id)")
@@ -0,0 +1,87 @@
+"""
+Сессия запроса: соединение на весь запрос, отдача после каждого чтения
+и LazySession (отдача, только когда обработчик ждет не БД)
+
+    python -m benchmarks.bench_lazy_session --requests 2000 --concurrency 20
+
+Каждый запрос делает --reads чтений подряд, ждет --wait мс не БД (кэш,
+внешний сервис) и делает еще одно чтение. Печатается время на запрос,
+число выдач соединения из пула (каждая с pre-ping) и пик занятых соединений
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database import LazySession, engine, open_pool
+from src.models import User
+
+
+class PerReadSession(LazySession):
+    """Прежнее поведение: транзакция чтения завершается сразу после запроса"""
+
+    async def _run(self, method, statement=None, *args, **kwargs):
+        result = await super()._run(method, statement, *args, **kwargs)
+        await self._release_if_idle(self._generation)
+        return result
+
+
+async def handle_request(session_class, reads: int, wait: float):
+    async with session_class(bind=engine, expire_on_commit=False) as db:
+        for _ in range(reads):
+            await db.execute(select(User.id).limit(1))
+        await asyncio.sleep(wait)
+        await db.execute(select(User.id).limit(1))
+
+
+async def bench(
+    name: str, session_class, requests: int, concurrency: int, reads: int, wait: float
+):
+    stats = {"checkouts": 0, "peak": 0}
+
+    def on_checkout(*args):
+        stats["checkouts"] += 1
+        stats["peak"] = max(stats["peak"], engine.pool.checkedout())
+
+    event.listen(engine.sync_engine.pool, "checkout", on_checkout)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited():
+        async with semaphore:
+            await handle_request(session_class, reads, wait)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(limited() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    event.remove(engine.sync_engine.pool, "checkout", on_checkout)
+
+    print(
+        f"{name:<10} {elapsed / requests * 1e3:7.2f} ms/request   "
+        f"checkouts {stats['checkouts'] / requests:5.2f}/request   "
+        f"peak connections {stats['peak']}"
+    )
+
+
+async def main(requests: int, concurrency: int, reads: int, wait: float):
+    await open_pool()
+    print(f"{requests} requests, concurrency {concurrency}, {reads} reads + 1")
+    for name, session_class in (
+        ("hold", AsyncSession),
+        ("per-read", PerReadSession),
+        ("lazy", LazySession),
+    ):
+        await bench(name, session_class, requests, concurrency, reads, wait)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--reads", type=int, default=3)
+    parser.add_argument("--wait", type=float, default=5, help="мс")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.requests, args.concurrency, args.reads, args.wait / 1000))
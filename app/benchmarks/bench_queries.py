@@ -0,0 +1,117 @@
+"""
+Сравнение горячих запросов: ORM select() на каждый вызов против каталога
+src/queries.py
+
+    python -m benchmarks.bench_queries            # построение запроса + БД
+    python -m benchmarks.bench_queries --offline  # только построение, без БД
+
+Без БД замеряется то, что платится в Python на каждом вызове до похода
+в сеть: построение select() и вычисление ключа кэша компиляции.
+С БД - полный вызов через AsyncSession, включая загрузку сущностей ORM
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import select
+from src import queries
+from src.models import Follower, Like, Tweet, User
+
+
+def orm_user_by_apikey(api_key):
+    return select(User).where(User.api_key == api_key)
+
+
+def orm_tweet_by_id(tweet_id):
+    return select(Tweet).where(Tweet.id == tweet_id)
+
+
+def orm_like(tweet_id, user_id):
+    return select(Like).where(Like.tweet_id == tweet_id, Like.user_id == user_id)
+
+
+def orm_following_ids(user_id):
+    return select(Follower.followee_id).where(Follower.follower_id == user_id)
+
+
+def report(name: str, orm_seconds: float, catalog_seconds: float, iterations: int):
+    orm_us = orm_seconds / iterations * 1e6
+    catalog_us = catalog_seconds / iterations * 1e6
+    print(
+        f"{name:<22} orm {orm_us:9.1f} us   catalog {catalog_us:9.1f} us   "
+        f"saved {orm_us - catalog_us:8.1f} us/call"
+    )
+
+
+def bench_offline(iterations: int):
+    """Построение запроса и ключ кэша: то, что SQLAlchemy делает на каждом execute"""
+    cases = [
+        ("user_by_apikey", lambda: orm_user_by_apikey("test"), queries.USER_BY_API_KEY),
+        ("tweet_by_id", lambda: orm_tweet_by_id(1), queries.TWEET_BY_ID),
+        ("like", lambda: orm_like(1, 1), queries.LIKE_BY_TWEET_AND_USER),
+        ("following_ids", lambda: orm_following_ids(1), queries.FOLLOWING_IDS),
+    ]
+    print(f"offline, {iterations} iterations")
+    for name, build, statement in cases:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            build()._generate_cache_key()
+        orm_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            statement._generate_cache_key()
+        catalog_seconds = time.perf_counter() - started
+
+        report(name, orm_seconds, catalog_seconds, iterations)
+
+
+async def bench_database(iterations: int):
+    """Полный вызов через сессию на данных из БД (нужен хотя бы один лайк)"""
+    from src.database import async_session, engine
+
+    async with async_session() as db:
+        like = (await db.execute(select(Like).limit(1))).scalar()
+        if like is None:
+            raise SystemExit("no likes in the database, run /api/content/create")
+        user = (await db.execute(select(User).where(User.id == like.user_id))).scalar()
+
+        async def orm_calls():
+            (await db.execute(orm_user_by_apikey(user.api_key))).scalars().first()
+            (await db.execute(orm_tweet_by_id(like.tweet_id))).scalar()
+            (await db.execute(orm_like(like.tweet_id, user.id))).scalar()
+            (await db.execute(orm_following_ids(user.id))).scalars().all()
+
+        async def catalog_calls():
+            await queries.get_user_by_apikey(db, user.api_key)
+            await queries.get_tweet_by_id(db, like.tweet_id)
+            await queries.get_like(db, like.tweet_id, user.id)
+            await queries.get_following_ids_from_db(db, user.id)
+
+        # Прогрев: компиляция и подготовка statement в asyncpg
+        await orm_calls()
+        await catalog_calls()
+
+        print(f"database, {iterations} iterations of 4 lookups")
+        timings = {}
+        for name, calls in (("orm", orm_calls), ("catalog", catalog_calls)):
+            started = time.perf_counter()
+            for _ in range(iterations):
+                await calls()
+                db.expunge_all()
+            timings[name] = time.perf_counter() - started
+        report("4 hot lookups", timings["orm"], timings["catalog"], iterations)
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=10000)
+    parser.add_argument("--offline", action="store_true")
+    args = parser.parse_args()
+
+    bench_offline(args.iterations)
+    if not args.offline:
+        asyncio.run(bench_database(args.iterations // 10))
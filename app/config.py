@@ -7,3 +7,131 @@ load_dotenv()
 DATABASE_URL = f'postgresql+asyncpg://{os.getenv("DB_USER")}:{os.getenv("DB_PASSWORD")}@{os.getenv("DB_HOST")}:{os.getenv("DB_PORT")}/{os.getenv("DB_DB")}'
 ALEMBIC_DATABASE_URL = f'postgresql://{os.getenv("DB_USER")}:{os.getenv("DB_PASSWORD")}@{os.getenv("DB_HOST")}:{os.getenv("DB_PORT")}/{os.getenv("DB_DB")}'
 TEST_DATABASE_URL = f'postgresql+asyncpg://{os.getenv("TEST_DB_USER")}:{os.getenv("TEST_DB_PASSWORD")}@{os.getenv("TEST_DB_HOST")}:{os.getenv("TEST_DB_PORT")}/{os.getenv("TEST_DB_DB")}'
+
+# Рейтинг твитов
+SCORE_GRAVITY = float(os.getenv("SCORE_GRAVITY", 1.5))
+SCORE_REFRESH_INTERVAL = int(os.getenv("SCORE_REFRESH_INTERVAL", 300))
+SCORE_REFRESH_WINDOW_DAYS = int(os.getenv("SCORE_REFRESH_WINDOW_DAYS", 7))
+
+# Поток событий ленты (SSE)
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", 100))
+EVENTS_HEARTBEAT_INTERVAL = float(os.getenv("EVENTS_HEARTBEAT_INTERVAL", 15))
+
+# Кэш ответов: memory или redis
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_TTL = int(os.getenv("CACHE_TTL", 60))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 10000))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Пул соединений с БД
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 5))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+# Размер кэша подготовленных statement asyncpg на соединение
+DB_PREPARED_STATEMENT_CACHE_SIZE = int(
+    os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", 500)
+)
+
+# Дополнительные шарды (через запятую): твиты и лайки распределяются по user_id,
+# DATABASE_URL - шард 0 и основная БД с пользователями и подписками
+SHARD_DATABASE_URLS = [
+    url.strip()
+    for url in os.getenv("SHARD_DATABASE_URLS", "").split(",")
+    if url.strip()
+]
+
+# Сервер
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", 8000))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", 0))  # 0 - по числу CPU
+SERVER_RELOAD = os.getenv("SERVER_RELOAD", "false").lower() == "true"
+GRACEFUL_SHUTDOWN_TIMEOUT = int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", 30))
+# Адреса прокси, которым доверяются X-Forwarded-For (через запятую или "*"):
+# по ним определяется адрес клиента, в том числе для ограничения частоты запросов
+FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+# Ограничение частоты запросов по пользователю или адресу клиента (0 - выключено)
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", 20))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", 100))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+
+# Сброс нагрузки при исчерпании пула соединений
+ADMISSION_MAX_WAITING = int(os.getenv("ADMISSION_MAX_WAITING", 20))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", 1))
+
+# Фоновая обработка событий outbox
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 100))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 1))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 10))
+
+# Рекомендации "на кого подписаться"
+SUGGESTIONS_INTERVAL = int(os.getenv("SUGGESTIONS_INTERVAL", 3600))  # 0 - выключено
+SUGGESTIONS_TOP_K = int(os.getenv("SUGGESTIONS_TOP_K", 20))
+SUGGESTIONS_CO_LIKE_WEIGHT = float(os.getenv("SUGGESTIONS_CO_LIKE_WEIGHT", 0.5))
+SUGGESTIONS_MAX_LIKERS = int(os.getenv("SUGGESTIONS_MAX_LIKERS", 10000))
+SUGGESTIONS_BLOCK_SIZE = int(os.getenv("SUGGESTIONS_BLOCK_SIZE", 5000))
+
+# Максимум id в одном запросе GET /api/tweets?ids=... и /api/users?ids=...
+MULTIGET_MAX_IDS = int(os.getenv("MULTIGET_MAX_IDS", 100))
+
+# Выгрузка данных пользователя
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+# Ключ администратора для служебных эндпоинтов (пустой - эндпоинты выключены)
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY", "")
+
+# Массовый импорт
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 10000))
+
+# Рендеринг ленты: orm - сборка в Python, sql - готовый JSON из Postgres
+FEED_RENDER_MODE = os.getenv("FEED_RENDER_MODE", "orm")
+
+# Сжатие ответов
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSION_THREAD_SIZE = int(os.getenv("COMPRESSION_THREAD_SIZE", 64 * 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", 3))
+BROTLI_LEVEL = int(os.getenv("BROTLI_LEVEL", 4))
+
+# Секционирование: tweets по диапазонам id, likes по хэшу tweet_id
+TWEETS_PARTITION_SIZE = int(os.getenv("TWEETS_PARTITION_SIZE", 1_000_000))
+TWEETS_PARTITIONS_AHEAD = int(os.getenv("TWEETS_PARTITIONS_AHEAD", 2))
+LIKES_PARTITIONS = int(os.getenv("LIKES_PARTITIONS", 16))
+PARTITION_ARCHIVE_DAYS = int(
+    os.getenv("PARTITION_ARCHIVE_DAYS", 0)
+)  # 0 - не архивировать
+PARTITION_MAINTENANCE_INTERVAL = int(os.getenv("PARTITION_MAINTENANCE_INTERVAL", 3600))
+
+# Профилирование запросов: по заголовку x-profile с ключом администратора
+# или случайной доле запросов (0 - выключено)
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+# Потоковые эндпоинты живут часами и в случайную выборку не попадают,
+# любой профиль останавливается через PROFILE_MAX_SECONDS
+PROFILE_SKIP_PATHS = [
+    path.strip()
+    for path in os.getenv(
+        "PROFILE_SKIP_PATHS", "/api/events,/api/users/me/export"
+    ).split(",")
+    if path.strip()
+]
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", 30))
+
+# Счетчики лайков: дельты копятся в памяти и сбрасываются пачкой
+LIKE_FLUSH_INTERVAL = float(os.getenv("LIKE_FLUSH_INTERVAL", 1))
+LIKE_FLUSH_BATCH_SIZE = int(os.getenv("LIKE_FLUSH_BATCH_SIZE", 1000))
+
+# Сборка медиа без твитов (интервал 0 - выключено)
+MEDIA_GC_INTERVAL = int(os.getenv("MEDIA_GC_INTERVAL", 3600))
+MEDIA_GC_GRACE_HOURS = float(os.getenv("MEDIA_GC_GRACE_HOURS", 24))
+MEDIA_GC_BATCH_SIZE = int(os.getenv("MEDIA_GC_BATCH_SIZE", 500))
+
+# Шина инвалидации кэшей процессов через LISTEN/NOTIFY, по ней же события SSE
+# доходят до подписчиков других воркеров (без шины - только своего воркера)
+INVALIDATION_ENABLED = os.getenv("INVALIDATION_ENABLED", "true").lower() == "true"
+INVALIDATION_CHANNEL = os.getenv("INVALIDATION_CHANNEL", "cache_invalidation")
+INVALIDATION_RECONNECT_DELAY = float(os.getenv("INVALIDATION_RECONNECT_DELAY", 1))
+INVALIDATION_HEALTHCHECK_INTERVAL = float(
+    os.getenv("INVALIDATION_HEALTHCHECK_INTERVAL", 30)
+)
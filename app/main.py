@@ -1,28 +1,80 @@
-import uvicorn
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+from src.compression import CompressionMiddleware
+from src.counters import like_counter
+from src.database import shard_router
+from src.invalidation import invalidation_bus
+from src.limits import RateLimitMiddleware
+from src.negotiation import MsgpackMiddleware, NegotiatedResponse
+from src.outbox import run_outbox_worker
+from src.profiling import ProfilerMiddleware
 from src.routes import router
+from src.tasks import (
+    collect_media_periodically,
+    compute_suggestions_periodically,
+    maintain_partitions_periodically,
+    refresh_scores_periodically,
+    warm_up,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Прогрев до приема трафика, фоновые задачи и закрытие пула при остановке"""
+    await warm_up()
+    background_tasks = [
+        asyncio.create_task(refresh_scores_periodically()),
+        *(
+            asyncio.create_task(run_outbox_worker(session_factory=session_factory))
+            for session_factory in shard_router.sessionmakers
+        ),
+        asyncio.create_task(compute_suggestions_periodically()),
+        asyncio.create_task(maintain_partitions_periodically()),
+        asyncio.create_task(collect_media_periodically()),
+        asyncio.create_task(like_counter.run()),
+        *(
+            asyncio.create_task(invalidation_bus.listen(shard_engine))
+            for shard_engine in shard_router.engines
+        ),
+    ]
+
+    yield
 
-app = FastAPI(title=__name__)
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    # Дельты лайков, накопленные с последнего сброса
+    await like_counter.flush()
+    await shard_router.dispose()
+
+
+app = FastAPI(title=__name__, lifespan=lifespan)
+app.add_middleware(MsgpackMiddleware)
+app.add_middleware(ProfilerMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(RateLimitMiddleware)
 
 
 # Обработчик для HTTPException
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
-    return JSONResponse(
+    return NegotiatedResponse(
         status_code=exc.status_code,
         content={
             "result": False,
             "error_type": exc.__class__.__name__,
             "error_message": exc.detail,
         },
+        headers=exc.headers,
     )
 
 
 # Обработчик для других исключений
 @app.exception_handler(Exception)
 async def generic_exception_handler(request: Request, exc: Exception):
-    return JSONResponse(
+    return NegotiatedResponse(
         status_code=400,
         content={
             "result": False,
@@ -36,4 +88,6 @@ app.include_router(router)
 
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=5000, reload=True)
+    from server import run
+
+    run()
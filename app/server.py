@@ -0,0 +1,52 @@
+"""
+Запуск приложения в продакшене
+
+Число воркеров по умолчанию равно числу доступных CPU, uvloop и httptools
+используются, если установлены. По SIGTERM uvicorn перестает принимать
+соединения и ждет завершения текущих запросов GRACEFUL_SHUTDOWN_TIMEOUT секунд
+"""
+
+import os
+from importlib.util import find_spec
+
+import uvicorn
+from config import (
+    FORWARDED_ALLOW_IPS,
+    GRACEFUL_SHUTDOWN_TIMEOUT,
+    SERVER_HOST,
+    SERVER_PORT,
+    SERVER_RELOAD,
+    SERVER_WORKERS,
+)
+
+
+def cpu_count() -> int:
+    """Число CPU, доступных процессу (учитывает ограничения affinity)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def run():
+    if SERVER_RELOAD:
+        workers = 1
+    else:
+        workers = SERVER_WORKERS or cpu_count()
+
+    uvicorn.run(
+        "main:app",
+        host=SERVER_HOST,
+        port=SERVER_PORT,
+        workers=workers,
+        reload=SERVER_RELOAD,
+        loop="uvloop" if find_spec("uvloop") else "asyncio",
+        http="httptools" if find_spec("httptools") else "h11",
+        lifespan="on",
+        proxy_headers=True,
+        forwarded_allow_ips=FORWARDED_ALLOW_IPS,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_TIMEOUT,
+    )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,281 @@
+"""
+Массовый импорт твитов и подписок из NDJSON
+
+Каждая строка - объект с полем type ("tweet" или "follow") и полями схем
+TweetImport / FollowImport. Записи валидируются pydantic, пачками грузятся
+через COPY во временные таблицы и сливаются в основные одним
+INSERT ... SELECT ... ON CONFLICT DO NOTHING, поэтому импорт можно повторять
+
+Запуск: python -m src.bulk_import data.ndjson
+"""
+
+import asyncio
+import json
+import sys
+from collections import defaultdict
+from typing import AsyncIterator
+
+from config import IMPORT_BATCH_SIZE
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database import shard_router
+from src.invalidation import invalidation_bus
+from src.models import bump_feed_version, replicate_users
+from src.partitions import ensure_tweet_partitions
+from src.schemas import FollowImport, TweetImport
+
+MAX_ERRORS = 100
+
+RECORD_SCHEMAS = {"tweet": TweetImport, "follow": FollowImport}
+
+CREATE_STAGING = (
+    """
+    CREATE TEMP TABLE IF NOT EXISTS staging_tweets (
+        id integer, user_id integer, text varchar,
+        my_array integer[], created_at timestamptz
+    ) ON COMMIT DELETE ROWS
+    """,
+    """
+    CREATE TEMP TABLE IF NOT EXISTS staging_follows (
+        follower_id integer, followee_id integer, created_at timestamptz
+    ) ON COMMIT DELETE ROWS
+    """,
+)
+
+# Твиты и подписки несуществующих пользователей пропускаются.
+# Ссылки на медиа пишутся только для действительно вставленных твитов
+MERGE_TWEETS = """
+    WITH inserted AS (
+        INSERT INTO tweets (id, user_id, text, my_array, created_at)
+        SELECT s.id, s.user_id, s.text, s.my_array, coalesce(s.created_at, now())
+        FROM staging_tweets s
+        JOIN users u ON u.id = s.user_id
+        ON CONFLICT (id) DO NOTHING
+        RETURNING id, my_array
+    ), linked AS (
+        INSERT INTO tweet_media (tweet_id, position, media_id)
+        SELECT inserted.id, a.position, a.media_id
+        FROM inserted
+        CROSS JOIN unnest(inserted.my_array) WITH ORDINALITY AS a(media_id, position)
+        WHERE a.media_id IS NOT NULL
+    )
+    SELECT count(*) FROM inserted
+"""
+
+MERGE_FOLLOWS = """
+    INSERT INTO followers (follower_id, followee_id, created_at)
+    SELECT DISTINCT ON (s.follower_id, s.followee_id)
+        s.follower_id, s.followee_id, coalesce(s.created_at, now())
+    FROM staging_follows s
+    JOIN users a ON a.id = s.follower_id
+    JOIN users b ON b.id = s.followee_id
+    WHERE s.follower_id <> s.followee_id
+    ON CONFLICT ON CONSTRAINT uq_follower_followee DO NOTHING
+"""
+
+# id твитов пришли извне, sequence нужно сдвинуть за максимальный.
+# В шардах sequence идет с шагом N по остатку шарда (align_tweet_sequences),
+# поэтому новое значение округляется вверх до того же остатка по модулю шага
+SYNC_TWEETS_SEQUENCE = """
+    SELECT setval(
+        'tweets_id_seq',
+        base.value + ((seq.residue - base.value) % seq.step + seq.step) % seq.step
+    )
+    FROM (
+        SELECT
+            increment_by AS step,
+            coalesce(last_value, start_value) % increment_by AS residue,
+            coalesce(last_value, start_value) AS last_value
+        FROM pg_sequences
+        WHERE schemaname = current_schema() AND sequencename = 'tweets_id_seq'
+    ) seq,
+    LATERAL (
+        SELECT greatest((SELECT max(id) FROM tweets), seq.last_value, 1) AS value
+    ) base
+"""
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Разбивает поток байт на строки"""
+    tail = b""
+    async for chunk in chunks:
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            yield line
+    if tail:
+        yield tail
+
+
+class BulkImporter:
+    """Копит провалидированные записи и сливает их в БД пачками"""
+
+    def __init__(self, db: AsyncSession, batch_size: int = IMPORT_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        # Твиты копятся по шардам авторов, подписки живут в основной БД
+        self.tweets = defaultdict(list)
+        self.follows = []
+        self.stats = {
+            "lines": 0,
+            "invalid": 0,
+            "tweets_inserted": 0,
+            "follows_inserted": 0,
+            "errors": [],
+        }
+
+    def add_line(self, line: bytes):
+        line = line.strip()
+        if not line:
+            return
+
+        self.stats["lines"] += 1
+        try:
+            data = json.loads(line)
+            if not isinstance(data, dict):
+                raise ValueError("record must be a JSON object")
+            schema = RECORD_SCHEMAS[data.pop("type", None)]
+            record = schema.model_validate(data)
+        except (ValueError, KeyError, TypeError) as exc:
+            self._invalid(exc)
+            return
+
+        if isinstance(record, TweetImport):
+            shard = shard_router.for_user(record.user_id)
+            # Шард твита определяется по id, он должен совпасть с шардом автора
+            if shard_router.for_tweet(record.id) != shard:
+                self._invalid(ValueError("tweet id does not match author's shard"))
+                return
+            self.tweets[shard].append(
+                (
+                    record.id,
+                    record.user_id,
+                    record.text,
+                    record.media or None,
+                    record.created_at,
+                )
+            )
+        else:
+            self.follows.append(
+                (record.follower_id, record.followee_id, record.created_at)
+            )
+
+    def _invalid(self, exc: Exception):
+        self.stats["invalid"] += 1
+        if len(self.stats["errors"]) < MAX_ERRORS:
+            if isinstance(exc, ValidationError):
+                error = "; ".join(
+                    f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in exc.errors()
+                )
+            elif isinstance(exc, KeyError):
+                error = f"unknown record type: {exc}"
+            else:
+                error = str(exc)
+            self.stats["errors"].append({"line": self.stats["lines"], "error": error})
+
+    @property
+    def full(self) -> bool:
+        tweets = sum(len(shard_tweets) for shard_tweets in self.tweets.values())
+        return tweets + len(self.follows) >= self.batch_size
+
+    async def flush(self):
+        """
+        COPY пачки во временные таблицы и слияние: по транзакции на шард,
+        подписки сливаются вместе с твитами основной БД.
+        Слияние идемпотентно, поэтому частично залитую пачку можно повторить
+        """
+        if not any(self.tweets.values()) and not self.follows:
+            return
+
+        for shard in sorted(self.tweets, reverse=True):
+            if shard:
+                # Авторы, созданные до включения шардирования, есть только
+                # в основной БД; без копий MERGE_TWEETS пропустил бы их твиты
+                authors = {tweet[1] for tweet in self.tweets[shard]}
+                await replicate_users(db=self.db, ids=sorted(authors))
+            async with shard_router.session(self.db, shard) as db:
+                await self._merge(
+                    db,
+                    tweets=self.tweets[shard],
+                    follows=self.follows if shard == 0 else [],
+                )
+                await db.commit()
+        if 0 not in self.tweets and self.follows:
+            await self._merge(self.db, tweets=[], follows=self.follows)
+            await self.db.commit()
+
+        self.tweets.clear()
+        self.follows.clear()
+
+    async def _merge(self, db: AsyncSession, tweets: list, follows: list):
+        connection = await db.connection()
+        raw_connection = await connection.get_raw_connection()
+        driver = raw_connection.driver_connection
+
+        for statement in CREATE_STAGING:
+            await db.execute(text(statement))
+
+        if tweets:
+            await driver.copy_records_to_table(
+                "staging_tweets",
+                records=tweets,
+                columns=["id", "user_id", "text", "my_array", "created_at"],
+            )
+            # id твитов пришли извне и могут быть за последней секцией
+            await ensure_tweet_partitions(db, upto_id=max(tweet[0] for tweet in tweets))
+            result = await db.execute(text(MERGE_TWEETS))
+            self.stats["tweets_inserted"] += result.scalar()
+            await db.execute(text(SYNC_TWEETS_SEQUENCE))
+
+        if follows:
+            await driver.copy_records_to_table(
+                "staging_follows",
+                records=follows,
+                columns=["follower_id", "followee_id", "created_at"],
+            )
+            result = await db.execute(text(MERGE_FOLLOWS))
+            self.stats["follows_inserted"] += result.rowcount
+
+
+async def import_ndjson(
+    db: AsyncSession, chunks: AsyncIterator[bytes], batch_size: int = IMPORT_BATCH_SIZE
+) -> dict:
+    """
+    Импортирует поток NDJSON и возвращает статистику.
+    Если что-то вставлено, поднимает версию ленты и рассылает воркерам
+    полный сброс кэшей через шину инвалидации - и для HTTP, и для CLI
+    """
+    importer = BulkImporter(db=db, batch_size=batch_size)
+
+    async for line in iter_lines(chunks):
+        importer.add_line(line)
+        if importer.full:
+            await importer.flush()
+    await importer.flush()
+
+    stats = importer.stats
+    if stats["tweets_inserted"] or stats["follows_inserted"]:
+        await bump_feed_version(db=db)
+        await invalidation_bus.publish(db, clear=True)
+        await db.commit()
+    return stats
+
+
+async def read_file(path: str, chunk_size: int = 1 << 20) -> AsyncIterator[bytes]:
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            yield chunk
+
+
+async def main(path: str):
+    from src.database import async_session, engine
+
+    async with async_session() as db:
+        stats = await import_ndjson(db=db, chunks=read_file(path))
+    await engine.dispose()
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1]))
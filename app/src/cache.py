@@ -0,0 +1,188 @@
+import json
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Iterable, Optional
+
+from config import CACHE_BACKEND, CACHE_MAX_ENTRIES, CACHE_TTL, REDIS_URL
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # redis - необязательная зависимость
+    redis = None
+
+
+class MemoryCacheBackend:
+    """LRU кэш в памяти процесса с TTL и инвалидацией по тегам"""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: int = CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self.tags = defaultdict(set)  # tag -> keys
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value, _ = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            return None
+
+        self.entries.move_to_end(key)
+        return value
+
+    async def set(
+        self, key: str, value: Any, tags: Iterable[str] = (), ttl: int = None
+    ):
+        if key in self.entries:
+            self._remove(key)
+
+        tags = tuple(tags)
+        expires_at = time.monotonic() + (ttl or self.ttl)
+        self.entries[key] = (expires_at, value, tags)
+        for tag in tags:
+            self.tags[tag].add(key)
+
+        while len(self.entries) > self.max_entries:
+            oldest_key = next(iter(self.entries))
+            self._remove(oldest_key)
+
+    async def invalidate(self, *tags: str):
+        for tag in tags:
+            for key in self.tags.pop(tag, ()):
+                self._remove(key)
+
+    async def clear(self):
+        self.entries.clear()
+        self.tags.clear()
+
+    def _remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+
+        for tag in entry[2]:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+
+class RedisCacheBackend:
+    """
+    Кэш в Redis (или любом сервере с протоколом Redis)
+
+    Теги хранятся как множества ключей, значения сериализуются в JSON
+    """
+
+    def __init__(self, client=None, url: str = REDIS_URL, ttl: int = CACHE_TTL):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("redis package is required for CACHE_BACKEND=redis")
+            client = redis.from_url(url)
+
+        self.client = client
+        self.ttl = ttl
+        self.prefix = "cache:"
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self.client.get(self.prefix + key)
+        if value is None:
+            return None
+        return json.loads(value)
+
+    async def set(
+        self, key: str, value: Any, tags: Iterable[str] = (), ttl: int = None
+    ):
+        ttl = ttl or self.ttl
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.set(self.prefix + key, json.dumps(value), ex=ttl)
+            for tag in tags:
+                tag_key = f"{self.prefix}tag:{tag}"
+                pipe.sadd(tag_key, key)
+                pipe.expire(tag_key, ttl)
+            await pipe.execute()
+
+    async def invalidate(self, *tags: str):
+        for tag in tags:
+            tag_key = f"{self.prefix}tag:{tag}"
+            keys = await self.client.smembers(tag_key)
+            keys = [self.prefix + self._decode(key) for key in keys]
+            await self.client.delete(tag_key, *keys)
+
+    async def clear(self):
+        keys = [key async for key in self.client.scan_iter(match=self.prefix + "*")]
+        if keys:
+            await self.client.delete(*keys)
+
+    @staticmethod
+    def _decode(key) -> str:
+        return key.decode() if isinstance(key, bytes) else key
+
+
+class EndpointStats:
+    """Статистика попаданий и задержки кэша по одному эндпоинту"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.get_seconds = 0.0
+        self.max_get_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "avg_get_ms": self.get_seconds / lookups * 1000 if lookups else 0.0,
+            "max_get_ms": self.max_get_seconds * 1000,
+        }
+
+
+class ResponseCache:
+    """Кэш отрендеренных ответов с ключом эндпоинт + зритель"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.stats = defaultdict(EndpointStats)
+
+    async def get(self, endpoint: str, key) -> Optional[Any]:
+        started = time.perf_counter()
+        value = await self.backend.get(f"{endpoint}:{key}")
+        elapsed = time.perf_counter() - started
+
+        stats = self.stats[endpoint]
+        stats.get_seconds += elapsed
+        stats.max_get_seconds = max(stats.max_get_seconds, elapsed)
+        if value is None:
+            stats.misses += 1
+        else:
+            stats.hits += 1
+        return value
+
+    async def set(self, endpoint: str, key, value: Any, tags: Iterable[str] = ()):
+        await self.backend.set(f"{endpoint}:{key}", value, tags=tags)
+
+    async def invalidate(self, *tags: str):
+        await self.backend.invalidate(*tags)
+
+    async def clear(self):
+        await self.backend.clear()
+
+    def get_stats(self) -> dict:
+        return {endpoint: stats.as_dict() for endpoint, stats in self.stats.items()}
+
+
+def create_cache_backend(name: str = CACHE_BACKEND):
+    if name == "memory":
+        return MemoryCacheBackend()
+    elif name == "redis":
+        return RedisCacheBackend()
+    raise ValueError(f"unknown cache backend: {name}")
+
+
+response_cache = ResponseCache(create_cache_backend())
@@ -0,0 +1,143 @@
+import asyncio
+import gzip
+from typing import Optional
+
+from config import (
+    BROTLI_LEVEL,
+    COMPRESSION_MIN_SIZE,
+    COMPRESSION_THREAD_SIZE,
+    GZIP_LEVEL,
+    ZSTD_LEVEL,
+)
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import zstandard
+except ImportError:  # zstandard - необязательная зависимость
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # brotli - необязательная зависимость
+    brotli = None
+
+
+def compress_zstd(data: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+
+def compress_brotli(data: bytes) -> bytes:
+    return brotli.compress(data, quality=BROTLI_LEVEL)
+
+
+def compress_gzip(data: bytes) -> bytes:
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+# Кодировки в порядке предпочтения сервера
+ENCODERS = {}
+if zstandard is not None:
+    ENCODERS["zstd"] = compress_zstd
+if brotli is not None:
+    ENCODERS["br"] = compress_brotli
+ENCODERS["gzip"] = compress_gzip
+
+# Уже сжатые или потоковые данные не сжимаем
+SKIP_CONTENT_TYPES = ("image/", "video/", "audio/", "text/event-stream")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Выбирает кодировку по Accept-Encoding с учетом q-значений"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        accepted[name.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in ENCODERS:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Сжимает ответы по Accept-Encoding (zstd, br, gzip - что установлено).
+    Сжимаются только целые ответы больше minimum_size, большие тела
+    сжимаются в пуле потоков, чтобы не блокировать event loop.
+    Потоковые ответы (SSE, NDJSON) отдаются как есть
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        thread_size: int = COMPRESSION_THREAD_SIZE,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.thread_size = thread_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start_message["headers"])
+            content_type = headers.get("content-type", "")
+
+            if (
+                message.get("more_body", False)
+                or "content-encoding" in headers
+                or content_type.startswith(SKIP_CONTENT_TYPES)
+            ):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            headers.add_vary_header("Accept-Encoding")
+            if len(body) >= self.minimum_size:
+                body = await self.compress(encoding, body)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                message = {**message, "body": body}
+
+            await send(start_message)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+    async def compress(self, encoding: str, body: bytes) -> bytes:
+        encoder = ENCODERS[encoding]
+        if len(body) >= self.thread_size:
+            return await asyncio.to_thread(encoder, body)
+        return encoder(body)
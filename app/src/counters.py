@@ -0,0 +1,101 @@
+"""
+Отложенная запись счетчиков лайков
+
+Лайк и снятие лайка записываются в likes сразу, а изменение like_count
+твита копится в памяти и раз в LIKE_FLUSH_INTERVAL сбрасывается одним
+UPDATE tweets ... FROM (VALUES ...) на пачку твитов. Популярный твит
+получает одно обновление строки за интервал вместо одного на каждый лайк,
+и лайки не выстраиваются в очередь за блокировкой его строки.
+
+Пока фоновый сброс не запущен (тесты, скрипты), изменения пишутся сразу
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict
+
+from config import LIKE_FLUSH_BATCH_SIZE, LIKE_FLUSH_INTERVAL
+from sqlalchemy import Integer, column, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database import shard_router
+
+logger = logging.getLogger(__name__)
+
+
+async def apply_like_deltas(
+    db: AsyncSession, deltas: Dict[int, int], batch_size: int = LIKE_FLUSH_BATCH_SIZE
+):
+    """Прибавляет дельты к like_count и пересчитывает рейтинг этих твитов"""
+    from src.models import Tweet, bump_feed_version, tweet_score_expression
+
+    # Строки блокируются в порядке id, чтобы сбросы разных воркеров
+    # не взаимоблокировались
+    items = sorted((tweet_id, delta) for tweet_id, delta in deltas.items() if delta)
+    for start in range(0, len(items), batch_size):
+        batch = values(
+            column("tweet_id", Integer), column("delta", Integer), name="deltas"
+        ).data(items[start : start + batch_size])
+        like_count = Tweet.like_count + batch.c.delta
+        await db.execute(
+            update(Tweet)
+            .where(Tweet.id == batch.c.tweet_id)
+            .values(like_count=like_count, score=tweet_score_expression(like_count))
+            .execution_options(synchronize_session=False)
+        )
+    await db.commit()
+    if items:
+        await bump_feed_version(db=db)
+
+
+class LikeCounter:
+    """Дельты like_count по шардам и твитам до следующего сброса"""
+
+    def __init__(self):
+        self.deltas = defaultdict(lambda: defaultdict(int))  # shard -> tweet -> delta
+        self.running = False
+
+    async def record(self, db: AsyncSession, tweet_id: int, delta: int):
+        """Учитывает лайк (+1) или снятие лайка (-1)"""
+        if not self.running:
+            await apply_like_deltas(db=db, deltas={tweet_id: delta})
+            return
+
+        self.deltas[shard_router.for_tweet(tweet_id)][tweet_id] += delta
+
+    async def flush(self) -> int:
+        """Сбрасывает накопленные дельты, возвращает число твитов"""
+        pending, self.deltas = self.deltas, defaultdict(lambda: defaultdict(int))
+        flushed = 0
+
+        for shard, deltas in list(pending.items()):
+            try:
+                async with shard_router.sessionmakers[shard]() as db:
+                    await apply_like_deltas(db=db, deltas=deltas)
+            except BaseException:
+                # Не потерять дельты: вернуть несброшенные шарды (этот и
+                # следующие) к накопившимся за время сброса
+                for unflushed, shard_deltas in pending.items():
+                    for tweet_id, delta in shard_deltas.items():
+                        self.deltas[unflushed][tweet_id] += delta
+                raise
+            del pending[shard]
+            flushed += len(deltas)
+
+        return flushed
+
+    async def run(self, interval: float = LIKE_FLUSH_INTERVAL):
+        """Периодический сброс, пока задача не отменена"""
+        self.running = True
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.flush()
+                except Exception:
+                    logger.exception("like counter flush failed")
+        finally:
+            self.running = False
+
+
+like_counter = LikeCounter()
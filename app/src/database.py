@@ -1,12 +1,296 @@
-from config import DATABASE_URL
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, List
+
+from config import (
+    DATABASE_URL,
+    DB_ECHO,
+    DB_MAX_OVERFLOW,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_PREPARED_STATEMENT_CACHE_SIZE,
+    SHARD_DATABASE_URLS,
+)
+from sqlalchemy import Select, TextualSelect, text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
+from src.limits import admission
+
+logger = logging.getLogger(__name__)
+
+
+def create_engine(url: str):
+    return create_async_engine(
+        url,
+        echo=DB_ECHO,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+        connect_args={
+            "prepared_statement_cache_size": DB_PREPARED_STATEMENT_CACHE_SIZE
+        },
+    )
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+
+engine = create_engine(DATABASE_URL)
 async_session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
 
 
+class LazySession(AsyncSession):
+    """
+    Сессия запроса, которая держит соединение только пока работает с БД.
+    Соединение берется из пула на первом запросе и не отдается, пока запросы
+    идут подряд. Если после чтения без изменений обработчик уходит ждать
+    не БД (кэш, single-flight, внешний сервис) или цикл событий успел
+    переключиться, транзакция завершается в фоне и соединение возвращается
+    в пул, не дожидаясь конца обработки запроса.
+    Если в транзакции были изменения, соединение держится до commit/rollback.
+    Место в admission занимается тоже только на время владения соединением
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._admitted = False
+        self._has_writes = False
+        # Фоновое завершение чтения и запросы обработчика не должны
+        # одновременно работать с соединением
+        self._lock = asyncio.Lock()
+        self._generation = 0
+        self._release_tasks = set()
+
+    def _admit(self):
+        if not self._admitted:
+            admission.enter(self.bind.pool)
+            self._admitted = True
+
+    def _release(self):
+        if self._admitted and not self.in_transaction():
+            admission.exit()
+            self._admitted = False
+            self._has_writes = False
+
+    def _mark_writes(self, statement=None):
+        if self.new or self.dirty or self.deleted:
+            self._has_writes = True  # будут сброшены autoflush
+        elif statement is not None and (
+            not isinstance(statement, (Select, TextualSelect))
+            or getattr(statement, "_for_update_arg", None) is not None
+        ):
+            # DML, DDL, text() без .columns() и SELECT FOR UPDATE
+            self._has_writes = True
+
+    def _read_only(self) -> bool:
+        return not self._has_writes and not (self.new or self.dirty or self.deleted)
+
+    def _schedule_release(self):
+        """
+        Завершает транзакцию чтения на следующем шаге цикла событий, если
+        к тому времени сессия не обратилась к БД снова
+        """
+        if not self.in_transaction() or not self._read_only():
+            return
+        task = asyncio.get_running_loop().create_task(
+            self._release_if_idle(self._generation)
+        )
+        self._release_tasks.add(task)
+        task.add_done_callback(self._release_tasks.discard)
+
+    async def _release_if_idle(self, generation: int):
+        async with self._lock:
+            if generation != self._generation or not self._read_only():
+                return
+            try:
+                await super().commit()
+            except Exception:
+                logger.exception("releasing read-only connection failed")
+                await super().rollback()
+            finally:
+                self._release()
+
+    async def _run(self, method, statement=None, *args, **kwargs):
+        async with self._lock:
+            self._generation += 1
+            self._admit()
+            self._mark_writes(statement)
+            if statement is None:
+                result = await method(*args, **kwargs)
+            else:
+                result = await method(statement, *args, **kwargs)
+        self._schedule_release()
+        return result
+
+    async def execute(self, statement, *args, **kwargs):
+        return await self._run(super().execute, statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await self._run(super().scalar, statement, *args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        return await self._run(super().get, None, *args, **kwargs)
+
+    async def refresh(self, *args, **kwargs):
+        await self._run(super().refresh, None, *args, **kwargs)
+
+    async def stream(self, *args, **kwargs):
+        # Соединение нужно до конца чтения потока, отпускается при commit/close
+        self._has_writes = True
+        return await self._run(super().stream, None, *args, **kwargs)
+
+    async def connection(self, *args, **kwargs):
+        self._has_writes = True
+        return await self._run(super().connection, None, *args, **kwargs)
+
+    async def flush(self, *args, **kwargs):
+        self._has_writes = True
+        await self._run(super().flush, None, *args, **kwargs)
+
+    def begin_nested(self):
+        self._admit()
+        self._has_writes = True
+        return super().begin_nested()
+
+    async def commit(self):
+        async with self._lock:
+            self._generation += 1
+            if self.new or self.dirty or self.deleted:
+                self._admit()
+            try:
+                await super().commit()
+            finally:
+                self._release()
+
+    async def rollback(self):
+        async with self._lock:
+            self._generation += 1
+            try:
+                await super().rollback()
+            finally:
+                self._release()
+
+    async def close(self):
+        async with self._lock:
+            self._generation += 1
+            try:
+                await super().close()
+            finally:
+                self._release()
+
+
+lazy_session = sessionmaker(bind=engine, class_=LazySession, expire_on_commit=False)
+
+
 async def get_db():
-    async with async_session() as session:
+    """Сессия запроса, берущая соединение из пула только на время работы с БД"""
+    async with lazy_session() as session:
         yield session
+
+
+async def open_pool(size: int = DB_POOL_SIZE):
+    """Заранее открывает соединения пула, чтобы первые запросы не ждали connect"""
+
+    async def check_connection(conn):
+        await conn.execute(text("SELECT 1"))
+
+    connections = await asyncio.gather(*(engine.connect() for _ in range(size)))
+    try:
+        await asyncio.gather(*(check_connection(conn) for conn in connections))
+    finally:
+        for conn in connections:
+            await conn.close()
+
+
+class ShardRouter:
+    """
+    Маршрутизация запросов по шардам. Шард 0 - основная БД (DATABASE_URL):
+    в ней пользователи, подписки и медиа. Твиты лежат в шарде автора, лайки -
+    в шарде твита, пользователи копируются во все шарды ради внешних ключей.
+    id твитов шарда k сравнимы с k по модулю числа шардов, поэтому шард
+    твита определяется по его id без обращения к БД
+    """
+
+    def __init__(self, urls: List[str]):
+        self.engines = [engine] + [create_engine(url) for url in urls]
+        self.sessionmakers = [async_session] + [
+            sessionmaker(bind=shard_engine, class_=AsyncSession, expire_on_commit=False)
+            for shard_engine in self.engines[1:]
+        ]
+
+    def __len__(self) -> int:
+        return len(self.engines)
+
+    def for_user(self, user_id: int) -> int:
+        return user_id % len(self)
+
+    def for_tweet(self, tweet_id: int) -> int:
+        return tweet_id % len(self)
+
+    @asynccontextmanager
+    async def session(
+        self, db: AsyncSession, shard: int
+    ) -> AsyncIterator[AsyncSession]:
+        """
+        Сессия шарда. Для шарда 0 отдается сессия запроса db,
+        чтобы не брать второе соединение к той же БД
+        """
+        if shard == 0:
+            yield db
+            return
+        async with self.sessionmakers[shard]() as session:
+            yield session
+
+    async def scatter(
+        self,
+        db: AsyncSession,
+        fn: Callable[[AsyncSession], Awaitable],
+        shards: range = None,
+    ) -> list:
+        """Выполняет fn на шардах (по умолчанию всех) параллельно, результаты по порядку"""
+
+        async def run(shard: int):
+            async with self.session(db, shard) as session:
+                return await fn(session)
+
+        shards = range(len(self)) if shards is None else shards
+        return await asyncio.gather(*(run(shard) for shard in shards))
+
+    async def align_tweet_sequences(self):
+        """
+        Настраивает tweets_id_seq шарда k на шаг N и остаток k,
+        чтобы id твитов разных шардов не пересекались
+        """
+        if len(self) == 1:
+            return
+
+        for shard, maker in enumerate(self.sessionmakers):
+            async with maker() as db:
+                await db.execute(
+                    text(f"ALTER SEQUENCE tweets_id_seq INCREMENT BY {len(self)}")
+                )
+                await db.execute(
+                    text(
+                        "SELECT setval('tweets_id_seq', "
+                        "(last_value / :count + 1) * :count + :shard) "
+                        "FROM tweets_id_seq WHERE last_value % :count <> :shard"
+                    ),
+                    {"count": len(self), "shard": shard},
+                )
+                await db.commit()
+
+    async def dispose(self):
+        await asyncio.gather(*(shard_engine.dispose() for shard_engine in self.engines))
+
+
+shard_router = ShardRouter(SHARD_DATABASE_URLS)
+
+
+def shard_session(db: AsyncSession, user_id: int):
+    """Сессия шарда пользователя: его твиты"""
+    return shard_router.session(db, shard_router.for_user(user_id))
+
+
+def tweet_session(db: AsyncSession, tweet_id: int):
+    """Сессия шарда твита: сам твит и его лайки"""
+    return shard_router.session(db, shard_router.for_tweet(tweet_id))
@@ -0,0 +1,89 @@
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Optional
+
+from config import EVENTS_HEARTBEAT_INTERVAL, EVENTS_QUEUE_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """Подписка на события брокера с ограниченной очередью"""
+
+    def __init__(self, maxsize: int):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.closed = False
+
+    def close(self):
+        """Закрывает подписку, ожидающий клиент получит None"""
+        if self.closed:
+            return
+        self.closed = True
+        # Освобождаем место под маркер завершения
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self) -> Optional[dict]:
+        return await self.queue.get()
+
+
+class EventBroker:
+    """
+    Внутрипроцессный pub/sub брокер событий ленты
+
+    Публикация никогда не блокируется: если очередь подписчика переполнена,
+    подписчик считается медленным и отключается.
+    Подписчикам других воркеров события доходят через шину инвалидации
+    (src/invalidation.py), которая вызывает deliver в каждом процессе
+    """
+
+    def __init__(self, queue_size: int = EVENTS_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers = set()
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(maxsize=self.queue_size)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+        subscription.close()
+
+    def publish(self, event_type: str, **data):
+        """Рассылает событие всем подписчикам"""
+        self.deliver({"type": event_type, **data})
+
+    def deliver(self, event: dict):
+        for subscription in list(self.subscribers):
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                logger.warning("dropping slow event subscriber")
+                self.unsubscribe(subscription)
+
+
+async def sse_stream(
+    subscription: Subscription, heartbeat: float = EVENTS_HEARTBEAT_INTERVAL
+) -> AsyncIterator[str]:
+    """Формирует поток Server-Sent Events для подписки"""
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                # Комментарий поддерживает соединение через прокси
+                yield ": ping\n\n"
+                continue
+
+            if event is None:
+                return
+
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        broker.unsubscribe(subscription)
+
+
+broker = EventBroker()
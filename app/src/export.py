@@ -0,0 +1,110 @@
+import base64
+import json
+from datetime import datetime
+from typing import AsyncIterator, Optional, Tuple
+
+from config import EXPORT_BATCH_SIZE
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+from src.database import shard_router
+from src.models import Follower, Like, Tweet
+
+# (тип записи, колонки, колонка владельца); записи секции идут по возрастанию id
+SECTIONS = (
+    ("tweet", (Tweet.id, Tweet.text, Tweet.media, Tweet.created_at), Tweet.user_id),
+    ("like", (Like.id, Like.tweet_id, Like.created_at), Like.user_id),
+    (
+        "following",
+        (Follower.id, Follower.followee_id, Follower.created_at),
+        Follower.follower_id,
+    ),
+    (
+        "follower",
+        (Follower.id, Follower.follower_id, Follower.created_at),
+        Follower.followee_id,
+    ),
+)
+
+
+def export_plan(user_id: int) -> list:
+    """
+    Секции выгрузки с номером шарда: твиты лежат в шарде автора, лайки - в
+    шарде твита, т.е. во всех шардах, подписки - в основной БД.
+    Номер секции курсора - индекс в этом списке
+    """
+    plan = []
+    for record_type, columns, owner in SECTIONS:
+        if record_type == "tweet":
+            shards = [shard_router.for_user(user_id)]
+        elif record_type == "like":
+            shards = range(len(shard_router))
+        else:
+            shards = [0]
+        plan.extend((record_type, columns, owner, shard) for shard in shards)
+    return plan
+
+
+def encode_cursor(section: int, last_id: int) -> str:
+    """Токен продолжения: номер секции и id последней выгруженной записи"""
+    raw = json.dumps([section, last_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: Optional[str]) -> Tuple[int, int]:
+    if not token:
+        return 0, 0
+
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        section, last_id = json.loads(raw)
+        last_id = int(last_id)
+    except (ValueError, TypeError):
+        raise ValueError("invalid export cursor")
+
+    # Число секций зависит только от числа шардов, а не от пользователя
+    if not isinstance(section, int) or not 0 <= section < len(export_plan(0)):
+        raise ValueError("invalid export cursor")
+    return section, last_id
+
+
+async def export_user_data(
+    session_factory: sessionmaker,
+    user_id: int,
+    cursor: Optional[str] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> AsyncIterator[bytes]:
+    """
+    Выгружает данные пользователя в NDJSON. Строки читаются серверным курсором
+    пачками по batch_size, поэтому память не зависит от объема истории.
+    Каждая строка содержит cursor, с которого можно продолжить выгрузку.
+    session_factory открывает сессии основной БД, шарды читаются своими
+    """
+    start_section, last_id = decode_cursor(cursor)
+    plan = export_plan(user_id)
+
+    for section in range(start_section, len(plan)):
+        record_type, columns, owner, shard = plan[section]
+        id_column = columns[0]
+        after_id = last_id if section == start_section else 0
+        factory = session_factory if shard == 0 else shard_router.sessionmakers[shard]
+
+        async with factory() as db:
+            result = await db.stream(
+                select(*columns)
+                .where(owner == user_id, id_column > after_id)
+                .order_by(id_column)
+                .execution_options(yield_per=batch_size)
+            )
+            async for rows in result.mappings().partitions():
+                lines = [
+                    json.dumps(
+                        {
+                            "type": record_type,
+                            "data": dict(row),
+                            "cursor": encode_cursor(section, row["id"]),
+                        },
+                        default=datetime.isoformat,
+                    )
+                    for row in rows
+                ]
+                yield ("\n".join(lines) + "\n").encode()
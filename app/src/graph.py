@@ -0,0 +1,138 @@
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+EMPTY = array("i")
+
+
+class Adjacency:
+    """
+    Списки смежности одного направления: для каждой вершины отсортированный
+    array('i') соседей. 4 байта на ребро, проверка ребра за O(log n)
+    """
+
+    def __init__(self, lists: Dict[int, array] = None):
+        self.lists = lists or {}
+
+    def extend_sorted(self, edges: Iterable[Tuple[int, int]]):
+        """Дописывает ребра, отсортированные по (source, target), без поиска позиции"""
+        lists = self.lists
+        for source, target in edges:
+            targets = lists.get(source)
+            if targets is None:
+                targets = lists[source] = array("i")
+            targets.append(target)
+
+    def neighbors(self, node: int) -> array:
+        return self.lists.get(node, EMPTY)
+
+    def contains(self, source: int, target: int) -> bool:
+        targets = self.lists.get(source)
+        if not targets:
+            return False
+        index = bisect_left(targets, target)
+        return index < len(targets) and targets[index] == target
+
+    def add(self, source: int, target: int):
+        targets = self.lists.setdefault(source, array("i"))
+        index = bisect_left(targets, target)
+        if index == len(targets) or targets[index] != target:
+            targets.insert(index, target)
+
+    def remove(self, source: int, target: int):
+        targets = self.lists.get(source)
+        if not targets:
+            return
+        index = bisect_left(targets, target)
+        if index < len(targets) and targets[index] == target:
+            del targets[index]
+            if not targets:
+                del self.lists[source]
+
+    @property
+    def edge_count(self) -> int:
+        return sum(len(targets) for targets in self.lists.values())
+
+
+class FollowerGraph:
+    """
+    Индекс подписок в памяти процесса в обоих направлениях.
+    Загружается при старте и обновляется add_following / remove_following,
+    изменения из других воркеров приходят через src/invalidation.py
+    """
+
+    def __init__(self):
+        self.following_index = Adjacency()  # follower -> followees
+        self.followers_index = Adjacency()  # followee -> followers
+        self.loaded = False
+        self._pending = None
+
+    async def load(self, db: AsyncSession, batch_size: int = 10000):
+        """Загружает граф из таблицы followers потоковым чтением"""
+        from src.models import Follower
+
+        self._pending = []
+        try:
+            following = await self._load_direction(
+                db, Follower.follower_id, Follower.followee_id, batch_size
+            )
+            followers = await self._load_direction(
+                db, Follower.followee_id, Follower.follower_id, batch_size
+            )
+        except BaseException:
+            self._pending = None
+            raise
+
+        self.following_index, self.followers_index = following, followers
+
+        # Изменения, пришедшие во время загрузки, могли не попасть в выборку
+        pending, self._pending = self._pending, None
+        for method, follower_id, followee_id in pending:
+            method(follower_id, followee_id)
+
+        self.loaded = True
+
+    @staticmethod
+    async def _load_direction(db, source, target, batch_size) -> Adjacency:
+        result = await db.stream(
+            select(source, target)
+            .order_by(source, target)
+            .execution_options(yield_per=batch_size)
+        )
+        adjacency = Adjacency()
+        async for partition in result.partitions():
+            adjacency.extend_sorted(partition)
+        return adjacency
+
+    def add(self, follower_id: int, followee_id: int):
+        self.following_index.add(follower_id, followee_id)
+        self.followers_index.add(followee_id, follower_id)
+        if self._pending is not None:
+            self._pending.append((self.add, follower_id, followee_id))
+
+    def remove(self, follower_id: int, followee_id: int):
+        self.following_index.remove(follower_id, followee_id)
+        self.followers_index.remove(followee_id, follower_id)
+        if self._pending is not None:
+            self._pending.append((self.remove, follower_id, followee_id))
+
+    def is_following(self, follower_id: int, followee_id: int) -> bool:
+        return self.following_index.contains(follower_id, followee_id)
+
+    def following(self, user_id: int) -> array:
+        return self.following_index.neighbors(user_id)
+
+    def followers(self, user_id: int) -> array:
+        return self.followers_index.neighbors(user_id)
+
+    def following_count(self, user_id: int) -> int:
+        return len(self.following_index.neighbors(user_id))
+
+    def followers_count(self, user_id: int) -> int:
+        return len(self.followers_index.neighbors(user_id))
+
+
+follower_graph = FollowerGraph()
@@ -0,0 +1,182 @@
+"""
+Шина инвалидации кэшей процессов через Postgres LISTEN/NOTIFY
+
+Записи в src/models.py публикуют короткое сообщение через pg_notify в своей
+транзакции: Postgres доставляет его только после коммита. Каждый воркер
+держит на каждом шарде отдельное соединение с LISTEN и применяет чужие
+сообщения: сбрасывает теги кэша ответов в памяти, правит индекс подписок
+и отдает события ленты своим SSE-подписчикам (src/events.py).
+Свои сообщения пропускаются - их воркер уже применил сам.
+Пока соединения нет, сообщения теряются, поэтому после переподключения
+воркер сбрасывает кэш и перезагружает индекс подписок целиком
+
+Сообщение - JSON: {"o": источник, "t": [теги], "f": [follower, followee, 1|0],
+"e": событие SSE, "c": 1 - полный сброс}
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from typing import Iterable, Optional, Tuple
+
+import asyncpg
+from config import (
+    CACHE_BACKEND,
+    INVALIDATION_CHANNEL,
+    INVALIDATION_ENABLED,
+    INVALIDATION_HEALTHCHECK_INTERVAL,
+    INVALIDATION_RECONNECT_DELAY,
+)
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from src.cache import response_cache
+from src.events import broker
+from src.graph import follower_graph
+
+logger = logging.getLogger(__name__)
+
+NOTIFY = text("SELECT pg_notify(:channel, :payload)")
+
+# Предел payload в Postgres - 8000 байт, длинные сообщения заменяются сбросом
+MAX_PAYLOAD = 7900
+
+
+class InvalidationBus:
+    """Публикация и прием сообщений инвалидации"""
+
+    def __init__(
+        self,
+        channel: str = INVALIDATION_CHANNEL,
+        enabled: bool = INVALIDATION_ENABLED,
+        reconnect_delay: float = INVALIDATION_RECONNECT_DELAY,
+        healthcheck_interval: float = INVALIDATION_HEALTHCHECK_INTERVAL,
+    ):
+        self.channel = channel
+        self.enabled = enabled
+        self.reconnect_delay = reconnect_delay
+        self.healthcheck_interval = healthcheck_interval
+        self.origin = uuid.uuid4().hex[:12]
+        # Общий кэш (redis) видят все воркеры, сбрасывать нужно только свой
+        self.local_cache = CACHE_BACKEND == "memory"
+        self._tasks = set()
+
+    async def publish(
+        self,
+        db: AsyncSession,
+        tags: Iterable[str] = (),
+        follow: Optional[Tuple[int, int, bool]] = None,
+        clear: bool = False,
+        event: Optional[dict] = None,
+    ):
+        """Добавляет сообщение в текущую транзакцию db, коммит - за вызывающим"""
+        if not self.enabled:
+            return
+
+        message = {"o": self.origin}
+        if event:
+            message["e"] = event
+        if clear:
+            message["c"] = 1
+        else:
+            if tags:
+                message["t"] = list(tags)
+            if follow:
+                follower_id, followee_id, added = follow
+                message["f"] = [follower_id, followee_id, int(added)]
+
+        payload = json.dumps(message, separators=(",", ":"))
+        if len(payload) > MAX_PAYLOAD:
+            payload = json.dumps({"o": self.origin, "c": 1}, separators=(",", ":"))
+        await db.execute(NOTIFY, {"channel": self.channel, "payload": payload})
+
+    async def flush(self):
+        """Полный сброс: кэш ответов и перезагрузка индекса подписок"""
+        from src.database import async_session
+
+        if self.local_cache:
+            await response_cache.clear()
+        if follower_graph.loaded:
+            try:
+                async with async_session() as db:
+                    await follower_graph.load(db=db)
+            except Exception:
+                logger.exception("follower graph reload failed")
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str):
+        """Применяет сообщение другого воркера"""
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning("invalid invalidation message: %r", payload)
+            return
+        if message.get("o") == self.origin:
+            return
+
+        if "e" in message:
+            broker.deliver(message["e"])
+        if message.get("c"):
+            self._spawn(self.flush())
+            return
+
+        # Индекс подписок правится сразу, в порядке прихода сообщений
+        if "f" in message and follower_graph.loaded:
+            follower_id, followee_id, added = message["f"]
+            if added:
+                follower_graph.add(follower_id, followee_id)
+            else:
+                follower_graph.remove(follower_id, followee_id)
+        if message.get("t") and self.local_cache:
+            self._spawn(response_cache.invalidate(*message["t"]))
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def listen(self, engine: AsyncEngine):
+        """
+        Слушает канал в БД engine, пока задача не отменена.
+        Соединение отдельное от пула и проверяется раз в healthcheck_interval
+        """
+        if not self.enabled:
+            return
+
+        dsn = engine.url.set(drivername="postgresql").render_as_string(
+            hide_password=False
+        )
+        connected_before = False
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(self.channel, self._on_notify)
+
+                # Сообщения, отправленные без соединения, потеряны
+                if connected_before:
+                    await self.flush()
+                connected_before = True
+
+                while not closed.is_set():
+                    try:
+                        await asyncio.wait_for(
+                            closed.wait(), timeout=self.healthcheck_interval
+                        )
+                    except asyncio.TimeoutError:
+                        await connection.fetchval(
+                            "SELECT 1", timeout=self.healthcheck_interval
+                        )
+                logger.warning("invalidation listener connection closed")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("invalidation listener failed")
+            finally:
+                if connection is not None and not connection.is_closed():
+                    connection.terminate()
+            await asyncio.sleep(self.reconnect_delay)
+
+
+invalidation_bus = InvalidationBus()
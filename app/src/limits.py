@@ -0,0 +1,178 @@
+import json
+import math
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from config import (
+    ADMISSION_MAX_WAITING,
+    ADMISSION_RETRY_AFTER,
+    DB_MAX_OVERFLOW,
+    DB_POOL_SIZE,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_MAX_KEYS,
+    RATE_LIMIT_RPS,
+)
+from fastapi import HTTPException
+
+
+class RateLimiter:
+    """
+    Token bucket на каждый ключ (пользователь или адрес клиента)
+
+    Ведра хранятся в LRU, при переполнении вытесняются давно неактивные ключи
+    """
+
+    def __init__(
+        self,
+        rate: float = RATE_LIMIT_RPS,
+        burst: int = RATE_LIMIT_BURST,
+        max_keys: int = RATE_LIMIT_MAX_KEYS,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()  # key -> [tokens, updated_at]
+
+    def acquire(self, key: str) -> float:
+        """Забирает токен. Возвращает 0 или через сколько секунд повторить запрос"""
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+
+        if bucket is None:
+            bucket = [self.burst, now]
+            self.buckets[key] = bucket
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0
+        return (1 - bucket[0]) / self.rate
+
+
+class ApiKeyRegistry:
+    """
+    api-key, уже найденные в БД, -> id пользователя (LRU).
+    Лимит считается по пользователю только для проверенных ключей: иначе
+    клиент получал бы новое ведро на каждый выдуманный api-key
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self.users = OrderedDict()
+
+    def remember(self, api_key: str, user_id: int):
+        self.users[api_key] = user_id
+        self.users.move_to_end(api_key)
+        if len(self.users) > self.max_keys:
+            self.users.popitem(last=False)
+
+    def get(self, api_key: str) -> Optional[int]:
+        user_id = self.users.get(api_key)
+        if user_id is not None:
+            self.users.move_to_end(api_key)
+        return user_id
+
+
+class RateLimitMiddleware:
+    """ASGI middleware, отвечающее 429 при превышении лимита запросов к /api"""
+
+    def __init__(
+        self, app, limiter: RateLimiter = None, api_keys: ApiKeyRegistry = None
+    ):
+        self.app = app
+        self.limiter = limiter or RateLimiter()
+        self.api_keys = api_keys or verified_api_keys
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not self.limiter.rate
+            or not scope["path"].startswith("/api")
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        retry_after = self.limiter.acquire(self._key(scope))
+        if not retry_after:
+            await self.app(scope, receive, send)
+            return
+
+        body = json.dumps(
+            {
+                "result": False,
+                "error_type": "RateLimitExceeded",
+                "error_message": "too many requests",
+            }
+        ).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(math.ceil(retry_after)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    def _key(self, scope) -> str:
+        """
+        Пользователь проверенного api-key, иначе адрес клиента.
+        За прокси адрес берется из X-Forwarded-For (FORWARDED_ALLOW_IPS)
+        """
+        for name, value in scope["headers"]:
+            if name == b"api-key":
+                user_id = self.api_keys.get(value.decode("latin-1"))
+                if user_id is not None:
+                    return f"user:{user_id}"
+                break
+
+        client = scope.get("client")
+        return "addr:" + (client[0] if client else "")
+
+
+class AdmissionController:
+    """
+    Отказывает в обслуживании, когда пул соединений исчерпан и очередь
+    ожидающих соединение запросов длиннее порога. Быстрый 503 лучше,
+    чем ожидание pool_timeout для всех пользователей
+    """
+
+    def __init__(
+        self,
+        capacity: int = DB_POOL_SIZE + DB_MAX_OVERFLOW,
+        max_waiting: int = ADMISSION_MAX_WAITING,
+        retry_after: int = ADMISSION_RETRY_AFTER,
+    ):
+        self.capacity = capacity
+        self.max_waiting = max_waiting
+        self.retry_after = retry_after
+        self.active = 0
+
+    @property
+    def waiting(self) -> int:
+        return max(0, self.active - self.capacity)
+
+    def enter(self, pool):
+        if pool.checkedout() >= self.capacity and self.waiting >= self.max_waiting:
+            raise HTTPException(
+                status_code=503,
+                detail="database is overloaded, retry later",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        self.active += 1
+
+    def exit(self):
+        self.active -= 1
+
+
+verified_api_keys = ApiKeyRegistry()
+admission = AdmissionController()
@@ -0,0 +1,129 @@
+"""
+Сборка медиа без твитов
+
+Медиа считается брошенным, если на него нет ссылок в tweet_media ни в одном
+шарде, включая архивные копии секций, и оно загружено раньше периода
+ожидания: загрузку прикрепляют к твиту уже после POST /api/medias.
+Медиа удаляются пачками, каждая пачка - отдельная транзакция. Кандидаты
+блокируются с SKIP LOCKED, поэтому сборщики нескольких воркеров не ждут
+друг друга, а повторная проверка в DELETE не дает удалить медиа, к которому
+успели прикрепить твит
+
+Запуск: python -m src.media_gc
+"""
+
+import asyncio
+import json
+import logging
+from typing import List, Set
+
+from config import MEDIA_GC_BATCH_SIZE, MEDIA_GC_GRACE_HOURS
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database import shard_router
+from src.partitions import ARCHIVE_SCHEMA
+
+SELECT_CANDIDATES = text(
+    """
+    SELECT m.id
+    FROM medias m
+    WHERE m.id > :after_id
+      AND m.created_at < now() - make_interval(secs => :grace_seconds)
+      AND NOT EXISTS (SELECT 1 FROM tweet_media tm WHERE tm.media_id = m.id)
+    ORDER BY m.id
+    LIMIT :limit
+    FOR UPDATE OF m SKIP LOCKED
+    """
+)
+
+DELETE_MEDIA = text(
+    """
+    DELETE FROM medias m
+    WHERE m.id = ANY(:ids)
+      AND NOT EXISTS (SELECT 1 FROM tweet_media tm WHERE tm.media_id = m.id)
+    """
+)
+
+# Копии tweet_media отсоединенных секций, см. src/partitions.py
+LIST_ARCHIVED_LINKS = text(
+    """
+    SELECT tablename FROM pg_tables
+    WHERE schemaname = :schema AND tablename LIKE 'tweet\\_media\\_%'
+    """
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def get_referenced_media_ids(db: AsyncSession, ids: List[int]) -> Set[int]:
+    """id из ids, на которые ссылается tweet_media или ее архивные копии"""
+    archived = await db.execute(LIST_ARCHIVED_LINKS, {"schema": ARCHIVE_SCHEMA})
+    tables = ["tweet_media"]
+    tables += [f"{ARCHIVE_SCHEMA}.{name}" for name in archived.scalars()]
+
+    referenced = set()
+    for table in tables:
+        result = await db.execute(
+            text(f"SELECT media_id FROM {table} WHERE media_id = ANY(:ids)"),
+            {"ids": ids},
+        )
+        referenced.update(result.scalars())
+    return referenced
+
+
+async def collect_orphaned_media(
+    db: AsyncSession,
+    grace_hours: float = MEDIA_GC_GRACE_HOURS,
+    batch_size: int = MEDIA_GC_BATCH_SIZE,
+) -> int:
+    """Удаляет брошенные медиа основной БД, возвращает их число"""
+    deleted = 0
+    after_id = 0
+    while True:
+        candidates = await db.execute(
+            SELECT_CANDIDATES,
+            {
+                "after_id": after_id,
+                "grace_seconds": grace_hours * 3600,
+                "limit": batch_size,
+            },
+        )
+        candidates = candidates.scalars().all()
+        if not candidates:
+            await db.rollback()
+            break
+        after_id = candidates[-1]
+
+        # Ссылки из архивных секций и других шардов; пропущенные кандидаты
+        # остаются за after_id и не выбираются повторно
+        referenced = await get_referenced_media_ids(db, candidates)
+        for shard in range(1, len(shard_router)):
+            async with shard_router.session(db, shard) as shard_db:
+                referenced |= await get_referenced_media_ids(shard_db, candidates)
+
+        orphans = [id for id in candidates if id not in referenced]
+        if orphans:
+            result = await db.execute(DELETE_MEDIA, {"ids": orphans})
+            deleted += result.rowcount
+        await db.commit()
+
+        if len(candidates) < batch_size:
+            break
+
+    if deleted:
+        logger.info("deleted %s orphaned media", deleted)
+    return deleted
+
+
+async def main():
+    from src.database import async_session
+
+    async with async_session() as db:
+        deleted = await collect_orphaned_media(db=db)
+    await shard_router.dispose()
+    print(json.dumps({"deleted": deleted}))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -1,21 +1,41 @@
-from random import randint
+import heapq
+from random import choice, randint
 from typing import Optional
 
+from config import SCORE_GRAVITY, SCORE_REFRESH_WINDOW_DAYS
 from sqlalchemy import (
     ARRAY,
+    BigInteger,
     CheckConstraint,
     Column,
+    DateTime,
+    Float,
     ForeignKey,
+    Index,
     Integer,
     LargeBinary,
+    Sequence,
     String,
     UniqueConstraint,
+    case,
+    delete,
+    exists,
+    func,
+    or_,
     select,
+    text,
+    update,
 )
+from sqlalchemy.dialects.postgresql import JSONB, insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import relationship, selectinload
-from src.database import Base
+from src.counters import like_counter
+from src.database import Base, shard_router
+from src.events import broker
+from src.graph import follower_graph
+from src.invalidation import invalidation_bus
+from src.singleflight import SingleFlight
 from src.test_user_data import TEST_TWEETS_DATA, TEST_USER_DATA
 
 
@@ -25,6 +45,9 @@ class Follower(Base):
     id = Column(Integer, primary_key=True)
     follower_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     followee_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    created_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
 
     follower = relationship(
         "User", foreign_keys=[follower_id], back_populates="following"
@@ -66,23 +89,44 @@ class Tweet(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     text = Column(String, nullable=False)
     media = Column("my_array", ARRAY(Integer), nullable=True)
+    created_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    # Рейтинг с затуханием по времени, пересчитывается refresh_tweet_scores
+    score = Column(Float, nullable=False, server_default="0")
+    # Число лайков, обновляется пачками через src/counters.py
+    like_count = Column(Integer, nullable=False, server_default="0")
 
     user = relationship("User", back_populates="tweets")
-    likes = relationship("Like", back_populates="tweet")
+    likes = relationship("Like", back_populates="tweet", order_by="Like.id")
     comments = relationship("Comment", back_populates="tweet")
 
+    __table_args__ = (
+        Index("ix_tweets_score_id", score.desc(), id.desc()),
+        Index("ix_tweets_created_at", created_at.desc()),
+    )
+
 
 class Like(Base):
     __tablename__ = "likes"
 
-    id = Column(Integer, primary_key=True)
+    # tweet_id входит в первичный ключ: в БД likes секционирована по его хэшу,
+    # и удаление лайка по ключу попадает в одну секцию
+    id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    tweet_id = Column(Integer, ForeignKey("tweets.id"), nullable=False)
+    tweet_id = Column(Integer, ForeignKey("tweets.id"), primary_key=True)
+    created_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
 
     user = relationship("User", back_populates="likes")
     tweet = relationship("Tweet", back_populates="likes")
 
-    __table_args__ = (UniqueConstraint("user_id", "tweet_id", name="uq_user_tweet"),)
+    __table_args__ = (
+        UniqueConstraint("user_id", "tweet_id", name="uq_user_tweet"),
+        # Подсчет лайков твита и постраничный вывод лайкнувших
+        Index("ix_likes_tweet_id_id", "tweet_id", "id"),
+    )
 
 
 class Comment(Base):
@@ -104,6 +148,89 @@ class Media(Base):
     filename = Column(String, nullable=False)
     data = Column(LargeBinary, nullable=False)
     mimetype = Column(String, nullable=False)
+    # Загрузки моложе периода ожидания не удаляются сборщиком src/media_gc.py
+    created_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+
+class TweetMedia(Base):
+    """
+    Медиа твита. Tweet.media остается для чтения ленты, а эта таблица
+    нужна, чтобы находить медиа без твитов. Внешнего ключа на medias нет:
+    твиты могут лежать в других шардах, а медиа - только в основной БД
+    """
+
+    __tablename__ = "tweet_media"
+
+    tweet_id = Column(
+        Integer, ForeignKey("tweets.id", ondelete="CASCADE"), primary_key=True
+    )
+    position = Column(Integer, primary_key=True)
+    media_id = Column(Integer, nullable=False)
+
+    __table_args__ = (Index("ix_tweet_media_media_id", "media_id"),)
+
+
+# Глобальная версия ленты: растет при любом изменении твитов, лайков и рейтинга.
+# Sequence не блокирует строки и не откатывается, в отличие от счетчика в таблице
+feed_version_seq = Sequence("feed_version_seq", metadata=Base.metadata)
+
+
+class FeedVersion(Base):
+    """Версия ленты конкретного зрителя: растет при изменении его подписок"""
+
+    __tablename__ = "feed_versions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    version = Column(BigInteger, nullable=False, server_default="1")
+
+
+class UserSuggestion(Base):
+    """Рекомендация на кого подписаться, считается пакетно в src/suggestions.py"""
+
+    __tablename__ = "user_suggestions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    candidate_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    score = Column(Float, nullable=False)
+
+
+class OutboxEvent(Base):
+    """Событие для фоновой обработки, пишется в одной транзакции с изменением"""
+
+    __tablename__ = "outbox"
+
+    id = Column(BigInteger, primary_key=True)
+    topic = Column(String, nullable=False)
+    payload = Column(JSONB, nullable=False)
+    attempts = Column(Integer, nullable=False, server_default="0")
+    last_error = Column(String, nullable=True)
+    created_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    available_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    failed_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index(
+            "ix_outbox_pending",
+            "available_at",
+            "id",
+            postgresql_where=text("failed_at IS NULL"),
+        ),
+    )
+
+
+def add_outbox_event(db: AsyncSession, topic: str, **payload):
+    """
+    Добавляет событие в outbox текущей транзакции, коммит делает вызывающий.
+    Событие пишется только там, где на его тему есть обработчик в src/outbox.py
+    """
+    db.add(OutboxEvent(topic=topic, payload=payload))
 
 
 async def add_tweet(
@@ -120,8 +247,18 @@ async def add_tweet(
         media=tweet_media_ids,
     )
     db.add(tweet)
+    await db.flush()
+    db.add_all(
+        TweetMedia(tweet_id=tweet.id, position=position, media_id=media_id)
+        for position, media_id in enumerate(tweet_media_ids or [], start=1)
+        if media_id is not None
+    )
+    event = {"type": "tweet_created", "tweet_id": tweet.id, "author_id": user_id}
+    await invalidation_bus.publish(db, tags=["feed"], event=event)
     await db.commit()
+    broker.deliver(event)
     await db.refresh(tweet)
+    await bump_feed_version(db=db)
     return tweet
 
 
@@ -138,9 +275,54 @@ async def add_user(
     db.add(user)
     await db.commit()
     await db.refresh(user)
+
+    # Копия пользователя в остальных шардах для внешних ключей твитов и лайков.
+    # При сбое пользователь удаляется отовсюду, иначе повторная регистрация
+    # с тем же api_key упрется в уникальность уже созданной копии
+    user_id = user.id
+    try:
+        await replicate_users(db=db, ids=[user_id])
+    except Exception:
+        await db.rollback()
+        for shard in reversed(range(len(shard_router))):
+            async with shard_router.session(db, shard) as shard_db:
+                await shard_db.execute(delete(User).where(User.id == user_id))
+                await shard_db.commit()
+        raise
     return user
 
 
+async def replicate_users(db: AsyncSession, ids: Optional[list] = None) -> None:
+    """
+    Копирует пользователей основной БД (всех или ids) в остальные шарды.
+    Копии обновляются на месте, поэтому вызов можно повторять
+    """
+    if len(shard_router) == 1:
+        return
+
+    statement = select(
+        User.id, User.api_key, User.username, User.name, User.surname
+    ).order_by(User.id)
+    if ids is not None:
+        statement = statement.where(User.id.in_(ids))
+    users = [dict(row) for row in (await db.execute(statement)).mappings()]
+
+    for shard in range(1, len(shard_router)):
+        async with shard_router.session(db, shard) as shard_db:
+            for start in range(0, len(users), 1000):
+                upsert = insert(User).values(users[start : start + 1000])
+                await shard_db.execute(
+                    upsert.on_conflict_do_update(
+                        index_elements=[User.id],
+                        set_={
+                            column: upsert.excluded[column]
+                            for column in ("api_key", "username", "name", "surname")
+                        },
+                    )
+                )
+            await shard_db.commit()
+
+
 async def add_media(
     db: AsyncSession, filename: str, data: bytes, mimetype: str
 ) -> Optional[Media]:
@@ -152,18 +334,15 @@ async def add_media(
     return media
 
 
-async def get_user_by_apikey(db: AsyncSession, api_key: str) -> User:
-    """Выдает пользователя по apikey"""
-    user = await db.execute(select(User).where(User.api_key == api_key))
-    user = user.scalars().first()
-    return user
-
-
-async def get_tweet_by_id(db: AsyncSession, tweet_id: int) -> Tweet:
-    """Выдает твит по id"""
-    tweet = await db.execute(select(Tweet).where(Tweet.id == tweet_id))
-    tweet = tweet.scalar()
-    return tweet
+async def record_like_delta(db: AsyncSession, tweet_id: int, delta: int):
+    """
+    Учитывает лайк в счетчике. При отложенной записи like_count догонит при
+    сбросе, а списки лайкнувших уже изменились: версия ленты растет сразу,
+    иначе условный GET до сброса получит 304 со старыми лайками
+    """
+    await like_counter.record(db=db, tweet_id=tweet_id, delta=delta)
+    if like_counter.running:
+        await bump_feed_version(db=db)
 
 
 async def add_like(db: AsyncSession, tweet_id: int, user_id: int) -> Optional[Like]:
@@ -171,19 +350,52 @@ async def add_like(db: AsyncSession, tweet_id: int, user_id: int) -> Optional[Li
     like = Like(tweet_id=tweet_id, user_id=user_id)
     try:
         db.add(like)
+        event = {"type": "like_added", "tweet_id": tweet_id, "user_id": user_id}
+        await invalidation_bus.publish(db, tags=["feed"], event=event)
         await db.commit()
         await db.refresh(like)
     except IntegrityError:
         return None
+    broker.deliver(event)
+    await record_like_delta(db=db, tweet_id=tweet_id, delta=1)
     return like
 
 
-async def get_like(db: AsyncSession, tweet_id: int, user_id: int) -> Like:
-    like = await db.execute(
-        select(Like).where(Like.tweet_id == tweet_id, Like.user_id == user_id)
+async def remove_like(db: AsyncSession, like):
+    """Убирает лайк (строка из queries.get_like)"""
+    from src import queries
+
+    await db.execute(
+        queries.DELETE_LIKE, {"like_id": like.id, "tweet_id": like.tweet_id}
     )
-    like = like.scalar()
-    return like
+    event = {"type": "like_removed", "tweet_id": like.tweet_id, "user_id": like.user_id}
+    await invalidation_bus.publish(db, tags=["feed"], event=event)
+    await db.commit()
+    broker.deliver(event)
+    await record_like_delta(db=db, tweet_id=like.tweet_id, delta=-1)
+
+
+async def delete_tweet(db: AsyncSession, tweet):
+    """
+    Удаляет твит (строка из queries.get_tweet_by_id) вместе с его лайками.
+    Связи с медиа удаляются каскадом, сами медиа - сборщиком src/media_gc.py
+    """
+    from src import queries
+
+    params = {"tweet_id": tweet.id}
+    await db.execute(queries.DELETE_TWEET_LIKES, params)
+    await db.execute(queries.DELETE_TWEET_COMMENTS, params)
+    await db.execute(queries.DELETE_TWEET, params)
+    event = {"type": "tweet_deleted", "tweet_id": tweet.id, "author_id": tweet.user_id}
+    await invalidation_bus.publish(db, tags=["feed"], event=event)
+    await db.commit()
+    broker.deliver(event)
+    await bump_feed_version(db=db)
+
+
+def follow_tags(follower_id: int, followee_id: int) -> list:
+    """Теги кэша, которые устаревают при изменении подписки"""
+    return [f"feed:{follower_id}", f"profile:{follower_id}", f"profile:{followee_id}"]
 
 
 async def add_following(
@@ -199,10 +411,23 @@ async def add_following(
     try:
         follower = Follower(follower_id=user_follower_id, followee_id=user_followee_id)
         db.add(follower)
+        add_outbox_event(
+            db,
+            "follow_added",
+            follower_id=user_follower_id,
+            followee_id=user_followee_id,
+        )
+        await invalidation_bus.publish(
+            db,
+            tags=follow_tags(user_follower_id, user_followee_id),
+            follow=(user_follower_id, user_followee_id, True),
+        )
         await db.commit()
         await db.refresh(follower)
     except IntegrityError:
         return None
+    follower_graph.add(user_follower_id, user_followee_id)
+    await bump_feed_version(db=db, user_id=user_follower_id)
     return follower
 
 
@@ -216,28 +441,186 @@ async def remove_following(
         user_follower_id (int): юзер, который подписан на друго юзера
         user_followee_id (int): юзер, на которого подписан другой юзер
     """
+    from src import queries
+
     follower = await db.execute(
-        select(Follower).where(
-            Follower.follower_id == user_follower_id,
-            Follower.followee_id == user_followee_id,
-        )
+        queries.DELETE_FOLLOW,
+        {"follower_id": user_follower_id, "followee_id": user_followee_id},
     )
-    follower = follower.scalar()
+    follower = follower.first()
 
     if not follower:
+        await db.rollback()
         return None
 
-    await db.delete(follower)
+    await invalidation_bus.publish(
+        db,
+        tags=follow_tags(user_follower_id, user_followee_id),
+        follow=(user_follower_id, user_followee_id, False),
+    )
     await db.commit()
+    follower_graph.remove(user_follower_id, user_followee_id)
+    await bump_feed_version(db=db, user_id=user_follower_id)
     return follower
 
 
-async def get_all_tweets(db: AsyncSession) -> list:
-    """Выводит все твиты согласно схемы из ТЗ"""
+def window_start(window_days: int):
+    """Начало окна пересчета рейтинга"""
+    return func.now() - func.make_interval(0, 0, 0, window_days)
+
+
+def tweet_score_expression(
+    like_count=Tweet.like_count, window_days: int = SCORE_REFRESH_WINDOW_DAYS
+):
+    """
+    Рейтинг твита: количество лайков, затухающее со временем
+    likes / (age_hours + 2) ^ SCORE_GRAVITY.
+    Твиты старше окна пересчета получают 0: фоновый пересчет их больше
+    не трогает, и застывший рейтинг не держал бы их выше свежих
+    """
+    age_hours = func.extract("epoch", func.now() - Tweet.created_at) / 3600
+    return case(
+        (
+            Tweet.created_at >= window_start(window_days),
+            like_count / func.power(age_hours + 2, SCORE_GRAVITY),
+        ),
+        else_=0,
+    )
+
+
+async def recount_likes(db: AsyncSession) -> None:
+    """
+    Пересчитывает like_count и рейтинг всех твитов по таблице likes.
+    Для начального наполнения: при работающем сбросе счетчиков
+    дельты из памяти добавились бы к уже учтенным лайкам
+    """
+    like_count = (
+        select(func.count(Like.id)).where(Like.tweet_id == Tweet.id).scalar_subquery()
+    )
+    await db.execute(
+        update(Tweet)
+        .values(like_count=like_count, score=tweet_score_expression(like_count))
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    await bump_feed_version(db=db)
+
+
+async def refresh_tweet_scores(
+    db: AsyncSession, tweet_ids: Optional[list] = None, window_days: int = None
+) -> None:
+    """
+    Пересчитывает рейтинг твитов
+
+    Атрибуты:
+        tweet_ids (list): пересчитать только эти твиты
+        window_days (int): пересчитать только твиты моложе указанного числа дней
+            и обнулить рейтинг вышедших из окна
+    """
+    window = SCORE_REFRESH_WINDOW_DAYS if window_days is None else window_days
+    stmt = update(Tweet).values(score=tweet_score_expression(window_days=window))
+
+    if window_days is not None:
+        stmt = stmt.where(
+            or_(Tweet.created_at >= window_start(window_days), Tweet.score > 0)
+        )
+
+    if tweet_ids is not None:
+        stmt = stmt.where(Tweet.id.in_(tweet_ids))
+
+    await db.execute(stmt.execution_options(synchronize_session=False))
+    await db.commit()
+    await bump_feed_version(db=db)
+
+
+async def bump_feed_version(db: AsyncSession, user_id: int = None):
+    """
+    Увеличивает глобальную версию ленты или версию ленты зрителя.
+    Вызывается после коммита изменения: иначе клиент мог бы получить
+    новую версию вместе со старыми данными и закэшировать их по ETag
+    """
+    if user_id is None:
+        await db.execute(select(feed_version_seq.next_value()))
+    else:
+        await db.execute(
+            insert(FeedVersion)
+            .values(user_id=user_id)
+            .on_conflict_do_update(
+                index_elements=[FeedVersion.user_id],
+                set_={"version": FeedVersion.version + 1},
+            )
+        )
+    await db.commit()
+
+
+async def get_feed_version(db: AsyncSession, api_key: str) -> Optional[str]:
+    """
+    Версия ленты зрителя одним запросом: глобальная версия и версия подписок.
+    None, если пользователя с таким api_key нет
+    """
+    version = await db.execute(
+        select(
+            text("(SELECT last_value FROM feed_version_seq)"),
+            func.coalesce(FeedVersion.version, 0),
+        )
+        .select_from(User)
+        .outerjoin(FeedVersion, FeedVersion.user_id == User.id)
+        .where(User.api_key == api_key)
+    )
+    version = version.first()
+    if version is None:
+        return None
+    global_version, viewer_version = version
+
+    # Каждый шард считает свою версию, их сумма растет при любом изменении
+    if len(shard_router) > 1:
+        shard_versions = await shard_router.scatter(
+            db, _get_shard_feed_version, shards=range(1, len(shard_router))
+        )
+        global_version += sum(shard_versions)
+    return f"{global_version}.{viewer_version}"
+
+
+async def _get_shard_feed_version(db: AsyncSession) -> int:
+    version = await db.execute(text("SELECT last_value FROM feed_version_seq"))
+    return version.scalar()
+
+
+def merge_shard_tweets(shard_tweets: list) -> list:
+    """Сливает упорядоченные по рейтингу ленты шардов в одну"""
+    if len(shard_tweets) == 1:
+        return shard_tweets[0]
+    return list(
+        heapq.merge(*shard_tweets, key=lambda tweet: (-tweet["score"], -tweet["id"]))
+    )
+
+
+feed_flight = SingleFlight()
+profile_flight = SingleFlight()
+media_flight = SingleFlight()
+
+
+async def get_all_tweets(db: AsyncSession, version: str = None) -> list:
+    """
+    Выводит все твиты согласно схемы из ТЗ, упорядоченные по рейтингу.
+    Конкурентные запросы ленты одной версии выполняют один общий запрос к БД:
+    запрос, начатый до смены версии, не отдается читателям новой версии
+    """
+    return await feed_flight.do(("feed", version), lambda: _gather_all_tweets(db=db))
+
+
+async def _gather_all_tweets(db: AsyncSession) -> list:
+    """Собирает ленту со всех шардов"""
+    return merge_shard_tweets(await shard_router.scatter(db, _get_all_tweets))
+
+
+async def _get_all_tweets(db: AsyncSession) -> list:
     tweets_result = await db.execute(
-        select(Tweet).options(
+        select(Tweet)
+        .options(
             selectinload(Tweet.user), selectinload(Tweet.likes).selectinload(Like.user)
         )
+        .order_by(Tweet.score.desc(), Tweet.id.desc())
     )
     tweets = tweets_result.scalars().all()
     result = []
@@ -262,16 +645,76 @@ async def get_all_tweets(db: AsyncSession) -> list:
             "attachments": attachments,
             "author": {"id": tweet.user.id, "name": tweet.user.username},
             "likes": likes_data,
+            "score": tweet.score,
         }
 
         result.append(tweet_data)
     return result
 
 
+async def get_compact_tweets(db: AsyncSession, user_id: int) -> list:
+    """
+    Выдает все твиты без списков лайкнувших: число лайков из счетчика
+    твита и признак лайка зрителя, одним запросом
+    """
+    liked_by_me = exists().where(Like.tweet_id == Tweet.id, Like.user_id == user_id)
+
+    statement = (
+        select(
+            Tweet.id,
+            Tweet.text,
+            Tweet.media,
+            User.id,
+            User.username,
+            Tweet.like_count,
+            liked_by_me,
+            Tweet.score,
+        )
+        .join(User, User.id == Tweet.user_id)
+        .order_by(Tweet.score.desc(), Tweet.id.desc())
+    )
+
+    async def get_shard_tweets(shard_db: AsyncSession) -> list:
+        tweets_result = await shard_db.execute(statement)
+        return [
+            {
+                "id": id,
+                "content": content,
+                "attachments": [f"/api/medias/{media_id}" for media_id in media or []],
+                "author": {"id": author_id, "name": author_name},
+                "like_count": likes,
+                "liked_by_me": liked,
+                "score": score,
+            }
+            for id, content, media, author_id, author_name, likes, liked, score in (
+                tweets_result
+            )
+        ]
+
+    return merge_shard_tweets(await shard_router.scatter(db, get_shard_tweets))
+
+
+async def get_tweet_likes(
+    db: AsyncSession, tweet_id: int, after_id: int = 0, limit: int = 100
+) -> list:
+    """Выдает лайкнувших твит постранично, после лайка с id after_id"""
+    likes = await db.execute(
+        select(Like.id, User.id, User.username)
+        .join(User, User.id == Like.user_id)
+        .where(Like.tweet_id == tweet_id, Like.id > after_id)
+        .order_by(Like.id)
+        .limit(limit)
+    )
+    return [
+        {"id": like_id, "user_id": user_id, "name": name}
+        for like_id, user_id, name in likes.all()
+    ]
+
+
 async def sorted_tweets(db: AsyncSession, following_ids: list, tweets: list):
     """
-    Сортирует твиты по принципу - сначала идут твиты тех, на кого подписан пользователь,
-    отсортированные по количеству лайков
+    Сортирует твиты по принципу - сначала идут твиты тех, на кого подписан пользователь.
+    Внутри групп сохраняется порядок по рейтингу, в котором твиты пришли из БД
 
     Атрибуты:
         db: сессия базы данных
@@ -279,9 +722,9 @@ async def sorted_tweets(db: AsyncSession, following_ids: list, tweets: list):
         tweets (list): список твитов в формате Tweet из schemas.py
     """
     if not following_ids:
-        result = sorted(tweets, key=lambda x: len(x["likes"]), reverse=True)
-        return result
+        return tweets
 
+    following_ids = set(following_ids)
     tweets_is_following = [
         tweet for tweet in tweets if tweet["author"]["id"] in following_ids
     ]
@@ -289,38 +732,27 @@ async def sorted_tweets(db: AsyncSession, following_ids: list, tweets: list):
         tweet for tweet in tweets if tweet["author"]["id"] not in following_ids
     ]
 
-    sorted_tweets_is_following = sorted(
-        tweets_is_following, key=lambda x: len(x["likes"]), reverse=True
-    )
-    sorted_tweets_is_not_following = sorted(
-        tweets_is_not_following, key=lambda x: len(x["likes"]), reverse=True
-    )
-    merge_list_tweets = sorted_tweets_is_following + sorted_tweets_is_not_following
+    merge_list_tweets = tweets_is_following + tweets_is_not_following
     return merge_list_tweets
 
 
 async def get_profile(db: AsyncSession, id: int, name: str):
-    """Выдает профиль пользователя согласно схеме из ТЗ"""
-    followers = await db.execute(
-        select(Follower)
-        .where(Follower.followee_id == id)
-        .options(selectinload(Follower.follower))
-    )
-    followees = await db.execute(
-        select(Follower)
-        .where(Follower.follower_id == id)
-        .options(selectinload(Follower.followee))
+    """
+    Выдает профиль пользователя согласно схеме из ТЗ.
+    Конкурентные запросы одного профиля выполняют один общий запрос к БД
+    """
+    return await profile_flight.do(
+        (id, name), lambda: _get_profile(db=db, id=id, name=name)
     )
-    followers = followers.scalars().all()
-    followees = followees.scalars().all()
-    followers = [
-        {"id": follower.follower.id, "name": follower.follower.name}
-        for follower in followers
-    ]
-    followees = [
-        {"id": followee.followee.id, "name": followee.followee.name}
-        for followee in followees
-    ]
+
+
+async def _get_profile(db: AsyncSession, id: int, name: str):
+    if follower_graph.loaded:
+        return await _get_profile_from_graph(db=db, id=id, name=name)
+
+    from src import queries
+
+    followers, followees = await queries.get_follow_lists(db=db, user_id=id)
 
     result = {
         "id": id,
@@ -332,8 +764,125 @@ async def get_profile(db: AsyncSession, id: int, name: str):
     return result
 
 
+async def _get_profile_from_graph(db: AsyncSession, id: int, name: str):
+    """Профиль по индексу подписок: остается только один запрос за именами"""
+    follower_ids = list(follower_graph.followers(id))
+    following_ids = list(follower_graph.following(id))
+
+    names = {}
+    if follower_ids or following_ids:
+        users = await db.execute(
+            select(User.id, User.name).where(
+                User.id.in_(set(follower_ids + following_ids))
+            )
+        )
+        names = dict(users.all())
+
+    return {
+        "id": id,
+        "name": name,
+        "followers": [
+            {"id": user_id, "name": names[user_id]}
+            for user_id in follower_ids
+            if user_id in names
+        ],
+        "following": [
+            {"id": user_id, "name": names[user_id]}
+            for user_id in following_ids
+            if user_id in names
+        ],
+    }
+
+
+async def get_profiles(db: AsyncSession, users: list) -> list:
+    """
+    Профили нескольких пользователей (строки id, username) в порядке списка.
+    Подписки выбираются запросами на весь список, а не на каждого пользователя
+    """
+    ids = [user.id for user in users]
+    if follower_graph.loaded:
+        followers_of = {id: list(follower_graph.followers(id)) for id in ids}
+        following_of = {id: list(follower_graph.following(id)) for id in ids}
+        related_ids = set()
+        for related in (*followers_of.values(), *following_of.values()):
+            related_ids.update(related)
+
+        names = {}
+        if related_ids:
+            names_result = await db.execute(
+                select(User.id, User.name).where(User.id.in_(related_ids))
+            )
+            names = dict(names_result.all())
+
+        for lists in (followers_of, following_of):
+            for id, related in lists.items():
+                lists[id] = [
+                    {"id": user_id, "name": names[user_id]}
+                    for user_id in related
+                    if user_id in names
+                ]
+    else:
+        from src import queries
+
+        followers_of, following_of = await queries.get_follow_lists_many(db=db, ids=ids)
+
+    return [
+        {
+            "id": user.id,
+            "name": user.username,
+            "followers": followers_of[user.id],
+            "following": following_of[user.id],
+        }
+        for user in users
+    ]
+
+
+async def get_tweets_by_ids(db: AsyncSession, ids: list) -> list:
+    """
+    Твиты по списку id в порядке списка, ненайденные пропускаются.
+    Запрос уходит только на шарды, которым принадлежат id
+    """
+    from src import queries
+
+    shards = sorted({shard_router.for_tweet(id) for id in ids})
+    shard_tweets = await shard_router.scatter(
+        db, lambda shard_db: queries.get_tweets_by_ids(db=shard_db, ids=ids), shards
+    )
+    tweets = {tweet["id"]: tweet for chunk in shard_tweets for tweet in chunk}
+    return [tweets[id] for id in ids if id in tweets]
+
+
+async def get_following_ids(db: AsyncSession, user_id: int) -> list:
+    """Выдает id пользователей, на которых подписан пользователь"""
+    if follower_graph.loaded:
+        return list(follower_graph.following(user_id))
+
+    from src import queries
+
+    return await queries.get_following_ids_from_db(db=db, user_id=user_id)
+
+
+async def get_suggestions(db: AsyncSession, user_id: int, limit: int) -> list:
+    """Выдает рекомендации пользователя одним чтением по первичному ключу"""
+    suggestions = await db.execute(
+        select(User.id, User.name, UserSuggestion.score)
+        .join(User, User.id == UserSuggestion.candidate_id)
+        .where(UserSuggestion.user_id == user_id)
+        .order_by(UserSuggestion.rank)
+        .limit(limit)
+    )
+    return [
+        {"id": id, "name": name, "score": score}
+        for id, name, score in suggestions.all()
+    ]
+
+
 async def get_media(db: AsyncSession, id: int):
-    """Выдает медиа файл по id"""
+    """Выдает медиа файл по id, одинаковые конкурентные запросы объединяются"""
+    return await media_flight.do(id, lambda: _get_media(db=db, id=id))
+
+
+async def _get_media(db: AsyncSession, id: int):
     media_res = await db.execute(select(Media.data).where(Media.id == id))
     media = media_res.scalar()
     return media
@@ -352,15 +901,10 @@ async def create_data(db: AsyncSession):
         users.append(user)
 
     # Tweets
-    for text in TEST_TWEETS_DATA:
-        tweet = Tweet(user_id=randint(1, 20), text=text)
+    for tweet_text in TEST_TWEETS_DATA:
+        tweet = Tweet(user_id=randint(1, 20), text=tweet_text)
         tweets.append(tweet)
 
-    # Likes
-    for user_id in range(1, 21):
-        like = Like(user_id=user_id, tweet_id=randint(1, 40))
-        likes.append(like)
-
     # Followings
     for follower_id in range(1, 21):
         followee_id = randint(1, 20)
@@ -376,9 +920,34 @@ async def create_data(db: AsyncSession):
 
     db.add_all(users)
     await db.commit()
-    db.add_all(tweets)
-    await db.commit()
-    db.add_all(likes)
-    await db.commit()
+    await replicate_users(db=db)
+
+    # Твиты пишутся в шард автора, id известны только после вставки
+    tweet_ids = []
+    for shard in range(len(shard_router)):
+        shard_tweets = [
+            tweet for tweet in tweets if shard_router.for_user(tweet.user_id) == shard
+        ]
+        async with shard_router.session(db, shard) as shard_db:
+            shard_db.add_all(shard_tweets)
+            await shard_db.flush()
+            tweet_ids.extend(tweet.id for tweet in shard_tweets)
+            await shard_db.commit()
+
+    # Likes, в шард твита
+    for user_id in range(1, 21):
+        like = Like(user_id=user_id, tweet_id=choice(tweet_ids))
+        likes.append(like)
+
+    for shard in range(len(shard_router)):
+        async with shard_router.session(db, shard) as shard_db:
+            shard_db.add_all(
+                like for like in likes if shard_router.for_tweet(like.tweet_id) == shard
+            )
+            await shard_db.commit()
+            await recount_likes(db=shard_db)
+
     db.add_all(followings)
     await db.commit()
+    await invalidation_bus.publish(db, clear=True)
+    await db.commit()
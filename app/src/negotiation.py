@@ -0,0 +1,166 @@
+"""
+Ответы и тела запросов в MessagePack для машинных клиентов
+
+Формат ответа выбирается по Accept: application/msgpack (или
+application/x-msgpack) с q не ниже, чем у application/json. Выбор
+сохраняется в contextvar, его читают NegotiatedResponse (класс ответов
+роутера по умолчанию) и json_response в routes.py. Без заголовка,
+с */* и без установленного msgpack ответы остаются JSON.
+Тела TweetIn и UserIn в msgpack перекодируются в JSON до роутинга
+"""
+
+import json
+from contextvars import ContextVar
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import msgpack
+except ImportError:  # msgpack - необязательная зависимость
+    msgpack = None
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack")
+
+# Эндпоинты с JSON телом: POST /api/tweets (TweetIn) и POST /api/users (UserIn)
+MSGPACK_BODY_ROUTES = {("POST", "/api/tweets"), ("POST", "/api/users")}
+
+response_format: ContextVar[str] = ContextVar("response_format", default="json")
+
+
+def accepts_msgpack(accept: str) -> bool:
+    """Проверяет Accept с учетом q-значений: msgpack только если назван явно"""
+    if msgpack is None or not accept:
+        return False
+
+    accepted = {}
+    for item in accept.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        accepted[name.strip().lower()] = quality
+
+    msgpack_quality = max(accepted.get(name, 0.0) for name in MSGPACK_MEDIA_TYPES)
+    return msgpack_quality > 0 and msgpack_quality >= accepted.get(
+        "application/json", 0.0
+    )
+
+
+def transcode_json(content: str) -> bytes:
+    """Уже отрендеренный JSON (например из кэша ответов) в msgpack"""
+    return msgpack.packb(json.loads(content))
+
+
+def pack_model(model: BaseModel) -> bytes:
+    """Модель ответа в msgpack напрямую, без промежуточной строки JSON"""
+    return msgpack.packb(model.model_dump(mode="json"))
+
+
+class NegotiatedResponse(JSONResponse):
+    """JSONResponse, который в msgpack-запросе кодирует содержимое в msgpack"""
+
+    def __init__(self, content: Any, *args, **kwargs):
+        if response_format.get() == "msgpack":
+            self.media_type = MSGPACK_MEDIA_TYPE
+        super().__init__(content, *args, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        if self.media_type == MSGPACK_MEDIA_TYPE:
+            return msgpack.packb(content)
+        return super().render(content)
+
+
+class MsgpackMiddleware:
+    """
+    Выбирает формат ответа по Accept и добавляет Vary: Accept.
+    Тело запроса в msgpack для MSGPACK_BODY_ROUTES перекодирует в JSON:
+    валидация pydantic и обработчики остаются прежними
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or msgpack is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        content_type = headers.get("content-type", "").partition(";")[0].strip()
+        if (
+            content_type.lower() in MSGPACK_MEDIA_TYPES
+            and (scope["method"], scope["path"]) in MSGPACK_BODY_ROUTES
+        ):
+            try:
+                scope, receive = await self.decode_body(scope, receive)
+            except ValueError as exc:
+                response = JSONResponse(
+                    status_code=400,
+                    content={
+                        "result": False,
+                        "error_type": "MsgpackDecodeError",
+                        "error_message": str(exc),
+                    },
+                )
+                await response(scope, receive, send)
+                return
+
+        async def send_with_vary(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(raw=message["headers"]).add_vary_header("Accept")
+            await send(message)
+
+        fmt = "msgpack" if accepts_msgpack(headers.get("accept", "")) else "json"
+        token = response_format.set(fmt)
+        try:
+            await self.app(scope, receive, send_with_vary)
+        finally:
+            response_format.reset(token)
+
+    @staticmethod
+    async def decode_body(scope, receive):
+        """Читает тело целиком и подменяет его на JSON с тем же содержимым"""
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+
+        try:
+            data = msgpack.unpackb(b"".join(chunks), raw=False)
+            body = json.dumps(data).encode()
+        except Exception as exc:
+            raise ValueError("invalid msgpack body") from exc
+
+        headers = [
+            (name, value)
+            for name, value in scope["headers"]
+            if name not in (b"content-type", b"content-length")
+        ]
+        headers += [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ]
+        scope = {**scope, "headers": headers}
+
+        sent = False
+
+        async def receive_json():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        return scope, receive_json
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Awaitable, Callable
+
+from config import OUTBOX_BATCH_SIZE, OUTBOX_MAX_ATTEMPTS, OUTBOX_POLL_INTERVAL
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database import async_session
+from src.models import OutboxEvent, UserSuggestion
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[AsyncSession, dict], Awaitable[None]]
+handlers = defaultdict(list)
+
+
+def outbox_handler(topic: str):
+    """
+    Регистрирует обработчик событий темы. Обработчик получает сессию
+    и payload, выполняется в savepoint и должен быть идемпотентным:
+    доставка гарантируется как минимум один раз
+    """
+
+    def decorator(handler: Handler) -> Handler:
+        handlers[topic].append(handler)
+        return handler
+
+    return decorator
+
+
+def retry_delay(attempts: int) -> float:
+    """Экспоненциальная задержка перед повтором, не больше 10 минут"""
+    return min(2**attempts, 600)
+
+
+async def process_batch(db: AsyncSession, batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    """
+    Забирает пачку готовых событий с FOR UPDATE SKIP LOCKED, чтобы несколько
+    воркеров не обрабатывали одно событие, и выполняет их обработчики.
+    Успешные события удаляются, упавшие откладываются с задержкой
+
+    Возвращает количество забранных событий
+    """
+    result = await db.execute(
+        select(OutboxEvent)
+        .where(OutboxEvent.failed_at.is_(None), OutboxEvent.available_at <= func.now())
+        .order_by(OutboxEvent.available_at, OutboxEvent.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    events = result.scalars().all()
+
+    for event in events:
+        try:
+            async with db.begin_nested():
+                for handler in handlers[event.topic]:
+                    await handler(db, event.payload)
+        except Exception as exc:
+            event.attempts += 1
+            event.last_error = repr(exc)[:1000]
+            if event.attempts >= OUTBOX_MAX_ATTEMPTS:
+                logger.error("outbox event %s failed permanently: %r", event.id, exc)
+                event.failed_at = func.now()
+            else:
+                event.available_at = func.now() + func.make_interval(
+                    0, 0, 0, 0, 0, 0, retry_delay(event.attempts)
+                )
+        else:
+            await db.delete(event)
+
+    await db.commit()
+    return len(events)
+
+
+@outbox_handler("follow_added")
+async def drop_followed_suggestion(db: AsyncSession, payload: dict):
+    """
+    Убирает из рекомендаций пользователя того, на кого он только что
+    подписался, не дожидаясь пересчета в src/suggestions.py
+    """
+    await db.execute(
+        delete(UserSuggestion).where(
+            UserSuggestion.user_id == payload["follower_id"],
+            UserSuggestion.candidate_id == payload["followee_id"],
+        )
+    )
+
+
+async def run_outbox_worker(
+    batch_size: int = OUTBOX_BATCH_SIZE,
+    poll_interval: float = OUTBOX_POLL_INTERVAL,
+    session_factory=async_session,
+):
+    """Обрабатывает outbox одной БД (шарда), пока задача не отменена"""
+    while True:
+        try:
+            async with session_factory() as db:
+                processed = await process_batch(db=db, batch_size=batch_size)
+        except Exception:
+            logger.exception("outbox batch failed")
+            processed = 0
+
+        # Полная пачка - скорее всего есть еще события, забираем сразу
+        if processed < batch_size:
+            await asyncio.sleep(poll_interval)
+
+
+async def outbox_stats(db: AsyncSession) -> dict:
+    """Глубина очереди и возраст самого старого ожидающего события"""
+    pending = await db.execute(
+        select(
+            func.count(OutboxEvent.id),
+            func.extract("epoch", func.now() - func.min(OutboxEvent.created_at)),
+        ).where(OutboxEvent.failed_at.is_(None))
+    )
+    pending_count, oldest_age = pending.one()
+    failed = await db.execute(
+        select(func.count(OutboxEvent.id)).where(OutboxEvent.failed_at.is_not(None))
+    )
+    return {
+        "pending": pending_count,
+        "failed": failed.scalar(),
+        "oldest_pending_seconds": float(oldest_age or 0),
+    }
@@ -0,0 +1,213 @@
+"""
+Обслуживание секций таблиц tweets и likes
+
+tweets секционирована по диапазонам id: на tweets.id ссылаются внешние ключи,
+а уникальный ключ секционированной таблицы обязан включать ключ секционирования.
+id растут вместе со временем, поэтому секция по id - это и секция по времени.
+likes секционирована по хэшу tweet_id, число ее секций задается миграцией
+
+Команды:
+    python -m src.partitions ensure - создает секции tweets на будущие id
+    python -m src.partitions archive DAYS - отсоединяет секции tweets, в которых
+        все твиты старше DAYS дней, в схему archive вместе с их лайками
+        и ссылками на медиа
+"""
+
+import asyncio
+import json
+import logging
+import re
+import sys
+from typing import List, Optional, Tuple
+
+from config import TWEETS_PARTITION_SIZE, TWEETS_PARTITIONS_AHEAD
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory lock, чтобы обслуживание не шло параллельно из нескольких воркеров
+LOCK_KEY = 734002
+
+ARCHIVE_SCHEMA = "archive"
+
+# Таблицы со ссылкой на tweets.id: их строки уходят в архив вместе с секцией
+DEPENDENT_TABLES = ("likes", "comments", "tweet_media")
+
+# Индексы архивных копий: по ним сборщик медиа проверяет ссылки
+ARCHIVE_INDEXES = {"tweet_media": "media_id"}
+
+BOUND_PATTERN = re.compile(r"FROM \((\d+)\) TO \((\d+)\)")
+
+LIST_PARTITIONS = text(
+    """
+    SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+    FROM pg_inherits
+    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE parent.oid = 'tweets'::regclass
+    """
+)
+
+IS_PARTITIONED = text(
+    "SELECT relkind = 'p' FROM pg_class WHERE oid = 'tweets'::regclass"
+)
+
+MAX_TWEET_ID = text(
+    """
+    SELECT greatest(
+        (SELECT coalesce(max(id), 0) FROM tweets),
+        (SELECT last_value FROM tweets_id_seq)
+    )
+    """
+)
+
+
+def partition_name(lower: int) -> str:
+    return f"tweets_from_{lower}"
+
+
+async def get_tweet_partitions(db: AsyncSession) -> List[Tuple[str, int, int]]:
+    """Секции tweets (имя, нижняя граница, верхняя граница) по возрастанию"""
+    partitions = []
+    for name, bound in await db.execute(LIST_PARTITIONS):
+        match = BOUND_PATTERN.search(bound)
+        if match:
+            partitions.append((name, int(match[1]), int(match[2])))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+async def ensure_tweet_partitions(
+    db: AsyncSession,
+    upto_id: int = 0,
+    size: int = TWEETS_PARTITION_SIZE,
+    ahead: int = TWEETS_PARTITIONS_AHEAD,
+) -> List[str]:
+    """
+    Создает секции tweets так, чтобы за максимальным id (или upto_id)
+    было еще ahead пустых секций. Коммит остается за вызывающим.
+    Для несекционированной таблицы (create_all в тестах) ничего не делает
+    """
+    if not (await db.execute(IS_PARTITIONED)).scalar():
+        return []
+    await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+
+    partitions = await get_tweet_partitions(db)
+    lower = partitions[-1][2] if partitions else 0
+    max_id = max((await db.execute(MAX_TWEET_ID)).scalar(), upto_id)
+    target = (max_id // size + 1 + ahead) * size
+
+    created = []
+    while lower < target:
+        upper = lower + size
+        name = partition_name(lower)
+        await db.execute(
+            text(
+                f"CREATE TABLE {name} PARTITION OF tweets "
+                f"FOR VALUES FROM ({lower}) TO ({upper})"
+            )
+        )
+        created.append(name)
+        lower = upper
+
+    if created:
+        logger.info("created tweet partitions: %s", ", ".join(created))
+    return created
+
+
+async def archive_tweet_partitions(db: AsyncSession, older_than_days: int) -> List[str]:
+    """
+    Отсоединяет старые секции tweets в схему archive. Перед этим строки
+    зависимых таблиц с твитами секции переносятся в archive.<таблица>_<секция>,
+    иначе внешние ключи не дадут отсоединить секцию. Секция с текущим
+    максимальным id не архивируется. Каждая секция - отдельная транзакция
+    """
+    if not (await db.execute(IS_PARTITIONED)).scalar():
+        return []
+
+    archived = []
+    for name, lower, upper in await get_tweet_partitions(db):
+        await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+        max_id = (await db.execute(MAX_TWEET_ID)).scalar()
+        if upper > max_id:
+            await db.rollback()
+            break
+
+        # Пустая секция тоже считается старой
+        is_old = await db.execute(
+            text(
+                "SELECT coalesce("
+                "max(created_at) < now() - make_interval(days => :days), true"
+                f") FROM {name}"
+            ),
+            {"days": older_than_days},
+        )
+        if not is_old.scalar():
+            await db.rollback()
+            break
+
+        await db.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+        for table in DEPENDENT_TABLES:
+            archive_table = f"{ARCHIVE_SCHEMA}.{table}_{name}"
+            await db.execute(
+                text(f"CREATE TABLE IF NOT EXISTS {archive_table} (LIKE {table})")
+            )
+            if table in ARCHIVE_INDEXES:
+                column = ARCHIVE_INDEXES[table]
+                await db.execute(
+                    text(
+                        f"CREATE INDEX IF NOT EXISTS {table}_{name}_{column} "
+                        f"ON {archive_table} ({column})"
+                    )
+                )
+            # Диапазон по tweet_id использует индекс (tweet_id, id) в каждой секции
+            await db.execute(
+                text(
+                    f"WITH moved AS (DELETE FROM {table} "
+                    f"WHERE tweet_id >= :lower AND tweet_id < :upper RETURNING *) "
+                    f"INSERT INTO {archive_table} SELECT * FROM moved"
+                ),
+                {"lower": lower, "upper": upper},
+            )
+        await db.execute(text(f"ALTER TABLE tweets DETACH PARTITION {name}"))
+        await db.execute(text(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}"))
+        await db.commit()
+
+        archived.append(name)
+        logger.info("archived tweet partition %s", name)
+
+    return archived
+
+
+async def maintain_partitions(
+    db: AsyncSession, archive_days: Optional[int] = None
+) -> dict:
+    """Создает будущие секции и, если задано archive_days, архивирует старые"""
+    created = await ensure_tweet_partitions(db=db)
+    await db.commit()
+
+    archived = []
+    if archive_days:
+        archived = await archive_tweet_partitions(db=db, older_than_days=archive_days)
+    return {"created": created, "archived": archived}
+
+
+async def main(command: str, *args: str):
+    from src.database import async_session, engine
+
+    async with async_session() as db:
+        if command == "ensure":
+            result = await maintain_partitions(db=db)
+        elif command == "archive":
+            result = await maintain_partitions(db=db, archive_days=int(args[0]))
+        else:
+            raise SystemExit(__doc__)
+    await engine.dispose()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2:
+        raise SystemExit(__doc__)
+    asyncio.run(main(*sys.argv[1:]))
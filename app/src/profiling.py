@@ -0,0 +1,153 @@
+import asyncio
+import cProfile
+import hmac
+import logging
+import os
+import random
+import re
+import time
+
+from config import (
+    ADMIN_API_KEY,
+    PROFILE_DIR,
+    PROFILE_MAX_SECONDS,
+    PROFILE_SAMPLE_RATE,
+    PROFILE_SKIP_PATHS,
+)
+from starlette.datastructures import Headers
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # pyinstrument - необязательная зависимость
+    Profiler = None
+
+logger = logging.getLogger(__name__)
+
+
+class CProfileRecorder:
+    """Детерминированный профиль cProfile, сохраняется в .pstats"""
+
+    extension = "pstats"
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+
+    def save(self, path: str):
+        self.profiler.dump_stats(path)
+
+
+class PyinstrumentRecorder:
+    """
+    Статистический профиль pyinstrument, сохраняется в .html с flamegraph.
+    В async-режиме учитывается только задача запроса, а не весь event loop
+    """
+
+    extension = "html"
+
+    def __init__(self):
+        self.profiler = Profiler(async_mode="enabled")
+
+    def start(self):
+        self.profiler.start()
+
+    def stop(self):
+        self.profiler.stop()
+
+    def save(self, path: str):
+        with open(path, "w") as file:
+            file.write(self.profiler.output_html())
+
+
+def create_recorder():
+    if Profiler is not None:
+        return PyinstrumentRecorder()
+    return CProfileRecorder()
+
+
+def profile_filename(scope, elapsed: float, extension: str) -> str:
+    """Имя файла: время, метод, шаблон маршрута и длительность запроса"""
+    route = scope.get("route")
+    path = route.path if route is not None else scope["path"]
+    path = re.sub(r"[^A-Za-z0-9_-]+", "_", path).strip("_") or "root"
+    timestamp = time.strftime("%Y%m%dT%H%M%S")
+    return f"{timestamp}_{scope['method']}_{path}_{elapsed * 1000:.0f}ms.{extension}"
+
+
+class ProfilerMiddleware:
+    """
+    Профилирует отдельные запросы без передеплоя: по заголовку x-profile
+    вместе с api-key администратора или случайную долю запросов.
+    Профиль пишется в PROFILE_DIR. Одновременно профилируется один запрос:
+    профилировщики Python работают на весь поток, поэтому потоковые
+    эндпоинты не выбираются случайно, а профиль обрезается по max_seconds
+    """
+
+    def __init__(
+        self,
+        app,
+        profile_dir: str = PROFILE_DIR,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        skip_paths: list = PROFILE_SKIP_PATHS,
+        max_seconds: float = PROFILE_MAX_SECONDS,
+    ):
+        self.app = app
+        self.profile_dir = profile_dir
+        self.sample_rate = sample_rate
+        self.skip_paths = tuple(skip_paths)
+        self.max_seconds = max_seconds
+        self.busy = False
+
+    def should_profile(self, scope) -> bool:
+        if self.busy:
+            return False
+        if (
+            self.sample_rate
+            and not scope["path"].startswith(self.skip_paths)
+            and random.random() < self.sample_rate
+        ):
+            return True
+
+        headers = Headers(scope=scope)
+        if not ADMIN_API_KEY or "x-profile" not in headers:
+            return False
+        return hmac.compare_digest(headers.get("api-key", ""), ADMIN_API_KEY)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self.busy = True
+        recorder = create_recorder()
+        started = time.perf_counter()
+        elapsed = None
+
+        def stop():
+            nonlocal elapsed
+            if elapsed is None:
+                recorder.stop()
+                elapsed = time.perf_counter() - started
+                self.busy = False
+
+        timer = asyncio.get_running_loop().call_later(self.max_seconds, stop)
+        recorder.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            timer.cancel()
+            stop()
+            try:
+                await asyncio.to_thread(self.save, recorder, scope, elapsed)
+            except OSError:
+                logger.exception("failed to save request profile")
+
+    def save(self, recorder, scope, elapsed: float):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        filename = profile_filename(scope, elapsed, recorder.extension)
+        recorder.save(os.path.join(self.profile_dir, filename))
@@ -0,0 +1,269 @@
+"""
+Каталог заранее построенных Core-запросов для горячих путей
+
+Запросы собираются один раз при импорте модуля. На вызове не строится
+select(), ключ кэша компиляции SQLAlchemy вычисляется один раз и
+запоминается в объекте запроса, а одинаковый текст SQL позволяет asyncpg
+брать подготовленный statement из своего кэша (DB_PREPARED_STATEMENT_CACHE_SIZE).
+Запросы выбирают колонки таблиц, а не ORM-сущности, и возвращают Row:
+без загрузки объектов и identity map
+
+Замер: python -m benchmarks.bench_queries
+"""
+
+from typing import List, Optional
+
+from sqlalchemy import (
+    ARRAY,
+    Integer,
+    Row,
+    String,
+    any_,
+    bindparam,
+    delete,
+    select,
+    text,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.limits import verified_api_keys
+from src.models import Comment, Follower, Like, Tweet, User
+
+users = User.__table__
+tweets = Tweet.__table__
+likes = Like.__table__
+comments = Comment.__table__
+followers = Follower.__table__
+
+USER_BY_API_KEY = select(users.c.id, users.c.username, users.c.name).where(
+    users.c.api_key == bindparam("api_key")
+)
+
+USER_BY_ID = select(users.c.id, users.c.username, users.c.name).where(
+    users.c.id == bindparam("user_id")
+)
+
+TWEET_BY_ID = select(tweets.c.id, tweets.c.user_id).where(
+    tweets.c.id == bindparam("tweet_id")
+)
+
+LIKE_BY_TWEET_AND_USER = select(likes.c.id, likes.c.tweet_id, likes.c.user_id).where(
+    likes.c.tweet_id == bindparam("tweet_id"), likes.c.user_id == bindparam("user_id")
+)
+
+FOLLOWING_IDS = select(followers.c.followee_id).where(
+    followers.c.follower_id == bindparam("user_id")
+)
+
+FOLLOWERS_OF = (
+    select(users.c.id, users.c.name)
+    .join(followers, followers.c.follower_id == users.c.id)
+    .where(followers.c.followee_id == bindparam("user_id"))
+    .order_by(followers.c.id)
+)
+
+FOLLOWING_OF = (
+    select(users.c.id, users.c.name)
+    .join(followers, followers.c.followee_id == users.c.id)
+    .where(followers.c.follower_id == bindparam("user_id"))
+    .order_by(followers.c.id)
+)
+
+# Мульти-выборки: один запрос на таблицу для всего списка id,
+# массив передается одним параметром, поэтому текст SQL не зависит от длины
+ids_param = any_(bindparam("ids", type_=ARRAY(Integer)))
+
+USERS_BY_IDS = select(users.c.id, users.c.username, users.c.name).where(
+    users.c.id == ids_param
+)
+
+TWEETS_BY_IDS = (
+    select(tweets.c.id, tweets.c.text, tweets.c.my_array, users.c.id, users.c.username)
+    .join(users, users.c.id == tweets.c.user_id)
+    .where(tweets.c.id == ids_param)
+)
+
+LIKES_OF_TWEETS = (
+    select(likes.c.tweet_id, users.c.id, users.c.username)
+    .join(users, users.c.id == likes.c.user_id)
+    .where(likes.c.tweet_id == ids_param)
+    .order_by(likes.c.tweet_id, likes.c.id)
+)
+
+FOLLOWERS_OF_MANY = (
+    select(followers.c.followee_id, users.c.id, users.c.name)
+    .join(users, users.c.id == followers.c.follower_id)
+    .where(followers.c.followee_id == ids_param)
+    .order_by(followers.c.id)
+)
+
+FOLLOWING_OF_MANY = (
+    select(followers.c.follower_id, users.c.id, users.c.name)
+    .join(users, users.c.id == followers.c.followee_id)
+    .where(followers.c.follower_id == ids_param)
+    .order_by(followers.c.id)
+)
+
+# tweet_id в условии удаления лайка выбирает одну секцию likes
+DELETE_LIKE = delete(likes).where(
+    likes.c.id == bindparam("like_id"), likes.c.tweet_id == bindparam("tweet_id")
+)
+
+DELETE_TWEET_LIKES = delete(likes).where(likes.c.tweet_id == bindparam("tweet_id"))
+
+DELETE_TWEET_COMMENTS = delete(comments).where(
+    comments.c.tweet_id == bindparam("tweet_id")
+)
+
+DELETE_TWEET = delete(tweets).where(tweets.c.id == bindparam("tweet_id"))
+
+# Удаление подписки сразу сообщает, была ли она: без предварительного SELECT
+DELETE_FOLLOW = (
+    delete(followers)
+    .where(
+        followers.c.follower_id == bindparam("follower_id"),
+        followers.c.followee_id == bindparam("followee_id"),
+    )
+    .returning(followers.c.id)
+)
+
+# Лента целиком, собранная в Postgres: тот же JSON, что AllTweetsOut,
+# с твитами подписок в начале. Python только передает готовую строку
+FEED_JSON = (
+    text(
+        """
+    SELECT json_build_object(
+        'result', true,
+        'tweets', coalesce(
+            json_agg(feed.tweet ORDER BY feed.followed DESC, feed.score DESC, feed.id DESC),
+            '[]'::json
+        )
+    )::text
+    FROM (
+        SELECT
+            t.id,
+            t.score,
+            t.user_id = ANY(:following_ids) AS followed,
+            json_build_object(
+                'id', t.id,
+                'content', t.text,
+                'attachments', coalesce(
+                    (
+                        SELECT json_agg('/api/medias/' || a.media_id ORDER BY a.ord)
+                        FROM unnest(t.my_array) WITH ORDINALITY AS a(media_id, ord)
+                    ),
+                    '[]'::json
+                ),
+                'author', json_build_object('id', u.id, 'name', u.username),
+                'likes', coalesce(
+                    (
+                        SELECT json_agg(
+                            json_build_object('user_id', lu.id, 'name', lu.username)
+                            ORDER BY l.id
+                        )
+                        FROM likes l
+                        JOIN users lu ON lu.id = l.user_id
+                        WHERE l.tweet_id = t.id
+                    ),
+                    '[]'::json
+                )
+            ) AS tweet
+        FROM tweets t
+        JOIN users u ON u.id = t.user_id
+    ) feed
+    """
+    )
+    .bindparams(bindparam("following_ids", type_=ARRAY(Integer)))
+    .columns(feed=String)
+)
+
+
+async def get_user_by_apikey(db: AsyncSession, api_key: str) -> Optional[Row]:
+    """Выдает пользователя (id, username, name) по apikey"""
+    result = await db.execute(USER_BY_API_KEY, {"api_key": api_key})
+    user = result.first()
+    if user:
+        verified_api_keys.remember(api_key, user.id)
+    return user
+
+
+async def get_user_by_id(db: AsyncSession, user_id: int) -> Optional[Row]:
+    """Выдает пользователя (id, username, name) по id"""
+    result = await db.execute(USER_BY_ID, {"user_id": user_id})
+    return result.first()
+
+
+async def get_tweet_by_id(db: AsyncSession, tweet_id: int) -> Optional[Row]:
+    """Выдает твит (id, user_id) по id"""
+    result = await db.execute(TWEET_BY_ID, {"tweet_id": tweet_id})
+    return result.first()
+
+
+async def get_like(db: AsyncSession, tweet_id: int, user_id: int) -> Optional[Row]:
+    """Выдает лайк (id, tweet_id, user_id) пользователя на твит"""
+    result = await db.execute(
+        LIKE_BY_TWEET_AND_USER, {"tweet_id": tweet_id, "user_id": user_id}
+    )
+    return result.first()
+
+
+async def get_following_ids_from_db(db: AsyncSession, user_id: int) -> List[int]:
+    result = await db.execute(FOLLOWING_IDS, {"user_id": user_id})
+    return result.scalars().all()
+
+
+async def render_feed_json(db: AsyncSession, following_ids: List[int]) -> str:
+    """Готовый JSON ленты одним запросом, без построения объектов в Python"""
+    result = await db.execute(FEED_JSON, {"following_ids": list(following_ids)})
+    return result.scalar()
+
+
+async def get_follow_lists(db: AsyncSession, user_id: int):
+    """Подписчики и подписки пользователя как списки {"id", "name"}"""
+    followers_result = await db.execute(FOLLOWERS_OF, {"user_id": user_id})
+    following_result = await db.execute(FOLLOWING_OF, {"user_id": user_id})
+    return (
+        [{"id": id, "name": name} for id, name in followers_result],
+        [{"id": id, "name": name} for id, name in following_result],
+    )
+
+
+async def get_users_by_ids(db: AsyncSession, ids: List[int]) -> List[Row]:
+    """Выдает пользователей (id, username, name) по списку id одним запросом"""
+    result = await db.execute(USERS_BY_IDS, {"ids": list(ids)})
+    return result.all()
+
+
+async def get_tweets_by_ids(db: AsyncSession, ids: List[int]) -> List[dict]:
+    """
+    Выдает твиты по списку id в схеме ленты: один запрос за твитами
+    с авторами и один за лайками всех найденных твитов
+    """
+    tweets_result = await db.execute(TWEETS_BY_IDS, {"ids": list(ids)})
+    result = {
+        id: {
+            "id": id,
+            "content": content,
+            "attachments": [f"/api/medias/{media_id}" for media_id in media or []],
+            "author": {"id": author_id, "name": author_name},
+            "likes": [],
+        }
+        for id, content, media, author_id, author_name in tweets_result
+    }
+    if result:
+        likes_result = await db.execute(LIKES_OF_TWEETS, {"ids": list(result)})
+        for tweet_id, user_id, name in likes_result:
+            result[tweet_id]["likes"].append({"user_id": user_id, "name": name})
+    return list(result.values())
+
+
+async def get_follow_lists_many(db: AsyncSession, ids: List[int]):
+    """Подписчики и подписки нескольких пользователей: словари id -> список"""
+    followers_of = {id: [] for id in ids}
+    following_of = {id: [] for id in ids}
+    followers_result = await db.execute(FOLLOWERS_OF_MANY, {"ids": list(ids)})
+    for followee_id, id, name in followers_result:
+        followers_of[followee_id].append({"id": id, "name": name})
+    following_result = await db.execute(FOLLOWING_OF_MANY, {"ids": list(ids)})
+    for follower_id, id, name in following_result:
+        following_of[follower_id].append({"id": id, "name": name})
+    return followers_of, following_of
@@ -1,47 +1,140 @@
+import hmac
+from functools import partial
+from typing import Literal, Union
+
+from config import ADMIN_API_KEY, FEED_RENDER_MODE, MULTIGET_MAX_IDS, SUGGESTIONS_TOP_K
 from fastapi import (
     APIRouter,
     Depends,
     File,
     HTTPException,
+    Query,
     Request,
     Response,
     UploadFile,
 )
-from sqlalchemy import text
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import Row, text
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from src.database import engine, get_db
+from src.bulk_import import import_ndjson
+from src.cache import response_cache
+from src.database import (
+    async_session,
+    engine,
+    get_db,
+    shard_router,
+    shard_session,
+    tweet_session,
+)
+from src.events import broker, sse_stream
+from src.export import decode_cursor, export_user_data
+from src.graph import follower_graph
+from src.invalidation import invalidation_bus
 from src.models import (
     Base,
-    User,
     add_following,
     add_like,
     add_media,
     add_tweet,
     add_user,
     create_data,
+    delete_tweet,
+    follow_tags,
     get_all_tweets,
-    get_like,
+    get_compact_tweets,
+    get_feed_version,
+    get_following_ids,
     get_media,
     get_profile,
-    get_tweet_by_id,
-    get_user_by_apikey,
+    get_profiles,
+    get_suggestions,
+    get_tweet_likes,
+    get_tweets_by_ids,
     remove_following,
+    remove_like,
     sorted_tweets,
 )
+from src.negotiation import (
+    MSGPACK_MEDIA_TYPE,
+    NegotiatedResponse,
+    pack_model,
+    response_format,
+    transcode_json,
+)
+from src.outbox import outbox_stats
+from src.queries import (
+    get_like,
+    get_tweet_by_id,
+    get_user_by_apikey,
+    get_user_by_id,
+    get_users_by_ids,
+    render_feed_json,
+)
 from src.schemas import (
     AddMediaOut,
+    AllTweetsCompactOut,
     AllTweetsOut,
+    ImportOut,
     StandartResponse,
+    SuggestionsOut,
     TweetIn,
+    TweetLikesOut,
     TweetOut,
     UserIn,
     UserOut,
     UserProfileResponse,
+    UsersProfilesOut,
 )
 
-router = APIRouter()
+router = APIRouter(default_response_class=NegotiatedResponse)
+
+
+def require_admin(request: Request):
+    """Пропускает только запросы с ключом администратора в заголовке api-key"""
+    api_key = request.headers.get("api-key", "")
+    if not ADMIN_API_KEY or not hmac.compare_digest(api_key, ADMIN_API_KEY):
+        raise HTTPException(status_code=403, detail="admin api-key required")
+
+
+def json_response(
+    content: str, headers: dict = None, model: BaseModel = None
+) -> Response:
+    """
+    Отдает уже отрендеренный JSON без повторной сериализации. Клиенту msgpack -
+    модель ответа, если она есть (промах кэша), иначе перекодированный JSON
+    """
+    if response_format.get() == "msgpack":
+        return Response(
+            content=pack_model(model) if model else transcode_json(content),
+            media_type=MSGPACK_MEDIA_TYPE,
+            headers=headers,
+        )
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Проверяет If-None-Match (слабое сравнение, список или *)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag.removeprefix("W/") in tags
+
+
+def parse_ids(ids: str) -> list:
+    """Разбирает ids=1,2,3 в список без повторов, не длиннее MULTIGET_MAX_IDS"""
+    try:
+        values = list(dict.fromkeys(int(id) for id in ids.split(",") if id.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be integers")
+    if len(values) > MULTIGET_MAX_IDS:
+        raise HTTPException(
+            status_code=400, detail=f"too many ids, max {MULTIGET_MAX_IDS}"
+        )
+    return values
 
 
 @router.post("/api/users", status_code=201, response_model=UserOut)
@@ -67,11 +160,13 @@ async def add_tweet_handler(
     user = await get_user_by_apikey(db=db, api_key=api_key)
     user_id = user.id
 
-    tweet = await add_tweet(db=db, user_id=user_id, **vars(tweet_data))
+    async with shard_session(db, user_id) as shard_db:
+        tweet = await add_tweet(db=shard_db, user_id=user_id, **vars(tweet_data))
 
     if not tweet:
         raise HTTPException(status_code=400, detail="error")
 
+    await response_cache.invalidate("feed")
     result = {"result": True, "tweet_id": tweet.id}
     return result
 
@@ -102,17 +197,19 @@ async def delete_tweet_handler(
     api_key = headers["api-key"]
 
     user = await get_user_by_apikey(db=db, api_key=api_key)
-    tweet = await get_tweet_by_id(db=db, tweet_id=id)
 
-    if not user:
-        raise HTTPException(status_code=400, detail="user not found")
-    elif not tweet:
-        raise HTTPException(status_code=400, detail="tweet not found")
-    elif not tweet.user_id == user.id:
-        raise HTTPException(status_code=400, detail="no right to delete")
+    async with tweet_session(db, id) as shard_db:
+        tweet = await get_tweet_by_id(db=shard_db, tweet_id=id)
 
-    await db.delete(tweet)
-    await db.commit()
+        if not user:
+            raise HTTPException(status_code=400, detail="user not found")
+        elif not tweet:
+            raise HTTPException(status_code=400, detail="tweet not found")
+        elif not tweet.user_id == user.id:
+            raise HTTPException(status_code=400, detail="no right to delete")
+
+        await delete_tweet(db=shard_db, tweet=tweet)
+    await response_cache.invalidate("feed")
 
     return {"result": True}
 
@@ -126,18 +223,21 @@ async def add_like_handler(
     api_key = headers["api-key"]
 
     user = await get_user_by_apikey(db=db, api_key=api_key)
-    tweet = await get_tweet_by_id(db=db, tweet_id=id)
 
-    if not user:
-        raise HTTPException(status_code=400, detail="user not found")
-    elif not tweet:
-        raise HTTPException(status_code=400, detail="tweet not found")
+    async with tweet_session(db, id) as shard_db:
+        tweet = await get_tweet_by_id(db=shard_db, tweet_id=id)
 
-    like = await add_like(db=db, tweet_id=tweet.id, user_id=user.id)
+        if not user:
+            raise HTTPException(status_code=400, detail="user not found")
+        elif not tweet:
+            raise HTTPException(status_code=400, detail="tweet not found")
+
+        like = await add_like(db=shard_db, tweet_id=tweet.id, user_id=user.id)
 
     if not like:
         raise HTTPException(status_code=400, detail="like already exists")
 
+    await response_cache.invalidate("feed")
     return {"result": True}
 
 
@@ -150,20 +250,22 @@ async def remove_like_handler(
     api_key = headers["api-key"]
 
     user = await get_user_by_apikey(db=db, api_key=api_key)
-    tweet = await get_tweet_by_id(db=db, tweet_id=id)
 
-    if not user:
-        raise HTTPException(status_code=400, detail="user not found")
-    elif not tweet:
-        raise HTTPException(status_code=400, detail="tweet not found")
+    async with tweet_session(db, id) as shard_db:
+        tweet = await get_tweet_by_id(db=shard_db, tweet_id=id)
 
-    like = await get_like(db=db, tweet_id=tweet.id, user_id=user.id)
+        if not user:
+            raise HTTPException(status_code=400, detail="user not found")
+        elif not tweet:
+            raise HTTPException(status_code=400, detail="tweet not found")
 
-    if not like:
-        raise HTTPException(status_code=400, detail="like not found")
+        like = await get_like(db=shard_db, tweet_id=tweet.id, user_id=user.id)
+
+        if not like:
+            raise HTTPException(status_code=400, detail="like not found")
 
-    await db.delete(like)
-    await db.commit()
+        await remove_like(db=shard_db, like=like)
+    await response_cache.invalidate("feed")
     return {"result": True}
 
 
@@ -176,8 +278,7 @@ async def add_following_handler(
     api_key = headers["api-key"]
 
     follower = await get_user_by_apikey(db=db, api_key=api_key)
-    followee = await db.execute(select(User).where(User.id == id))
-    followee = followee.scalar()
+    followee = await get_user_by_id(db=db, user_id=id)
 
     if not follower:
         raise HTTPException(status_code=400, detail="follower not found")
@@ -191,6 +292,7 @@ async def add_following_handler(
     if not following:
         raise HTTPException(status_code=400, detail="following already exists")
 
+    await response_cache.invalidate(*follow_tags(follower.id, followee.id))
     return {"result": True}
 
 
@@ -203,8 +305,7 @@ async def remove_following_handler(
     api_key = headers["api-key"]
 
     follower = await get_user_by_apikey(db=db, api_key=api_key)
-    followee = await db.execute(select(User).where(User.id == id))
-    followee = followee.scalar()
+    followee = await get_user_by_id(db=db, user_id=id)
 
     if not follower:
         raise HTTPException(status_code=400, detail="follower not found")
@@ -218,34 +319,124 @@ async def remove_following_handler(
     if not following:
         raise HTTPException(status_code=400, detail="following not found")
 
+    await response_cache.invalidate(*follow_tags(follower.id, followee.id))
     return {"result": True}
 
 
-@router.get("/api/tweets", response_model=AllTweetsOut)
-async def get_all_tweets_handler(request: Request, db: AsyncSession = Depends(get_db)):
-    """Выдает все твиты"""
+FEED_VIEWS = {"full": AllTweetsOut, "compact": AllTweetsCompactOut}
+
+
+@router.get("/api/tweets", response_model=Union[AllTweetsOut, AllTweetsCompactOut])
+async def get_all_tweets_handler(
+    request: Request,
+    view: Literal["full", "compact"] = "full",
+    ids: str = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Выдает все твиты. view=compact вместо списков лайкнувших отдает
+    like_count и liked_by_me, сами лайкнувшие - в /api/tweets/{id}/likes.
+    Ответ помечается ETag по версии ленты: если у клиента актуальная версия,
+    отвечаем 304 после одного запроса к БД.
+    ids=1,2,3 выдает только эти твиты в порядке списка, ненайденные пропускаются
+    """
+    if ids is not None:
+        tweets = await get_tweets_by_ids(db=db, ids=parse_ids(ids))
+        return {"result": True, "tweets": tweets}
+
     headers = request.headers
     api_key = headers["api-key"]
 
-    user = await get_user_by_apikey(db=db, api_key=api_key)
+    version = await get_feed_version(db=db, api_key=api_key)
 
-    if not user:
+    if version is None:
         raise HTTPException(status_code=400, detail="user not found")
 
-    user_profile = await get_profile(db=db, id=user.id, name=user.name)
-    followings_data = user_profile["following"]
-    if not followings_data:
-        followings_ids = []
+    # У представлений в разных форматах разные ETag, JSON остается прежним
+    fmt = response_format.get()
+    etag = f'W/"{view}.{version}"' if fmt == "json" else f'W/"{view}.{version}.{fmt}"'
+    cache_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=cache_headers)
+
+    user = await get_user_by_apikey(db=db, api_key=api_key)
+
+    # Версия в ключе: изменения без инвалидации тега feed (пересчет рейтинга,
+    # сброс счетчиков лайков) не отдадут старое тело под новым ETag
+    cache_key = f"{view}:{user.id}:{version}"
+    cached = await response_cache.get("feed", cache_key)
+    if cached is not None:
+        return json_response(cached, headers=cache_headers)
+
+    followings_ids = await get_following_ids(db=db, user_id=user.id)
+    model = None
+    if view == "full" and FEED_RENDER_MODE == "sql" and len(shard_router) == 1:
+        # JSON собирается в Postgres; с несколькими шардами ленты нужно
+        # сливать по рейтингу, поэтому там остается сборка в Python
+        content = await render_feed_json(db=db, following_ids=followings_ids)
     else:
-        followings_ids = [data["id"] for data in followings_data]
-    tweets = await get_all_tweets(db=db)
-    sorted_tweets_list = await sorted_tweets(
-        following_ids=followings_ids, db=db, tweets=tweets
+        if view == "compact":
+            tweets = await get_compact_tweets(db=db, user_id=user.id)
+        else:
+            tweets = await get_all_tweets(db=db, version=version.partition(".")[0])
+        sorted_tweets_list = await sorted_tweets(
+            following_ids=followings_ids, db=db, tweets=tweets
+        )
+
+        result = {"result": True, "tweets": sorted_tweets_list}
+        model = FEED_VIEWS[view].model_validate(result)
+        content = model.model_dump_json()
+    await response_cache.set(
+        "feed", cache_key, content, tags=["feed", f"feed:{user.id}"]
     )
 
-    result = {"result": True, "tweets": sorted_tweets_list}
+    return json_response(content, headers=cache_headers, model=model)
 
-    return result
+
+@router.get("/api/tweets/{id}/likes", response_model=TweetLikesOut)
+async def get_tweet_likes_handler(
+    id: int,
+    cursor: int = 0,
+    limit: int = Query(default=100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db),
+):
+    """Лайкнувшие твит постранично: cursor - next_cursor предыдущей страницы"""
+    async with tweet_session(db, id) as shard_db:
+        tweet = await get_tweet_by_id(db=shard_db, tweet_id=id)
+
+        if not tweet:
+            raise HTTPException(status_code=400, detail="tweet not found")
+
+        likes = await get_tweet_likes(
+            db=shard_db, tweet_id=id, after_id=cursor, limit=limit
+        )
+    next_cursor = likes[-1]["id"] if len(likes) == limit else None
+    return {"result": True, "likes": likes, "next_cursor": next_cursor}
+
+
+@router.get("/api/events")
+async def events_handler():
+    """Поток событий ленты (новые твиты, лайки, удаления) в формате SSE"""
+    subscription = broker.subscribe()
+    return StreamingResponse(
+        sse_stream(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def render_profile(db: AsyncSession, user: Row) -> Response:
+    """Профиль пользователя из кэша или из БД"""
+    cached = await response_cache.get("profile", user.id)
+    if cached is not None:
+        return json_response(cached)
+
+    user_profile = await get_profile(db=db, id=user.id, name=user.username)
+    result = {"result": True, "user": user_profile}
+    model = UserProfileResponse.model_validate(result)
+    content = model.model_dump_json()
+    await response_cache.set("profile", user.id, content, tags=[f"profile:{user.id}"])
+    return json_response(content, model=model)
 
 
 @router.get("/api/users/me", response_model=UserProfileResponse)
@@ -259,24 +450,77 @@ async def get_my_profile_handler(request: Request, db: AsyncSession = Depends(ge
     if not user:
         raise HTTPException(status_code=400, detail="user not found")
 
-    user_profile = await get_profile(db=db, id=user.id, name=user.username)
-    result = {"result": True, "user": user_profile}
-    return result
+    return await render_profile(db=db, user=user)
+
+
+@router.get("/api/users/me/suggestions", response_model=SuggestionsOut)
+async def get_my_suggestions_handler(
+    request: Request,
+    limit: int = Query(default=20, ge=1, le=SUGGESTIONS_TOP_K),
+    db: AsyncSession = Depends(get_db),
+):
+    """Рекомендации на кого подписаться для пользователя, который сделал запрос"""
+    headers = request.headers
+    api_key = headers["api-key"]
+
+    user = await get_user_by_apikey(db=db, api_key=api_key)
+
+    if not user:
+        raise HTTPException(status_code=400, detail="user not found")
+
+    suggestions = await get_suggestions(db=db, user_id=user.id, limit=limit)
+    return {"result": True, "users": suggestions}
+
+
+@router.get("/api/users/me/export")
+async def export_my_data_handler(
+    request: Request, cursor: str = None, db: AsyncSession = Depends(get_db)
+):
+    """
+    Выгрузка твитов, лайков и подписок пользователя в NDJSON.
+    Прерванную выгрузку можно продолжить, передав cursor из последней строки
+    """
+    headers = request.headers
+    api_key = headers["api-key"]
+
+    user = await get_user_by_apikey(db=db, api_key=api_key)
+
+    if not user:
+        raise HTTPException(status_code=400, detail="user not found")
+
+    try:
+        decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Сессия зависимости закрывается раньше, чем отдается поток,
+    # поэтому выгрузка открывает свою сессию к той же БД
+    session_factory = partial(async_session, bind=db.bind)
+    return StreamingResponse(
+        export_user_data(session_factory, user_id=user.id, cursor=cursor),
+        media_type="application/x-ndjson",
+    )
+
+
+@router.get("/api/users", response_model=UsersProfilesOut)
+async def get_users_profiles_handler(ids: str, db: AsyncSession = Depends(get_db)):
+    """Профили пользователей по ids=1,2,3 в порядке списка, ненайденные пропускаются"""
+    ids = parse_ids(ids)
+    users = {user.id: user for user in await get_users_by_ids(db=db, ids=ids)}
+    profiles = await get_profiles(db=db, users=[users[id] for id in ids if id in users])
+    return {"result": True, "users": profiles}
 
 
 @router.get("/api/users/{id}", response_model=UserProfileResponse)
 async def get_user_profile_handler(id: int, db: AsyncSession = Depends(get_db)):
     """Выводит профиль пользователя по id"""
 
-    user_sql = await db.execute(select(User).where(User.id == id))
-    user = user_sql.scalar()
+    user = await get_user_by_id(db=db, user_id=id)
 
     if not user:
         raise HTTPException(status_code=400, detail="user not found")
 
-    user_profile = await get_profile(db=db, id=user.id, name=user.username)
-    result = {"result": True, "user": user_profile}
-    return result
+    return await render_profile(db=db, user=user)
 
 
 @router.get("/api/medias/{id}")
@@ -286,10 +530,41 @@ async def get_media_handler(id: int, db: AsyncSession = Depends(get_db)):
     return Response(content=media, media_type="image/jpeg")
 
 
+@router.get("/api/cache/stats", dependencies=[Depends(require_admin)])
+async def cache_stats_handler():
+    """Статистика попаданий и задержки кэша ответов по эндпоинтам"""
+    return {"result": True, "stats": response_cache.get_stats()}
+
+
+@router.get("/api/outbox/stats", dependencies=[Depends(require_admin)])
+async def outbox_stats_handler(db: AsyncSession = Depends(get_db)):
+    """Глубина очереди outbox: ожидающие и окончательно упавшие события"""
+    stats = await outbox_stats(db=db)
+    return {"result": True, "stats": stats}
+
+
+@router.post(
+    "/api/import",
+    response_model=ImportOut,
+    dependencies=[Depends(require_admin)],
+)
+async def bulk_import_handler(request: Request, db: AsyncSession = Depends(get_db)):
+    """Массовый импорт твитов и подписок из NDJSON в теле запроса"""
+    stats = await import_ndjson(db=db, chunks=request.stream())
+
+    # Свое сообщение шины воркер пропускает, поэтому сбрасывает сам
+    if stats["follows_inserted"] and follower_graph.loaded:
+        await follower_graph.load(db=db)
+    await response_cache.clear()
+
+    return {"result": True, **stats}
+
+
 @router.get("/api/content/create")
 async def create_data_handler(db: AsyncSession = Depends(get_db)):
     """Наполняет БД данными, для призентации"""
     await create_data(db=db)
+    await response_cache.clear()
     return {"result": True}
 
 
@@ -299,6 +574,9 @@ async def drop_all_tables(db: AsyncSession = Depends(get_db)):
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.drop_all)
             await conn.execute(text("DROP TABLE IF EXISTS alembic_version;"))
+        await invalidation_bus.publish(db, clear=True)
+        await db.commit()
+        await response_cache.clear()
 
         return {"result": True, "message": "all tables dropped from database"}
     except Exception as e:
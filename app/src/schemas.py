@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import List, Optional
 
 from pydantic.main import BaseModel
@@ -48,6 +49,32 @@ class AllTweetsOut(BaseModel):
     tweets: List[Optional[Tweet]]
 
 
+class TweetCompact(BaseModel):
+    """2.5 Твит компактной ленты: вместо списка лайков их число"""
+
+    id: int
+    content: str
+    attachments: List[Optional[str]]
+    author: AuthorToAllTweets
+    like_count: int
+    liked_by_me: bool
+
+
+class AllTweetsCompactOut(BaseModel):
+    """2.4 Схема ответа компактной ленты (?view=compact)"""
+
+    result: bool
+    tweets: List[Optional[TweetCompact]]
+
+
+class TweetLikesOut(BaseModel):
+    """2.6 Страница лайкнувших твит, next_cursor - id последнего лайка"""
+
+    result: bool
+    likes: List[Optional[LikesToAllTweets]]
+    next_cursor: Optional[int]
+
+
 class UserIn(BaseModel):
     """4.0 Добавление пользователя"""
 
@@ -90,6 +117,28 @@ class UserProfileResponse(BaseModel):
     user: UserToUserProfile
 
 
+class UsersProfilesOut(BaseModel):
+    """1.3 Ответ с профилями нескольких пользователей (?ids=1,2,3)"""
+
+    result: bool
+    users: List[Optional[UserToUserProfile]]
+
+
+class SuggestionToUser(BaseModel):
+    """5.1 Рекомендованный для подписки пользователь"""
+
+    id: int
+    name: str
+    score: float
+
+
+class SuggestionsOut(BaseModel):
+    """5.0 Ответ с рекомендациями на кого подписаться"""
+
+    result: bool
+    users: List[Optional[SuggestionToUser]]
+
+
 class AddMediaOut(BaseModel):
     """Добавление медиа входная схема"""
 
@@ -101,3 +150,39 @@ class StandartResponse(BaseModel):
     """Стандартный ответ показывающий статус запроса"""
 
     result: bool
+
+
+class TweetImport(BaseModel):
+    """6.1 Твит для массового импорта"""
+
+    id: int
+    user_id: int
+    text: str
+    media: Optional[List[int]] = None
+    created_at: Optional[datetime] = None
+
+
+class FollowImport(BaseModel):
+    """6.2 Подписка для массового импорта"""
+
+    follower_id: int
+    followee_id: int
+    created_at: Optional[datetime] = None
+
+
+class ImportLineError(BaseModel):
+    """6.3 Ошибка валидации строки импорта"""
+
+    line: int
+    error: str
+
+
+class ImportOut(BaseModel):
+    """6.0 Результат массового импорта"""
+
+    result: bool
+    lines: int
+    invalid: int
+    tweets_inserted: int
+    follows_inserted: int
+    errors: List[Optional[ImportLineError]]
@@ -0,0 +1,45 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Объединяет одинаковые конкурентные чтения: пока запрос по ключу
+    выполняется, остальные вызовы с тем же ключом ждут его результат
+
+    Результат разделяется между вызывающими, поэтому его нельзя изменять
+    """
+
+    def __init__(self):
+        self.in_flight = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            future = self.in_flight.get(key)
+            if future is None:
+                break
+
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Отменен выполнявший запрос, а не мы - выполняем запрос сами
+                if not future.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Исключение получат ожидающие, предупреждение о нем не нужно
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self.in_flight[key]
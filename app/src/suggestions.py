@@ -0,0 +1,200 @@
+"""
+Пакетный расчет рекомендаций "на кого подписаться"
+
+Подписки и лайки загружаются в разреженные матрицы, кандидаты считаются
+векторно блоками строк:
+    score = F[block] @ F + CO_LIKE_WEIGHT * L[block] @ L.T
+где F - матрица подписок, L - матрица лайков пользователь x твит.
+Для каждого пользователя сохраняются top-K кандидатов в user_suggestions
+
+Запуск: python -m src.suggestions
+"""
+
+import io
+import logging
+
+import numpy as np
+from config import (
+    ALEMBIC_DATABASE_URL,
+    SHARD_DATABASE_URLS,
+    SUGGESTIONS_BLOCK_SIZE,
+    SUGGESTIONS_CO_LIKE_WEIGHT,
+    SUGGESTIONS_MAX_LIKERS,
+    SUGGESTIONS_TOP_K,
+)
+from scipy import sparse
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory lock, чтобы расчет не шел параллельно из нескольких воркеров
+LOCK_KEY = 734001
+
+# Лайки лежат в шардах твитов, задача читает их синхронным драйвером
+SHARD_URLS = [
+    make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+    for url in SHARD_DATABASE_URLS
+]
+
+
+def copy_pairs(cursor, query: str) -> np.ndarray:
+    """Выгружает пары целых чисел через COPY и разбирает их в numpy массив"""
+    buffer = io.StringIO()
+    cursor.copy_expert(f"COPY ({query}) TO STDOUT", buffer)
+    values = np.fromstring(buffer.getvalue(), dtype=np.int64, sep=" ")
+    return values.reshape(-1, 2)
+
+
+def build_matrix(pairs: np.ndarray, shape: tuple) -> sparse.csr_matrix:
+    data = np.ones(len(pairs), dtype=np.float32)
+    matrix = sparse.csr_matrix((data, (pairs[:, 0], pairs[:, 1])), shape=shape)
+    matrix.sum_duplicates()
+    return matrix
+
+
+def drop_popular_tweets(likes: sparse.csr_matrix, max_likers: int):
+    """
+    Убирает твиты с очень большим числом лайков: они почти не несут сигнала,
+    но дают квадратичное число пар со-лайкеров
+    """
+    likers = np.asarray(likes.sum(axis=0)).ravel()
+    keep = sparse.diags((likers <= max_likers).astype(np.float32))
+    return (likes @ keep).tocsr()
+
+
+def top_k(rows: np.ndarray, cols: np.ndarray, data: np.ndarray, k: int):
+    """Top-K элементов каждой строки без цикла по строкам"""
+    order = np.lexsort((cols, -data, rows))
+    rows = rows[order]
+    cols = cols[order]
+    data = data[order]
+
+    row_starts = np.searchsorted(rows, rows, side="left")
+    ranks = np.arange(len(rows)) - row_starts
+    keep = ranks < k
+    return rows[keep], cols[keep], data[keep], ranks[keep]
+
+
+def compute_suggestions(
+    follows: sparse.csr_matrix,
+    likes: sparse.csr_matrix,
+    top: int = SUGGESTIONS_TOP_K,
+    co_like_weight: float = SUGGESTIONS_CO_LIKE_WEIGHT,
+    block_size: int = SUGGESTIONS_BLOCK_SIZE,
+):
+    """
+    Генератор блоков (user_id, candidate_id, score, rank).
+    Память ограничена размером блока, а не квадратом числа пользователей
+    """
+    users = follows.shape[0]
+    likes_t = likes.T.tocsr()
+
+    for start in range(0, users, block_size):
+        end = min(start + block_size, users)
+        block_follows = follows[start:end]
+
+        scores = block_follows @ follows
+        if co_like_weight:
+            scores = scores + co_like_weight * (likes[start:end] @ likes_t)
+        scores = scores.tocsr()
+
+        # Не предлагаем самого себя и тех, на кого уже подписан
+        scores = (scores - scores.multiply(block_follows)).tocoo()
+        keep = (scores.data > 0) & (scores.col != scores.row + start)
+
+        rows, cols, data, ranks = top_k(
+            scores.row[keep], scores.col[keep], scores.data[keep], top
+        )
+        yield rows + start, cols, data, ranks
+
+
+def write_suggestions(cursor, blocks):
+    """Заменяет рекомендации одной транзакцией: читатели видят старые до коммита"""
+    cursor.execute("DELETE FROM user_suggestions")
+    total = 0
+
+    for user_ids, candidate_ids, scores, ranks in blocks:
+        if not len(user_ids):
+            continue
+        buffer = io.StringIO()
+        np.savetxt(
+            buffer,
+            np.column_stack((user_ids, candidate_ids, scores, ranks)),
+            fmt=("%d", "%d", "%.6f", "%d"),
+            delimiter="\t",
+        )
+        buffer.seek(0)
+        cursor.copy_expert(
+            "COPY user_suggestions (user_id, candidate_id, score, rank) FROM STDIN",
+            buffer,
+        )
+        total += len(user_ids)
+
+    return total
+
+
+def read_likes(cursor) -> tuple:
+    """Пары (user_id, tweet_id) лайков и верхняя граница id твитов одной БД"""
+    cursor.execute("SELECT coalesce(max(id), 0) + 1 FROM tweets")
+    tweets = cursor.fetchone()[0]
+    return copy_pairs(cursor, "SELECT user_id, tweet_id FROM likes"), tweets
+
+
+def read_shard_likes(url: str) -> tuple:
+    engine = create_engine(url)
+    connection = engine.raw_connection()
+    try:
+        return read_likes(connection.cursor())
+    finally:
+        connection.close()
+        engine.dispose()
+
+
+def run_suggestions_job(
+    database_url: str = ALEMBIC_DATABASE_URL, shard_urls: list = SHARD_URLS
+) -> int:
+    """
+    Пересчитывает рекомендации. Подписки читаются из основной БД, лайки -
+    из нее и всех шардов. Возвращает число сохраненных строк или -1
+    """
+    engine = create_engine(database_url)
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", (LOCK_KEY,))
+        if not cursor.fetchone()[0]:
+            logger.info("suggestions job is already running")
+            connection.rollback()
+            return -1
+
+        cursor.execute("SELECT coalesce(max(id), 0) + 1 FROM users")
+        users = cursor.fetchone()[0]
+
+        follows = build_matrix(
+            copy_pairs(cursor, "SELECT follower_id, followee_id FROM followers"),
+            shape=(users, users),
+        )
+        # id твитов уникальны между шардами, поэтому лайки просто склеиваются
+        shards = [read_likes(cursor)] + [read_shard_likes(url) for url in shard_urls]
+        likes = build_matrix(
+            np.concatenate([pairs for pairs, _ in shards]),
+            shape=(users, max(tweets for _, tweets in shards)),
+        )
+        likes = drop_popular_tweets(likes, SUGGESTIONS_MAX_LIKERS)
+
+        total = write_suggestions(cursor, compute_suggestions(follows, likes))
+        connection.commit()
+        logger.info("stored %s suggestions", total)
+        return total
+    except BaseException:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_suggestions_job()
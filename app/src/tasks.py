@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from config import (
+    MEDIA_GC_INTERVAL,
+    PARTITION_ARCHIVE_DAYS,
+    PARTITION_MAINTENANCE_INTERVAL,
+    SCORE_REFRESH_INTERVAL,
+    SCORE_REFRESH_WINDOW_DAYS,
+    SUGGESTIONS_INTERVAL,
+)
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.cache import response_cache
+from src.database import async_session, open_pool, shard_router
+from src.graph import follower_graph
+from src.invalidation import invalidation_bus
+from src.media_gc import collect_orphaned_media
+from src.models import bump_feed_version, get_all_tweets, refresh_tweet_scores
+from src.partitions import maintain_partitions
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory lock, чтобы рейтинг шарда пересчитывал один воркер
+SCORES_LOCK_KEY = 734003
+
+
+async def warm_up():
+    """
+    Прогрев перед приемом трафика: открывает пул соединений, загружает
+    индекс подписок и выполняет запрос ленты, заполняя кэш скомпилированных
+    запросов SQLAlchemy
+    """
+    await open_pool()
+    await shard_router.align_tweet_sequences()
+    async with async_session() as db:
+        await follower_graph.load(db=db)
+        await get_all_tweets(db=db)
+
+
+async def refresh_scores_periodically(
+    interval: int = SCORE_REFRESH_INTERVAL,
+    window_days: int = SCORE_REFRESH_WINDOW_DAYS,
+):
+    """Периодически пересчитывает рейтинг свежих твитов, пока задача не отменена"""
+    while True:
+        for session_factory in shard_router.sessionmakers:
+            try:
+                async with session_factory() as db:
+                    await refresh_scores_locked(db=db, window_days=window_days)
+            except Exception:
+                logger.exception("tweet score refresh failed")
+        await asyncio.sleep(interval)
+
+
+async def refresh_scores_locked(db: AsyncSession, window_days: int) -> bool:
+    """
+    Пересчитывает рейтинг шарда, если взят advisory lock: из нескольких
+    воркеров пересчет выполняет один, остальные пропускают цикл
+    """
+    locked = await db.scalar(
+        text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": SCORES_LOCK_KEY}
+    )
+    if not locked:
+        await db.rollback()
+        return False
+    await refresh_tweet_scores(db=db, window_days=window_days)
+    return True
+
+
+def _run_suggestions_job() -> int:
+    # numpy и scipy импортируются только в процессе расчета
+    from src.suggestions import run_suggestions_job
+
+    return run_suggestions_job()
+
+
+async def compute_suggestions_periodically(interval: int = SUGGESTIONS_INTERVAL):
+    """
+    Периодически пересчитывает рекомендации в отдельном процессе, чтобы
+    расчет не занимал event loop. Из нескольких воркеров расчет выполняет
+    один - тот, кто взял advisory lock
+    """
+    if not interval:
+        return
+
+    loop = asyncio.get_running_loop()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        while True:
+            try:
+                await loop.run_in_executor(executor, _run_suggestions_job)
+            except Exception:
+                logger.exception("suggestions job failed")
+            await asyncio.sleep(interval)
+
+
+async def maintain_partitions_periodically(
+    interval: int = PARTITION_MAINTENANCE_INTERVAL,
+    archive_days: int = PARTITION_ARCHIVE_DAYS,
+):
+    """Периодически создает будущие секции tweets и архивирует старые"""
+    if not interval:
+        return
+
+    while True:
+        for session_factory in shard_router.sessionmakers:
+            try:
+                async with session_factory() as db:
+                    result = await maintain_partitions(db=db, archive_days=archive_days)
+                    if result["archived"]:
+                        await bump_feed_version(db=db)
+                        await invalidation_bus.publish(db, clear=True)
+                        await db.commit()
+                        await response_cache.clear()
+            except Exception:
+                logger.exception("partition maintenance failed")
+        await asyncio.sleep(interval)
+
+
+async def collect_media_periodically(interval: int = MEDIA_GC_INTERVAL):
+    """Периодически удаляет медиа, не прикрепленные ни к одному твиту"""
+    if not interval:
+        return
+
+    while True:
+        try:
+            async with async_session() as db:
+                await collect_orphaned_media(db=db)
+        except Exception:
+            logger.exception("media garbage collection failed")
+        await asyncio.sleep(interval)
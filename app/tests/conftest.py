@@ -48,3 +48,9 @@ async def ac() -> AsyncGenerator[AsyncClient, None]:
         transport=ASGITransport(app=app), base_url="http://localhost/api"
     ) as client:
         yield client
+
+
+@pytest.fixture
+async def db() -> AsyncGenerator[AsyncSession, None]:
+    async with async_sessionmaker() as session:
+        yield session
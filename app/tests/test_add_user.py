@@ -127,6 +127,39 @@ async def test_get_tweets(ac: AsyncClient):
     assert response.json() == result
 
 
+async def test_get_tweets_by_ids(ac: AsyncClient):
+    response = await ac.get(url="/tweets", params={"ids": "2,1,100"})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "result": True,
+        "tweets": [
+            {
+                "attachments": [],
+                "author": {"id": 2, "name": "test_username_2"},
+                "content": "test_text",
+                "id": 2,
+                "likes": [{"name": "test_username", "user_id": 1}],
+            },
+            {
+                "attachments": ["/api/medias/1"],
+                "author": {"id": 1, "name": "test_username"},
+                "content": "test_text",
+                "id": 1,
+                "likes": [],
+            },
+        ],
+    }
+
+
+async def test_get_users_by_ids(ac: AsyncClient):
+    response = await ac.get(url="/users", params={"ids": "3,1"})
+
+    assert response.status_code == 200
+    assert [user["id"] for user in response.json()["users"]] == [3, 1]
+    assert response.json()["users"][0]["followers"] == [{"id": 1, "name": "test_name"}]
+
+
 async def test_get_media(ac: AsyncClient):
     response = await ac.get(url="/medias/1")
 
@@ -196,17 +229,94 @@ async def test_get_tweets_3(ac: AsyncClient):
         "tweets": [
             {
                 "attachments": [],
-                "author": {"id": 2, "name": "test_username_2"},
+                "author": {"id": 3, "name": "test_username_3"},
                 "content": "test_text",
-                "id": 2,
+                "id": 3,
                 "likes": [],
             },
             {
                 "attachments": [],
-                "author": {"id": 3, "name": "test_username_3"},
+                "author": {"id": 2, "name": "test_username_2"},
                 "content": "test_text",
-                "id": 3,
+                "id": 2,
                 "likes": [],
             },
         ],
     }
+
+
+async def add_user_with_tweet(ac: AsyncClient, api_key: str):
+    body = {"api_key": api_key, "username": api_key, "name": "n", "surname": "s"}
+    user = (await ac.post(url="/users", json=body)).json()
+    response = await ac.post(
+        url="/tweets",
+        headers={"api-key": api_key},
+        json={"tweet_data": api_key, "tweet_media_ids": []},
+    )
+    return user["id"], response.json()["tweet_id"]
+
+
+async def test_get_tweets_compact(ac: AsyncClient):
+    author_id, tweet_id = await add_user_with_tweet(ac, "compact_author")
+    await add_user_with_tweet(ac, "compact_fan")
+    await ac.post(url=f"/tweets/{tweet_id}/likes", headers={"api-key": "compact_fan"})
+
+    def find_tweet(response):
+        assert response.status_code == 200
+        return next(t for t in response.json()["tweets"] if t["id"] == tweet_id)
+
+    fan_view = find_tweet(
+        await ac.get(url="/tweets?view=compact", headers={"api-key": "compact_fan"})
+    )
+    assert fan_view == {
+        "id": tweet_id,
+        "content": "compact_author",
+        "attachments": [],
+        "author": {"id": author_id, "name": "compact_author"},
+        "like_count": 1,
+        "liked_by_me": True,
+    }
+
+    author_view = find_tweet(
+        await ac.get(url="/tweets?view=compact", headers={"api-key": "compact_author"})
+    )
+    assert author_view["like_count"] == 1
+    assert author_view["liked_by_me"] is False
+
+
+async def test_get_tweet_likes_pages(ac: AsyncClient):
+    _, tweet_id = await add_user_with_tweet(ac, "likes_author")
+    fans = ["likes_fan_1", "likes_fan_2", "likes_fan_3"]
+    for fan in fans:
+        await add_user_with_tweet(ac, fan)
+        await ac.post(url=f"/tweets/{tweet_id}/likes", headers={"api-key": fan})
+
+    first = (await ac.get(url=f"/tweets/{tweet_id}/likes?limit=2")).json()
+    assert [like["name"] for like in first["likes"]] == fans[:2]
+    assert first["next_cursor"] is not None
+
+    second = (
+        await ac.get(
+            url=f"/tweets/{tweet_id}/likes?limit=2&cursor={first['next_cursor']}"
+        )
+    ).json()
+    assert [like["name"] for like in second["likes"]] == fans[2:]
+    assert second["next_cursor"] is None
+
+    # Полная последняя страница еще отдает курсор, следующая - пустая
+    full = (await ac.get(url=f"/tweets/{tweet_id}/likes?limit=3")).json()
+    assert len(full["likes"]) == 3
+    assert full["next_cursor"] is not None
+    empty = (
+        await ac.get(
+            url=f"/tweets/{tweet_id}/likes?limit=3&cursor={full['next_cursor']}"
+        )
+    ).json()
+    assert empty == {"result": True, "likes": [], "next_cursor": None}
+
+
+@pytest.mark.parametrize("limit", [0, 1001])
+async def test_get_tweet_likes_limit_validation(ac: AsyncClient, limit: int):
+    response = await ac.get(url=f"/tweets/1/likes?limit={limit}")
+
+    assert response.status_code == 422
@@ -0,0 +1,103 @@
+import asyncio
+import json
+
+from config import INVALIDATION_CHANNEL
+from sqlalchemy import select, text
+from src.bulk_import import SYNC_TWEETS_SEQUENCE, import_ndjson
+from src.models import Follower, Tweet, TweetMedia, User
+
+
+async def chunks(*lines: dict, size: int = 7):
+    """NDJSON, нарезанный так, чтобы строки рвались между чанками"""
+    data = "".join(json.dumps(line) + "\n" for line in lines).encode()
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+async def test_import_ndjson_merges_batches_and_invalidates(db):
+    alice = User(api_key="import_a", username="a", name="a", surname="")
+    bob = User(api_key="import_b", username="b", name="b", surname="")
+    db.add_all([alice, bob])
+    await db.commit()
+    alice_id, bob_id = alice.id, bob.id
+    feed_version = text("SELECT last_value, is_called FROM feed_version_seq")
+    version = (await db.execute(feed_version)).one()
+
+    notifications = asyncio.Queue()
+    listener = await db.bind.connect()
+    raw = (await listener.get_raw_connection()).driver_connection
+    await raw.add_listener(
+        INVALIDATION_CHANNEL, lambda *args: notifications.put_nowait(args[3])
+    )
+    try:
+        stats = await import_ndjson(
+            db=db,
+            chunks=chunks(
+                {
+                    "type": "tweet",
+                    "id": 2001,
+                    "user_id": alice_id,
+                    "text": "a",
+                    "media": [7, 8],
+                },
+                {"type": "tweet", "id": 2002, "user_id": bob_id, "text": "b"},
+                {"type": "tweet", "id": 2003, "user_id": 999999, "text": "nobody"},
+                {"type": "follow", "follower_id": alice_id, "followee_id": bob_id},
+                {"type": "follow", "follower_id": alice_id, "followee_id": alice_id},
+                {"type": "like", "tweet_id": 2001},
+                {"type": "tweet", "id": "x"},
+                {"type": "tweet", "id": 2001, "user_id": alice_id, "text": "again"},
+            ),
+            batch_size=2,
+        )
+        message = json.loads(await asyncio.wait_for(notifications.get(), 5))
+    finally:
+        await listener.close()
+
+    assert stats["lines"] == 8
+    assert stats["invalid"] == 2
+    assert [error["line"] for error in stats["errors"]] == [6, 7]
+    assert stats["tweets_inserted"] == 2
+    assert stats["follows_inserted"] == 1
+
+    tweets = await db.execute(
+        select(Tweet.id, Tweet.text).where(Tweet.id.between(2001, 2003))
+    )
+    assert tweets.all() == [(2001, "a"), (2002, "b")]
+    media = await db.execute(
+        select(TweetMedia.position, TweetMedia.media_id)
+        .where(TweetMedia.tweet_id == 2001)
+        .order_by(TweetMedia.position)
+    )
+    assert media.all() == [(1, 7), (2, 8)]
+    follows = await db.execute(
+        select(Follower.followee_id).where(Follower.follower_id == alice_id)
+    )
+    assert follows.scalars().all() == [bob_id]
+
+    assert (await db.execute(text("SELECT nextval('tweets_id_seq')"))).scalar() > 2002
+    assert (await db.execute(feed_version)).one() != version
+    assert message["c"] == 1
+
+
+async def test_sync_sequence_keeps_shard_residue(db):
+    user = User(api_key="import", username="import", name="import", surname="")
+    db.add(user)
+    await db.commit()
+    # Шард 1 из 3: шаг 3, остаток 1, импортированный id выше sequence
+    await db.execute(text("ALTER SEQUENCE tweets_id_seq INCREMENT BY 3"))
+    await db.execute(text("SELECT setval('tweets_id_seq', 301)"))
+    db.add(Tweet(id=1001, user_id=user.id, text="imported"))
+    await db.commit()
+
+    try:
+        await db.execute(text(SYNC_TWEETS_SEQUENCE))
+        next_id = (await db.execute(text("SELECT nextval('tweets_id_seq')"))).scalar()
+        assert next_id > 1001
+        assert next_id % 3 == 1
+    finally:
+        await db.execute(text("ALTER SEQUENCE tweets_id_seq INCREMENT BY 1"))
+        await db.execute(
+            text("SELECT setval('tweets_id_seq', (SELECT max(id) FROM tweets))")
+        )
+        await db.commit()
@@ -0,0 +1,143 @@
+from src import routes
+from src.cache import MemoryCacheBackend, RedisCacheBackend, ResponseCache
+
+
+async def test_cache_invalidate_by_tag():
+    cache = ResponseCache(MemoryCacheBackend(max_entries=10, ttl=60))
+    await cache.set("feed", 1, '{"result":true}', tags=["feed", "feed:1"])
+    await cache.set("profile", 1, '{"result":true}', tags=["profile:1"])
+
+    await cache.invalidate("feed")
+
+    assert await cache.get("feed", 1) is None
+    assert await cache.get("profile", 1) == '{"result":true}'
+    assert cache.get_stats()["feed"]["misses"] == 1
+    assert cache.get_stats()["profile"]["hits"] == 1
+
+
+async def test_cache_lru_eviction():
+    backend = MemoryCacheBackend(max_entries=2, ttl=60)
+    await backend.set("a", 1)
+    await backend.set("b", 2)
+    await backend.get("a")
+    await backend.set("c", 3)
+
+    assert await backend.get("a") == 1
+    assert await backend.get("b") is None
+    assert await backend.get("c") == 3
+
+
+class FakeRedis:
+    """Минимальный клиент с протоколом Redis: строки, множества, TTL в секундах"""
+
+    def __init__(self):
+        self.now = 0
+        self.data = {}
+        self.expires = {}
+
+    def tick(self, seconds: int):
+        self.now += seconds
+        for key, expires_at in list(self.expires.items()):
+            if expires_at <= self.now:
+                self.data.pop(key, None)
+                del self.expires[key]
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value.encode()
+        if ex:
+            self.expires[key] = self.now + ex
+
+    async def sadd(self, key, *members):
+        self.data.setdefault(key, set()).update(m.encode() for m in members)
+
+    async def expire(self, key, seconds):
+        self.expires[key] = self.now + seconds
+
+    async def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+
+    async def scan_iter(self, match):
+        for key in list(self.data):
+            if key.startswith(match.rstrip("*")):
+                yield key
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client: FakeRedis):
+        self.client = client
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    async def execute(self):
+        for name, args, kwargs in self.commands:
+            await getattr(self.client, name)(*args, **kwargs)
+        self.commands = []
+
+
+async def test_redis_backend_get_set_with_ttl():
+    client = FakeRedis()
+    backend = RedisCacheBackend(client=client, ttl=60)
+
+    await backend.set("feed:1", {"result": True}, tags=["feed"])
+    await backend.set("profile:1", {"result": True}, ttl=10)
+
+    assert await backend.get("feed:1") == {"result": True}
+    assert client.expires == {
+        "cache:feed:1": 60,
+        "cache:tag:feed": 60,
+        "cache:profile:1": 10,
+    }
+
+    client.tick(10)
+    assert await backend.get("profile:1") is None
+    assert await backend.get("feed:1") == {"result": True}
+    assert await backend.get("missing") is None
+
+
+async def test_redis_backend_invalidates_tagged_keys():
+    client = FakeRedis()
+    backend = RedisCacheBackend(client=client, ttl=60)
+    await backend.set("feed:1", "a", tags=["feed", "feed:1"])
+    await backend.set("feed:2", "b", tags=["feed"])
+    await backend.set("profile:1", "c", tags=["profile:1"])
+
+    await backend.invalidate("feed")
+
+    assert await backend.get("feed:1") is None
+    assert await backend.get("feed:2") is None
+    assert await backend.get("profile:1") == "c"
+    assert "cache:tag:feed" not in client.data
+
+    await backend.clear()
+    assert client.data == {}
+
+
+async def test_cache_stats_require_admin_key(ac, monkeypatch):
+    monkeypatch.setattr(routes, "ADMIN_API_KEY", "admin")
+
+    assert (await ac.get(url="/cache/stats")).status_code == 403
+    response = await ac.get(url="/cache/stats", headers={"api-key": "wrong"})
+    assert response.status_code == 403
+
+    response = await ac.get(url="/cache/stats", headers={"api-key": "admin"})
+    assert response.status_code == 200
+    assert response.json()["result"] is True
@@ -0,0 +1,113 @@
+import gzip
+
+from httpx import ASGITransport, AsyncClient
+from src import compression
+from src.compression import CompressionMiddleware, choose_encoding
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+BODY = "tweet " * 200
+
+
+async def big(request):
+    return PlainTextResponse(BODY)
+
+
+async def small(request):
+    return PlainTextResponse("ok")
+
+
+async def image(request):
+    return Response(BODY.encode(), media_type="image/png")
+
+
+async def stream(request):
+    async def chunks():
+        yield b"first\n"
+        yield b"second\n"
+
+    return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+
+app = CompressionMiddleware(
+    Starlette(
+        routes=[
+            Route("/big", big),
+            Route("/small", small),
+            Route("/image", image),
+            Route("/stream", stream),
+        ]
+    ),
+    minimum_size=500,
+)
+
+
+def client():
+    return AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
+
+
+async def get_raw(path, accept_encoding):
+    async with client() as c:
+        async with c.stream(
+            "GET", path, headers={"accept-encoding": accept_encoding}
+        ) as response:
+            return response, b"".join([chunk async for chunk in response.aiter_raw()])
+
+
+async def test_choose_encoding_by_quality(monkeypatch):
+    monkeypatch.setattr(
+        compression, "ENCODERS", {"zstd": None, "br": None, "gzip": None}
+    )
+    assert choose_encoding("gzip, br, zstd") == "zstd"
+    assert choose_encoding("zstd;q=0.5, gzip;q=0.8") == "gzip"
+    assert choose_encoding("gzip; q=0.5, BR") == "br"
+    assert choose_encoding("gzip;q=0, zstd;q=0") is None
+    assert choose_encoding("identity;q=0") is None
+    assert choose_encoding("deflate") is None
+    assert choose_encoding("") is None
+    assert choose_encoding("*") == "zstd"
+    assert choose_encoding("zstd;q=0, *;q=0.1") == "br"
+    assert choose_encoding("gzip;q=bad") is None
+
+
+async def test_compresses_large_body_and_rewrites_length(monkeypatch):
+    monkeypatch.setattr(compression, "ENCODERS", {"gzip": compression.compress_gzip})
+
+    response, raw = await get_raw("/big", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["content-length"] == str(len(raw))
+    assert gzip.decompress(raw).decode() == BODY
+
+
+async def test_small_body_is_sent_as_is_with_vary(monkeypatch):
+    monkeypatch.setattr(compression, "ENCODERS", {"gzip": compression.compress_gzip})
+
+    response, raw = await get_raw("/small", "gzip")
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert raw == b"ok"
+
+
+async def test_skips_media_streams_and_unsupported_clients(monkeypatch):
+    monkeypatch.setattr(compression, "ENCODERS", {"gzip": compression.compress_gzip})
+
+    response, raw = await get_raw("/image", "gzip")
+    assert "content-encoding" not in response.headers
+    assert raw == BODY.encode()
+
+    response, raw = await get_raw("/stream", "gzip")
+    assert "content-encoding" not in response.headers
+    assert raw == b"first\nsecond\n"
+
+    response, raw = await get_raw("/big", "identity")
+    assert "content-encoding" not in response.headers
+    assert "vary" not in response.headers
+    assert raw == BODY.encode()
+
+
+async def test_api_responses_negotiate_encoding(ac):
+    response = await ac.get("/users?ids=1", headers={"accept-encoding": "gzip"})
+    assert response.status_code == 200
+    assert "Accept-Encoding" in response.headers["vary"]
@@ -0,0 +1,114 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from src import counters
+from src.counters import LikeCounter
+from src.database import shard_router
+from src.models import Tweet, User
+
+
+async def test_like_counter_buffers_deltas_while_running():
+    counter = LikeCounter()
+    counter.running = True
+
+    await counter.record(db=None, tweet_id=3, delta=1)
+    await counter.record(db=None, tweet_id=3, delta=1)
+    await counter.record(db=None, tweet_id=5, delta=1)
+    await counter.record(db=None, tweet_id=5, delta=-1)
+
+    assert dict(counter.deltas[0]) == {3: 2, 5: 0}
+
+
+async def add_counted_tweet(db) -> int:
+    user = User(api_key="counter", username="counter", name="c", surname="c")
+    db.add(user)
+    await db.flush()
+    tweet = Tweet(text="counted", user_id=user.id)
+    db.add(tweet)
+    await db.commit()
+    return tweet.id
+
+
+async def test_like_counter_flush_updates_count_and_feed_version(db, monkeypatch):
+    monkeypatch.setattr(
+        shard_router,
+        "sessionmakers",
+        [sessionmaker(bind=db.bind, class_=AsyncSession, expire_on_commit=False)],
+    )
+    tweet_id = await add_counted_tweet(db)
+    feed_version = text("SELECT last_value, is_called FROM feed_version_seq")
+    version = (await db.execute(feed_version)).one()
+    await db.commit()
+
+    counter = LikeCounter()
+    counter.running = True
+    for delta in (1, 1, 1, -1):
+        await counter.record(db=db, tweet_id=tweet_id, delta=delta)
+
+    assert await counter.flush() == 1
+    assert dict(counter.deltas) == {}
+
+    like_count = await db.execute(select(Tweet.like_count).where(Tweet.id == tweet_id))
+    assert like_count.scalar() == 2
+    assert (await db.execute(feed_version)).one() != version
+
+
+async def test_like_counter_keeps_deltas_when_flush_fails(monkeypatch):
+    counter = LikeCounter()
+    counter.running = True
+    await counter.record(db=None, tweet_id=7, delta=1)
+
+    async def apply_like_deltas(db, deltas):
+        # Лайк, пришедший во время сброса, копится в новом буфере
+        await counter.record(db=None, tweet_id=7, delta=1)
+        raise RuntimeError("db is down")
+
+    monkeypatch.setattr(counters, "apply_like_deltas", apply_like_deltas)
+
+    with pytest.raises(RuntimeError):
+        await counter.flush()
+
+    assert dict(counter.deltas[0]) == {7: 2}
+
+
+async def test_like_counter_keeps_later_shards_when_a_shard_fails(monkeypatch):
+    flushed = []
+
+    def failing_session():
+        raise RuntimeError("shard 0 is down")
+
+    def working_session():
+        return AsyncMock()
+
+    async def apply_like_deltas(db, deltas):
+        flushed.append(dict(deltas))
+
+    monkeypatch.setattr(shard_router, "engines", shard_router.engines * 2)
+    monkeypatch.setattr(
+        shard_router, "sessionmakers", [failing_session, working_session]
+    )
+    monkeypatch.setattr(counters, "apply_like_deltas", apply_like_deltas)
+
+    counter = LikeCounter()
+    counter.running = True
+    await counter.record(db=None, tweet_id=2, delta=1)
+    await counter.record(db=None, tweet_id=3, delta=1)
+
+    with pytest.raises(RuntimeError):
+        await counter.flush()
+
+    assert flushed == []
+    assert {shard: dict(deltas) for shard, deltas in counter.deltas.items()} == {
+        0: {2: 1},
+        1: {3: 1},
+    }
+
+    # Когда шард снова доступен, сбрасываются оба шарда
+    monkeypatch.setattr(
+        shard_router, "sessionmakers", [working_session, working_session]
+    )
+    assert await counter.flush() == 2
+    assert flushed == [{2: 1}, {3: 1}]
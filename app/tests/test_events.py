@@ -0,0 +1,22 @@
+from src.events import EventBroker
+
+
+async def test_publish_event():
+    broker = EventBroker(queue_size=10)
+    subscription = broker.subscribe()
+    broker.publish("tweet_created", tweet_id=1, author_id=2)
+
+    event = await subscription.get()
+
+    assert event == {"type": "tweet_created", "tweet_id": 1, "author_id": 2}
+
+
+async def test_slow_subscriber_dropped():
+    broker = EventBroker(queue_size=2)
+    slow = broker.subscribe()
+
+    for tweet_id in range(3):
+        broker.publish("like_added", tweet_id=tweet_id, user_id=1)
+
+    assert slow not in broker.subscribers
+    assert await slow.get() is None
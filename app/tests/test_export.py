@@ -0,0 +1,80 @@
+import json
+
+import pytest
+from httpx import AsyncClient
+from src.export import decode_cursor, encode_cursor
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        "not base64!",
+        encode_cursor(0, [1]),
+        encode_cursor(0, "abc"),
+        encode_cursor(0, None),
+        encode_cursor(-1, 0),
+        encode_cursor(99, 0),
+        encode_cursor("0", 0),
+    ],
+)
+async def test_decode_cursor_rejects_crafted_tokens(token: str):
+    with pytest.raises(ValueError):
+        decode_cursor(token)
+
+
+async def export_lines(ac: AsyncClient, api_key: str, cursor: str = None) -> list:
+    params = {"cursor": cursor} if cursor else {}
+    response = await ac.get(
+        url="/users/me/export", headers={"api-key": api_key}, params=params
+    )
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+async def test_export_resumes_from_any_cursor(ac: AsyncClient):
+    users = {}
+    for api_key in ("export_a", "export_b"):
+        body = {"api_key": api_key, "username": api_key, "name": "n", "surname": "s"}
+        users[api_key] = (await ac.post(url="/users", json=body)).json()["id"]
+
+    headers = {"api-key": "export_a"}
+    tweet_ids = []
+    for text in ("first", "second"):
+        response = await ac.post(
+            url="/tweets",
+            headers=headers,
+            json={"tweet_data": text, "tweet_media_ids": []},
+        )
+        tweet_ids.append(response.json()["tweet_id"])
+    for tweet_id in tweet_ids:
+        await ac.post(url=f"/tweets/{tweet_id}/likes", headers=headers)
+    await ac.post(url=f"/users/{users['export_b']}/follow", headers=headers)
+    await ac.post(
+        url=f"/users/{users['export_a']}/follow", headers={"api-key": "export_b"}
+    )
+
+    lines = await export_lines(ac, "export_a")
+    assert [line["type"] for line in lines] == [
+        "tweet",
+        "tweet",
+        "like",
+        "like",
+        "following",
+        "follower",
+    ]
+
+    # Продолжение с любой строки, в том числе с последней записи секции,
+    # отдает ровно оставшиеся строки
+    for position, line in enumerate(lines):
+        resumed = await export_lines(ac, "export_a", cursor=line["cursor"])
+        assert resumed == lines[position + 1 :]
+
+
+async def test_export_rejects_crafted_cursor(ac: AsyncClient):
+    response = await ac.get(
+        url="/users/me/export",
+        headers={"api-key": "export_a"},
+        params={"cursor": encode_cursor(0, [1])},
+    )
+
+    assert response.status_code == 400
@@ -0,0 +1,92 @@
+import asyncio
+from collections import defaultdict
+
+from httpx import AsyncClient
+from sqlalchemy import update
+from src import models
+from src.counters import like_counter
+from src.models import Tweet, bump_feed_version, get_all_tweets
+
+
+async def create_author(ac: AsyncClient, api_key: str) -> tuple:
+    """Пользователь с одним твитом: заголовки его запросов и id твита"""
+    user = {"api_key": api_key, "username": api_key, "name": api_key, "surname": ""}
+    await ac.post(url="/users", json=user)
+    headers = {"api-key": api_key}
+    body = {"tweet_data": "etag_text", "tweet_media_ids": []}
+    response = await ac.post(url="/tweets", headers=headers, json=body)
+    return headers, response.json()["tweet_id"]
+
+
+async def test_feed_not_modified_while_version_unchanged(ac: AsyncClient):
+    headers, _ = await create_author(ac, "etag_1")
+    response = await ac.get(url="/tweets", headers=headers)
+    etag = response.headers["etag"]
+
+    response = await ac.get(url="/tweets", headers={**headers, "if-none-match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+
+async def test_feed_version_bump_without_invalidation(ac: AsyncClient, db):
+    headers, tweet_id = await create_author(ac, "etag_2")
+    response = await ac.get(url="/tweets", headers=headers)
+    etag = response.headers["etag"]
+
+    # Изменение без инвалидации тега feed, как у пересчета рейтинга
+    await db.execute(update(Tweet).where(Tweet.id == tweet_id).values(text="edited"))
+    await db.commit()
+    await bump_feed_version(db=db)
+
+    response = await ac.get(url="/tweets", headers={**headers, "if-none-match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    contents = {tweet["id"]: tweet["content"] for tweet in response.json()["tweets"]}
+    assert contents[tweet_id] == "edited"
+
+
+async def test_feed_flight_not_shared_across_versions(monkeypatch):
+    calls = []
+    release = asyncio.Event()
+
+    async def gather_all_tweets(db):
+        calls.append(db)
+        await release.wait()
+        return [len(calls)]
+
+    monkeypatch.setattr(models, "_gather_all_tweets", gather_all_tweets)
+    old = asyncio.create_task(get_all_tweets(db="old", version="1"))
+    await asyncio.sleep(0)
+    same = asyncio.create_task(get_all_tweets(db="same", version="1"))
+    new = asyncio.create_task(get_all_tweets(db="new", version="2"))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert calls == ["old", "new"]
+    assert await old == await same == [2]
+    assert await new == [2]
+
+
+async def test_like_changes_etag_before_counter_flush(ac: AsyncClient, monkeypatch):
+    monkeypatch.setattr(like_counter, "running", True)
+    monkeypatch.setattr(like_counter, "deltas", defaultdict(lambda: defaultdict(int)))
+    headers, tweet_id = await create_author(ac, "etag_3")
+
+    for method in ("post", "delete"):
+        response = await ac.get(url="/tweets", headers=headers)
+        etag = response.headers["etag"]
+
+        await getattr(ac, method)(url=f"/tweets/{tweet_id}/likes", headers=headers)
+
+        response = await ac.get(
+            url="/tweets", headers={**headers, "if-none-match": etag}
+        )
+        assert response.status_code == 200
+        likes = {tweet["id"]: tweet["likes"] for tweet in response.json()["tweets"]}
+        assert bool(likes[tweet_id]) == (method == "post")
+
+    # Дельты еще не сброшены: счетчик учтет их при следующем сбросе
+    assert like_counter.deltas[0][tweet_id] == 0
@@ -0,0 +1,60 @@
+from httpx import AsyncClient
+from src import routes
+from src.cache import response_cache
+
+
+async def add_user(ac: AsyncClient, api_key: str) -> int:
+    body = {"api_key": api_key, "username": api_key, "name": "n", "surname": "s"}
+    return (await ac.post(url="/users", json=body)).json()["id"]
+
+
+async def add_tweet(ac: AsyncClient, api_key: str, media_ids: list) -> int:
+    response = await ac.post(
+        url="/tweets",
+        headers={"api-key": api_key},
+        json={"tweet_data": api_key, "tweet_media_ids": media_ids},
+    )
+    return response.json()["tweet_id"]
+
+
+async def get_feed(ac: AsyncClient, monkeypatch, mode: str):
+    monkeypatch.setattr(routes, "FEED_RENDER_MODE", mode)
+    await response_cache.clear()
+    response = await ac.get(url="/tweets", headers={"api-key": "render_viewer"})
+    assert response.status_code == 200
+    return response.json()
+
+
+async def test_sql_feed_matches_orm_feed(ac: AsyncClient, monkeypatch):
+    await add_user(ac, "render_viewer")
+    followed_id = await add_user(ac, "render_followed")
+    await add_user(ac, "render_other")
+
+    with open("tests/test_image.jpg", "rb") as media_file:
+        media = await ac.post(
+            url="/medias",
+            files={"file": ("test_image.jpg", media_file.read(), "image/jpeg")},
+        )
+    media_id = media.json()["media_id"]
+
+    with_media = await add_tweet(ac, "render_other", [media_id])
+    without_media = await add_tweet(ac, "render_followed", [])
+    # Лайкнувшие идут в порядке лайков, а не id пользователей
+    for api_key in ("render_other", "render_viewer"):
+        await ac.post(url=f"/tweets/{with_media}/likes", headers={"api-key": api_key})
+    await ac.post(
+        url=f"/users/{followed_id}/follow", headers={"api-key": "render_viewer"}
+    )
+
+    orm_feed = await get_feed(ac, monkeypatch, "orm")
+    sql_feed = await get_feed(ac, monkeypatch, "sql")
+
+    assert sql_feed == orm_feed
+    tweets = {tweet["id"]: tweet for tweet in sql_feed["tweets"]}
+    assert sql_feed["tweets"][0]["id"] == without_media
+    assert tweets[without_media]["attachments"] == []
+    assert tweets[with_media]["attachments"] == [f"/api/medias/{media_id}"]
+    assert [like["name"] for like in tweets[with_media]["likes"]] == [
+        "render_other",
+        "render_viewer",
+    ]
@@ -0,0 +1,19 @@
+from src.graph import FollowerGraph
+
+
+def test_follower_graph_updates():
+    graph = FollowerGraph()
+    graph.add(1, 3)
+    graph.add(1, 2)
+    graph.add(2, 3)
+
+    assert graph.is_following(1, 2)
+    assert not graph.is_following(2, 1)
+    assert list(graph.following(1)) == [2, 3]
+    assert list(graph.followers(3)) == [1, 2]
+
+    graph.remove(1, 3)
+
+    assert list(graph.following(1)) == [2]
+    assert graph.followers_count(3) == 1
+    assert graph.following_count(4) == 0
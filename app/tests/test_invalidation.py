@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+from src.cache import response_cache
+from src.events import broker
+from src.invalidation import InvalidationBus
+
+
+async def test_foreign_message_evicts_tags_and_own_is_skipped():
+    bus = InvalidationBus()
+    await response_cache.set("feed", "bus:1", '{"result":true}', tags=["bus:1"])
+    await response_cache.set("feed", "bus:2", '{"result":true}', tags=["bus:2"])
+
+    bus._on_notify(None, 0, bus.channel, json.dumps({"o": bus.origin, "t": ["bus:1"]}))
+    bus._on_notify(None, 0, bus.channel, json.dumps({"o": "other", "t": ["bus:2"]}))
+    await asyncio.gather(*bus._tasks)
+
+    assert await response_cache.get("feed", "bus:1") == '{"result":true}'
+    assert await response_cache.get("feed", "bus:2") is None
+
+
+async def test_foreign_event_reaches_local_subscribers():
+    bus = InvalidationBus()
+    subscription = broker.subscribe()
+    event = {"type": "like_added", "tweet_id": 1, "user_id": 2}
+
+    try:
+        bus._on_notify(None, 0, bus.channel, json.dumps({"o": bus.origin, "e": event}))
+        bus._on_notify(None, 0, bus.channel, json.dumps({"o": "other", "e": event}))
+
+        assert subscription.queue.qsize() == 1
+        assert await subscription.get() == event
+    finally:
+        broker.unsubscribe(subscription)
+
+
+class RecordingSession:
+    def __init__(self):
+        self.params = []
+
+    async def execute(self, statement, params):
+        self.params.append(params)
+
+
+async def test_publish_puts_event_into_notify_payload():
+    bus = InvalidationBus(enabled=True)
+    db = RecordingSession()
+    event = {"type": "tweet_created", "tweet_id": 1, "author_id": 2}
+
+    await bus.publish(db, tags=["feed"], event=event)
+
+    payload = json.loads(db.params[0]["payload"])
+    assert payload == {"o": bus.origin, "e": event, "t": ["feed"]}
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+from config import TEST_DATABASE_URL
+from sqlalchemy import event, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine
+from src.database import LazySession
+from src.limits import admission
+from src.models import User
+
+
+@pytest.fixture
+async def lazy_db():
+    engine = create_async_engine(TEST_DATABASE_URL, pool_size=2, max_overflow=0)
+    checkouts = []
+    event.listen(engine.sync_engine.pool, "checkout", lambda *args: checkouts.append(1))
+    session = LazySession(bind=engine, expire_on_commit=False)
+    session.checkouts = checkouts
+    try:
+        yield session
+    finally:
+        await session.close()
+        await engine.dispose()
+
+
+async def settle(db: LazySession):
+    await asyncio.gather(*db._release_tasks)
+
+
+async def test_consecutive_reads_share_one_connection(lazy_db):
+    active = admission.active
+
+    await lazy_db.execute(select(User.id))
+    await lazy_db.execute(select(User.id))
+    assert lazy_db.bind.pool.checkedout() == 1
+    assert admission.active == active + 1
+
+    await settle(lazy_db)
+    assert lazy_db.bind.pool.checkedout() == 0
+    assert admission.active == active
+    assert len(lazy_db.checkouts) == 1
+
+
+async def test_read_is_released_while_waiting_for_something_else(lazy_db):
+    await lazy_db.execute(select(User.id))
+    await asyncio.sleep(0.05)
+
+    assert lazy_db.bind.pool.checkedout() == 0
+    await lazy_db.execute(select(User.id))
+    assert len(lazy_db.checkouts) == 2
+
+
+async def test_write_holds_connection_until_commit(lazy_db):
+    lazy_db.add(User(api_key="lazy", username="lazy", name="l", surname="l"))
+    await lazy_db.flush()
+    await lazy_db.execute(update(User).where(User.api_key == "lazy").values(name="z"))
+    await asyncio.sleep(0.05)
+    assert lazy_db.bind.pool.checkedout() == 1
+
+    await lazy_db.commit()
+    assert lazy_db.bind.pool.checkedout() == 0
+
+
+async def test_integrity_error_rolls_back_and_releases(lazy_db):
+    active = admission.active
+    lazy_db.add(User(api_key="lazy_dup", username="d", name="d", surname="d"))
+    await lazy_db.commit()
+
+    lazy_db.add(User(api_key="lazy_dup", username="d", name="d", surname="d"))
+    with pytest.raises(IntegrityError):
+        await lazy_db.commit()
+    await lazy_db.rollback()
+
+    assert lazy_db.bind.pool.checkedout() == 0
+    assert admission.active == active
+
+
+async def test_stream_holds_connection_until_close(lazy_db):
+    result = await lazy_db.stream(select(User.id))
+    await asyncio.sleep(0.05)
+    assert lazy_db.bind.pool.checkedout() == 1
+
+    await result.all()
+    await lazy_db.close()
+    assert lazy_db.bind.pool.checkedout() == 0
@@ -0,0 +1,92 @@
+import pytest
+from fastapi import HTTPException
+from src import limits
+from src.limits import AdmissionController, ApiKeyRegistry, RateLimitMiddleware
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakePool:
+    def __init__(self, checkedout: int):
+        self.count = checkedout
+
+    def checkedout(self) -> int:
+        return self.count
+
+
+def test_rate_limiter_refills_tokens(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(limits.time, "monotonic", clock)
+    limiter = limits.RateLimiter(rate=2, burst=3, max_keys=10)
+
+    assert [limiter.acquire("a") for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("a") == pytest.approx(0.5)
+    assert limiter.acquire("b") == 0
+
+    clock.now += 0.5
+    assert limiter.acquire("a") == 0
+    assert limiter.acquire("a") > 0
+
+    clock.now += 10
+    assert [limiter.acquire("a") for _ in range(3)] == [0, 0, 0]
+
+
+def test_rate_limiter_evicts_least_recent_key(monkeypatch):
+    monkeypatch.setattr(limits.time, "monotonic", FakeClock())
+    limiter = limits.RateLimiter(rate=1, burst=1, max_keys=2)
+
+    limiter.acquire("a")
+    limiter.acquire("b")
+    limiter.acquire("a")
+    limiter.acquire("c")
+
+    assert list(limiter.buckets) == ["a", "c"]
+
+
+def test_rate_limit_key_uses_verified_user_or_address():
+    api_keys = ApiKeyRegistry(max_keys=10)
+    api_keys.remember("secret", 7)
+    middleware = RateLimitMiddleware(app=None, api_keys=api_keys)
+
+    def scope(api_key: bytes = None) -> dict:
+        headers = [(b"api-key", api_key)] if api_key else []
+        return {"headers": headers, "client": ("10.0.0.1", 5000)}
+
+    assert middleware._key(scope(b"secret")) == "user:7"
+    assert middleware._key(scope(b"made-up")) == "addr:10.0.0.1"
+    assert middleware._key(scope()) == "addr:10.0.0.1"
+
+
+async def test_verified_api_key_is_remembered(ac):
+    await ac.post(
+        "/users",
+        json={"api_key": "limits", "username": "l", "name": "l", "surname": "l"},
+    )
+    response = await ac.get("/users/me", headers={"api-key": "limits"})
+
+    assert limits.verified_api_keys.get("limits") == response.json()["user"]["id"]
+
+
+def test_admission_sheds_load_only_when_queue_is_long():
+    admission = AdmissionController(capacity=2, max_waiting=1, retry_after=3)
+
+    for _ in range(3):
+        admission.enter(FakePool(checkedout=0))
+    assert admission.waiting == 1
+
+    with pytest.raises(HTTPException) as exc:
+        admission.enter(FakePool(checkedout=2))
+    assert exc.value.status_code == 503
+    assert exc.value.headers == {"Retry-After": "3"}
+
+    admission.enter(FakePool(checkedout=1))
+    admission.exit()
+    admission.exit()
+    assert admission.waiting == 0
+    admission.enter(FakePool(checkedout=2))
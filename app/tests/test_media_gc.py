@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from sqlalchemy import func, select
+from src.media_gc import collect_orphaned_media
+from src.models import Media, User, add_tweet
+
+
+async def test_collect_orphaned_media(db):
+    user = User(api_key="gc", username="gc_username", name="gc", surname="gc")
+    uploaded_before = func.now() - timedelta(hours=2)
+    orphan = Media(
+        filename="a.jpg", data=b"a", mimetype="image/jpeg", created_at=uploaded_before
+    )
+    linked = Media(
+        filename="b.jpg", data=b"b", mimetype="image/jpeg", created_at=uploaded_before
+    )
+    fresh = Media(filename="c.jpg", data=b"c", mimetype="image/jpeg")
+    db.add_all([user, orphan, linked, fresh])
+    await db.commit()
+    await add_tweet(
+        db=db, user_id=user.id, tweet_data="gc", tweet_media_ids=[linked.id]
+    )
+
+    ids = [orphan.id, linked.id, fresh.id]
+
+    deleted = await collect_orphaned_media(db=db, grace_hours=1, batch_size=1)
+
+    remaining = await db.execute(select(Media.id).where(Media.id.in_(ids)))
+    assert deleted == 1
+    assert set(remaining.scalars()) == set(ids[1:])
@@ -0,0 +1,62 @@
+import msgpack
+from src import routes
+from src.negotiation import accepts_msgpack
+
+MSGPACK = {"accept": "application/msgpack"}
+
+
+async def test_accepts_msgpack_only_when_named():
+    assert accepts_msgpack("application/msgpack")
+    assert accepts_msgpack("application/json;q=0.5, application/x-msgpack")
+    assert not accepts_msgpack("application/json, */*")
+    assert not accepts_msgpack("application/msgpack;q=0.5, application/json")
+    assert not accepts_msgpack("application/msgpack;q=0")
+
+
+async def test_msgpack_body_and_feed_match_json(ac, monkeypatch):
+    await ac.post(
+        "/users",
+        content=msgpack.packb(
+            {"api_key": "msgpack", "username": "mp", "name": "m", "surname": "p"}
+        ),
+        headers={"content-type": "application/msgpack"},
+    )
+    headers = {"api-key": "msgpack"}
+    response = await ac.post(
+        "/tweets",
+        content=msgpack.packb({"tweet_data": "packed", "tweet_media_ids": []}),
+        headers={**headers, **MSGPACK, "content-type": "application/msgpack"},
+    )
+    assert response.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(response.content)["result"] is True
+
+    transcoded = []
+    monkeypatch.setattr(
+        routes, "transcode_json", lambda content: transcoded.append(content) or b""
+    )
+
+    # Промах кэша пакует модель ответа, попадание - перекодирует JSON из кэша
+    miss = await ac.get("/tweets?view=compact", headers={**headers, **MSGPACK})
+    assert transcoded == []
+    monkeypatch.undo()
+    hit = await ac.get("/tweets?view=compact", headers={**headers, **MSGPACK})
+    as_json = await ac.get("/tweets?view=compact", headers=headers)
+
+    assert miss.headers["content-type"] == "application/msgpack"
+    assert "Accept" in miss.headers["vary"]
+    assert msgpack.unpackb(miss.content) == as_json.json()
+    assert msgpack.unpackb(hit.content) == as_json.json()
+    assert miss.headers["etag"] != as_json.headers["etag"]
+
+
+async def test_profile_in_msgpack(ac):
+    await ac.post(
+        "/users",
+        json={"api_key": "msgpack_2", "username": "mp2", "name": "m", "surname": "p"},
+    )
+    headers = {"api-key": "msgpack_2"}
+
+    packed = await ac.get("/users/me", headers={**headers, **MSGPACK})
+    as_json = await ac.get("/users/me", headers=headers)
+
+    assert msgpack.unpackb(packed.content) == as_json.json()
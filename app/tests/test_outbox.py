@@ -0,0 +1,137 @@
+import asyncio
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from src import outbox, routes
+from src.models import (
+    OutboxEvent,
+    User,
+    UserSuggestion,
+    add_following,
+    add_outbox_event,
+)
+
+
+async def drain(db):
+    while await outbox.process_batch(db=db):
+        pass
+
+
+async def test_follow_drops_followee_from_suggestions(db):
+    alice = User(api_key="outbox_a", username="outbox_a", name="a", surname="")
+    bob = User(api_key="outbox_b", username="outbox_b", name="b", surname="")
+    db.add_all([alice, bob])
+    await db.flush()
+    db.add(UserSuggestion(user_id=alice.id, rank=1, candidate_id=bob.id, score=1.0))
+    await db.commit()
+
+    await add_following(db=db, user_follower_id=alice.id, user_followee_id=bob.id)
+    await drain(db)
+
+    suggestions = await db.execute(
+        select(UserSuggestion).where(UserSuggestion.user_id == alice.id)
+    )
+    assert suggestions.scalars().all() == []
+
+
+async def test_concurrent_workers_claim_each_event_once(db, monkeypatch):
+    await drain(db)
+    handled = []
+
+    async def handler(db, payload):
+        handled.append(payload["n"])
+        await asyncio.sleep(0.1)
+
+    monkeypatch.setitem(outbox.handlers, "test_claim", [handler])
+    for n in range(6):
+        add_outbox_event(db, "test_claim", n=n)
+    await db.commit()
+
+    async def worker():
+        async with AsyncSession(bind=db.bind) as session:
+            return await outbox.process_batch(db=session, batch_size=3)
+
+    assert await asyncio.gather(worker(), worker()) == [3, 3]
+    assert sorted(handled) == list(range(6))
+    assert await outbox.process_batch(db=db) == 0
+
+
+async def test_failed_event_is_retried_then_dead_lettered(db, monkeypatch):
+    await drain(db)
+    calls = []
+
+    async def handler(db, payload):
+        calls.append(payload)
+        raise RuntimeError("boom")
+
+    monkeypatch.setitem(outbox.handlers, "test_retry", [handler])
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 2)
+    add_outbox_event(db, "test_retry", n=1)
+    await db.commit()
+
+    assert await outbox.process_batch(db=db) == 1
+    event = (
+        await db.execute(select(OutboxEvent).where(OutboxEvent.topic == "test_retry"))
+    ).scalar_one()
+    await db.refresh(event)
+    assert event.attempts == 1
+    assert "boom" in event.last_error
+    assert event.failed_at is None
+    delayed = await db.execute(
+        select(OutboxEvent.available_at > func.now()).where(OutboxEvent.id == event.id)
+    )
+    assert delayed.scalar()
+
+    # Отложенное событие не забирается до available_at
+    assert await outbox.process_batch(db=db) == 0
+    await db.execute(
+        update(OutboxEvent)
+        .where(OutboxEvent.id == event.id)
+        .values(available_at=func.now())
+    )
+    await db.commit()
+
+    assert await outbox.process_batch(db=db) == 1
+    await db.refresh(event)
+    assert event.attempts == 2
+    assert event.failed_at is not None
+    assert await outbox.process_batch(db=db) == 0
+    assert len(calls) == 2
+
+    stats = await outbox.outbox_stats(db=db)
+    assert stats["failed"] >= 1
+
+
+async def test_outbox_stats_require_admin_key(ac, monkeypatch):
+    monkeypatch.setattr(routes, "ADMIN_API_KEY", "admin")
+
+    assert (await ac.get(url="/outbox/stats")).status_code == 403
+    response = await ac.get(url="/outbox/stats", headers={"api-key": "wrong"})
+    assert response.status_code == 403
+
+    response = await ac.get(url="/outbox/stats", headers={"api-key": "admin"})
+    assert response.status_code == 200
+    assert set(response.json()["stats"]) == {
+        "pending",
+        "failed",
+        "oldest_pending_seconds",
+    }
+
+
+async def test_tweets_and_likes_write_no_unconsumed_events(ac, db):
+    await drain(db)
+    body = {"api_key": "outbox_c", "username": "outbox_c", "name": "c", "surname": ""}
+    await ac.post(url="/users", json=body)
+    response = await ac.post(
+        url="/tweets",
+        headers={"api-key": "outbox_c"},
+        json={"tweet_data": "quiet", "tweet_media_ids": []},
+    )
+    tweet_id = response.json()["tweet_id"]
+    await ac.post(url=f"/tweets/{tweet_id}/likes", headers={"api-key": "outbox_c"})
+    await ac.delete(url=f"/tweets/{tweet_id}", headers={"api-key": "outbox_c"})
+
+    topics = await db.execute(
+        select(OutboxEvent.topic).where(OutboxEvent.failed_at.is_(None))
+    )
+    assert list(topics.scalars()) == []
@@ -0,0 +1,68 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.partitions import ensure_tweet_partitions, maintain_partitions
+
+# Секционированные таблицы в отдельной схеме: в тестах основная схема
+# создается через create_all, без секций
+SCHEMA = (
+    "CREATE SCHEMA partitions_test",
+    "SET search_path TO partitions_test",
+    "CREATE SEQUENCE tweets_id_seq",
+    """
+    CREATE TABLE tweets (
+        id integer NOT NULL DEFAULT nextval('tweets_id_seq'),
+        created_at timestamptz NOT NULL DEFAULT now(),
+        PRIMARY KEY (id)
+    ) PARTITION BY RANGE (id)
+    """,
+    "CREATE TABLE likes (id serial, tweet_id integer REFERENCES tweets (id))",
+    "CREATE TABLE comments (id serial, tweet_id integer REFERENCES tweets (id))",
+    """
+    CREATE TABLE tweet_media (
+        tweet_id integer REFERENCES tweets (id) ON DELETE CASCADE,
+        position integer,
+        media_id integer
+    )
+    """,
+)
+
+
+async def test_archive_old_partitions(db: AsyncSession):
+    async with db.bind.connect() as connection:
+        try:
+            for statement in SCHEMA:
+                await connection.execute(text(statement))
+            await connection.commit()
+
+            session = AsyncSession(bind=connection)
+            await ensure_tweet_partitions(session, size=10, ahead=1)
+            await session.execute(
+                text(
+                    "INSERT INTO tweets (id, created_at) SELECT id, "
+                    "now() - interval '3 days' FROM generate_series(1, 9) id"
+                )
+            )
+            await session.execute(text("INSERT INTO tweets (id) VALUES (12)"))
+            await session.execute(text("INSERT INTO likes (tweet_id) VALUES (1), (12)"))
+            await session.execute(
+                text("INSERT INTO tweet_media VALUES (1, 1, 100), (12, 1, 200)")
+            )
+            await session.commit()
+
+            result = await maintain_partitions(db=session, archive_days=1)
+
+            assert result["archived"] == ["tweets_from_0"]
+            remaining = await session.execute(text("SELECT id FROM tweets"))
+            assert remaining.scalars().all() == [12]
+            archived = await session.execute(
+                text("SELECT media_id FROM archive.tweet_media_tweets_from_0")
+            )
+            assert archived.scalars().all() == [100]
+            likes = await session.execute(text("SELECT tweet_id FROM likes"))
+            assert likes.scalars().all() == [12]
+            await session.close()
+        finally:
+            await connection.rollback()
+            await connection.execute(text("DROP SCHEMA partitions_test CASCADE"))
+            await connection.execute(text("DROP SCHEMA IF EXISTS archive CASCADE"))
+            await connection.commit()
@@ -0,0 +1,92 @@
+import asyncio
+import re
+
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from src import profiling
+from src.profiling import ProfilerMiddleware
+
+api = FastAPI()
+seen_busy = []
+
+
+@api.get("/items/{id}")
+async def get_item(id: int):
+    return {"id": id}
+
+
+@api.get("/stream")
+async def stream():
+    return {}
+
+
+@api.get("/slow")
+async def slow():
+    await asyncio.sleep(0.2)
+    seen_busy.append(middleware.busy)
+    return {}
+
+
+middleware = ProfilerMiddleware(api, sample_rate=0, skip_paths=["/stream"])
+
+
+async def get(path: str, headers: dict = None):
+    async with AsyncClient(
+        transport=ASGITransport(app=middleware), base_url="http://test"
+    ) as client:
+        response = await client.get(path, headers=headers)
+    assert response.status_code == 200
+
+
+def setup(monkeypatch, tmp_path, **options):
+    monkeypatch.setattr(profiling, "Profiler", None)
+    monkeypatch.setattr(profiling, "ADMIN_API_KEY", "admin")
+    monkeypatch.setattr(middleware, "profile_dir", str(tmp_path))
+    for name, value in options.items():
+        monkeypatch.setattr(middleware, name, value)
+
+
+async def test_profiles_only_with_header_and_admin_key(monkeypatch, tmp_path):
+    setup(monkeypatch, tmp_path)
+
+    await get("/items/1")
+    await get("/items/1", headers={"x-profile": "1", "api-key": "wrong"})
+    await get("/items/1", headers={"api-key": "admin"})
+    assert list(tmp_path.iterdir()) == []
+
+    await get("/items/1", headers={"x-profile": "1", "api-key": "admin"})
+    [profile] = tmp_path.iterdir()
+    # Имя по шаблону маршрута, а не по конкретному id
+    assert re.fullmatch(r"\d{8}T\d{6}_GET_items_id_\d+ms\.pstats", profile.name)
+    assert not middleware.busy
+
+
+async def test_busy_middleware_skips_profiling(monkeypatch, tmp_path):
+    setup(monkeypatch, tmp_path, busy=True)
+
+    await get("/items/1", headers={"x-profile": "1", "api-key": "admin"})
+
+    assert list(tmp_path.iterdir()) == []
+
+
+async def test_sampling_skips_streaming_paths(monkeypatch, tmp_path):
+    setup(monkeypatch, tmp_path, sample_rate=1.0)
+
+    await get("/stream")
+    assert list(tmp_path.iterdir()) == []
+
+    await get("/items/2")
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+async def test_long_request_profile_stops_at_max_seconds(monkeypatch, tmp_path):
+    setup(monkeypatch, tmp_path, max_seconds=0.05)
+    seen_busy.clear()
+
+    await get("/slow", headers={"x-profile": "1", "api-key": "admin"})
+
+    # К концу запроса профиль уже остановлен и другие запросы можно профилировать
+    assert seen_busy == [False]
+    [profile] = tmp_path.iterdir()
+    elapsed = int(re.search(r"_(\d+)ms\.", profile.name).group(1))
+    assert elapsed < 200
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+import pytest
+from config import SCORE_GRAVITY
+from sqlalchemy import func, select
+from src.models import Tweet, User, refresh_tweet_scores
+
+
+async def test_refresh_tweet_scores(db):
+    user = User(api_key="scores", username="scores", name="s", surname="s")
+    db.add(user)
+    await db.commit()
+
+    hour_old = Tweet(
+        user_id=user.id,
+        text="hour old",
+        like_count=3,
+        created_at=func.now() - timedelta(hours=1),
+    )
+    # Рейтинг, посчитанный, пока твит был в окне
+    stale = Tweet(
+        user_id=user.id,
+        text="stale",
+        like_count=50,
+        score=5,
+        created_at=func.now() - timedelta(days=10),
+    )
+    unliked = Tweet(user_id=user.id, text="unliked")
+    db.add_all([hour_old, stale, unliked])
+    await db.commit()
+    ids = [hour_old.id, stale.id, unliked.id]
+
+    await refresh_tweet_scores(db=db, window_days=7)
+
+    scores = await db.execute(select(Tweet.id, Tweet.score).where(Tweet.id.in_(ids)))
+    scores = dict(scores.all())
+    assert scores[ids[0]] == pytest.approx(3 / 3**SCORE_GRAVITY, rel=1e-3)
+    assert scores[ids[1]] == 0
+    assert scores[ids[2]] == 0
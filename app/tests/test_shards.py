@@ -0,0 +1,176 @@
+import pytest
+from config import TEST_DATABASE_URL
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from src.cache import response_cache
+from src.database import shard_router
+from src.models import Base, Like, Tweet, User, merge_shard_tweets
+
+
+@pytest.fixture
+async def two_shards(db, monkeypatch):
+    """Второй шард - схема shard_1 в тестовой БД, шард 0 - сама тестовая БД"""
+    async with db.bind.begin() as conn:
+        await conn.execute(text("DROP SCHEMA IF EXISTS shard_1 CASCADE"))
+        await conn.execute(text("CREATE SCHEMA shard_1"))
+    shard_engine = create_async_engine(
+        TEST_DATABASE_URL,
+        poolclass=NullPool,
+        connect_args={"server_settings": {"search_path": "shard_1"}},
+    )
+    async with shard_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    engines = [db.bind, shard_engine]
+    monkeypatch.setattr(shard_router, "engines", engines)
+    monkeypatch.setattr(
+        shard_router,
+        "sessionmakers",
+        [
+            sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+            for engine in engines
+        ],
+    )
+    await shard_router.align_tweet_sequences()
+    await response_cache.clear()
+    yield shard_router.sessionmakers
+
+    await response_cache.clear()
+    async with db.bind.begin() as conn:
+        await conn.execute(text("ALTER SEQUENCE tweets_id_seq INCREMENT BY 1"))
+        await conn.execute(text("DROP SCHEMA shard_1 CASCADE"))
+    await shard_engine.dispose()
+
+
+def test_merge_shard_tweets_keeps_score_order_newest_first():
+    shard_0 = [{"id": 2, "score": 5.0}, {"id": 4, "score": 1.0}]
+    shard_1 = [{"id": 1, "score": 5.0}, {"id": 3, "score": 2.0}]
+
+    merged = merge_shard_tweets([shard_0, shard_1])
+
+    assert [tweet["id"] for tweet in merged] == [2, 1, 3, 4]
+    assert merge_shard_tweets([shard_0]) is shard_0
+
+
+def test_export_plan_reads_every_shard(monkeypatch):
+    from src.database import shard_router
+    from src.export import decode_cursor, encode_cursor, export_plan
+
+    monkeypatch.setattr(shard_router, "engines", shard_router.engines * 2)
+
+    plan = [(record_type, shard) for record_type, _, _, shard in export_plan(3)]
+
+    assert plan == [
+        ("tweet", 1),
+        ("like", 0),
+        ("like", 1),
+        ("following", 0),
+        ("follower", 0),
+    ]
+    assert decode_cursor(encode_cursor(4, 7)) == (4, 7)
+
+
+def test_import_rejects_tweet_outside_author_shard(monkeypatch):
+    from src.bulk_import import BulkImporter
+    from src.database import shard_router
+
+    monkeypatch.setattr(shard_router, "engines", shard_router.engines * 2)
+    importer = BulkImporter(db=None)
+
+    importer.add_line(b'{"type": "tweet", "id": 4, "user_id": 3, "text": "a"}')
+    importer.add_line(b'{"type": "tweet", "id": 5, "user_id": 3, "text": "b"}')
+
+    assert importer.stats["invalid"] == 1
+    assert [tweet[0] for tweet in importer.tweets[1]] == [5]
+
+
+async def test_add_user_removes_user_when_replication_fails(db, monkeypatch):
+    from sqlalchemy import select
+    from src import models
+
+    async def fail_replication(db, ids=None):
+        raise RuntimeError("shard is down")
+
+    monkeypatch.setattr(models, "replicate_users", fail_replication)
+    with pytest.raises(RuntimeError):
+        await models.add_user(
+            db=db, api_key="replica", username="replica", name="r", surname="r"
+        )
+
+    users = await db.execute(
+        select(models.User).where(models.User.api_key == "replica")
+    )
+    assert users.first() is None
+
+    monkeypatch.undo()
+    user = await models.add_user(
+        db=db, api_key="replica", username="replica", name="r", surname="r"
+    )
+    assert user.id
+
+
+async def test_two_shards_route_by_user_and_merge_feed(two_shards, ac):
+    users = {}
+    for api_key in ("shard_a", "shard_b"):
+        body = {"api_key": api_key, "username": api_key, "name": "n", "surname": "s"}
+        users[api_key] = (await ac.post(url="/users", json=body)).json()["id"]
+    assert {user_id % 2 for user_id in users.values()} == {0, 1}
+
+    tweets = {}
+    for api_key, user_id in users.items():
+        response = await ac.post(
+            url="/tweets",
+            headers={"api-key": api_key},
+            json={"tweet_data": api_key, "tweet_media_ids": []},
+        )
+        tweets[user_id] = response.json()["tweet_id"]
+    other_tweet = tweets[users["shard_b"]]
+    await ac.post(url=f"/tweets/{other_tweet}/likes", headers={"api-key": "shard_a"})
+
+    for shard, maker in enumerate(two_shards):
+        async with maker() as shard_db:
+            # Пользователи есть в каждом шарде, твиты - только в шарде автора
+            replicated = await shard_db.execute(
+                select(User.id).where(User.id.in_(users.values()))
+            )
+            assert sorted(replicated.scalars()) == sorted(users.values())
+
+            stored = await shard_db.execute(
+                select(Tweet.id, Tweet.user_id).where(Tweet.id.in_(tweets.values()))
+            )
+            for tweet_id, user_id in stored:
+                assert tweet_id % 2 == user_id % 2 == shard
+
+            likes = await shard_db.execute(
+                select(func.count()).where(Like.tweet_id == other_tweet)
+            )
+            assert likes.scalar() == (1 if other_tweet % 2 == shard else 0)
+
+    likers = (await ac.get(url=f"/tweets/{other_tweet}/likes")).json()
+    assert [like["name"] for like in likers["likes"]] == ["shard_a"]
+
+    multiget = await ac.get(url=f"/tweets?ids={other_tweet},{tweets[users['shard_a']]}")
+    assert [tweet["id"] for tweet in multiget.json()["tweets"]] == [
+        other_tweet,
+        tweets[users["shard_a"]],
+    ]
+
+    # Лента собирается со всех шардов в общем порядке рейтинга
+    feed = await ac.get(url="/tweets", headers={"api-key": "shard_a"})
+    feed_ids = [tweet["id"] for tweet in feed.json()["tweets"]]
+    scores = {}
+    for maker in two_shards:
+        async with maker() as shard_db:
+            rows = await shard_db.execute(select(Tweet.id, Tweet.score))
+            scores.update(dict(rows.all()))
+    assert sorted(feed_ids) == sorted(scores)
+    assert feed_ids == sorted(scores, key=lambda id: (-scores[id], -id))
+
+    response = await ac.delete(
+        url=f"/tweets/{other_tweet}", headers={"api-key": "shard_b"}
+    )
+    assert response.json() == {"result": True}
+    async with two_shards[other_tweet % 2]() as shard_db:
+        assert await shard_db.get(Tweet, other_tweet) is None
@@ -0,0 +1,20 @@
+import asyncio
+
+from src.singleflight import SingleFlight
+
+
+async def test_concurrent_calls_coalesced():
+    flight = SingleFlight()
+    calls = 0
+
+    async def query():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(*(flight.do("key", query) for _ in range(10)))
+
+    assert calls == 1
+    assert results == [1] * 10
+    assert not flight.in_flight
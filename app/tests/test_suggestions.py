@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from config import SUGGESTIONS_TOP_K
+from httpx import AsyncClient
+from src.suggestions import (
+    build_matrix,
+    compute_suggestions,
+    drop_popular_tweets,
+    top_k,
+)
+
+
+def collect(blocks) -> dict:
+    suggestions = {}
+    for user_ids, candidate_ids, scores, ranks in blocks:
+        for user_id, candidate_id, score, rank in zip(
+            user_ids, candidate_ids, scores, ranks
+        ):
+            suggestions.setdefault(int(user_id), []).append(
+                (int(rank), int(candidate_id), float(score))
+            )
+    return {user_id: sorted(items) for user_id, items in suggestions.items()}
+
+
+async def test_top_k_orders_by_score_then_candidate():
+    rows = np.array([0, 0, 0, 1, 1])
+    cols = np.array([5, 3, 4, 2, 7])
+    data = np.array([1.0, 2.0, 2.0, 1.0, 3.0])
+
+    rows, cols, data, ranks = top_k(rows, cols, data, k=2)
+
+    assert rows.tolist() == [0, 0, 1, 1]
+    assert cols.tolist() == [3, 4, 7, 2]
+    assert data.tolist() == [2.0, 2.0, 3.0, 1.0]
+    assert ranks.tolist() == [0, 1, 0, 1]
+
+
+async def test_compute_suggestions_on_fixed_graph():
+    # 0 -> 1, 1 -> 2, 1 -> 3, 2 -> 3; 0 и 4 лайкнули твит 0
+    follows = build_matrix(np.array([[0, 1], [1, 2], [1, 3], [2, 3]]), shape=(5, 5))
+    likes = build_matrix(np.array([[0, 0], [4, 0]]), shape=(5, 1))
+
+    suggestions = collect(
+        compute_suggestions(follows, likes, top=2, co_like_weight=0.5, block_size=2)
+    )
+
+    # Подписки подписок, затем со-лайкеры; себя и уже подписанных нет
+    assert suggestions == {
+        0: [(0, 2, 1.0), (1, 3, 1.0)],
+        4: [(0, 0, 0.5)],
+    }
+
+    suggestions = collect(
+        compute_suggestions(follows, likes, top=5, co_like_weight=0.5, block_size=2)
+    )
+    assert suggestions[0] == [(0, 2, 1.0), (1, 3, 1.0), (2, 4, 0.5)]
+
+
+async def test_popular_tweets_do_not_pair_likers():
+    follows = build_matrix(np.empty((0, 2), dtype=np.int64), shape=(4, 4))
+    # Твит 0 лайкнули все, твит 1 - только 0 и 1
+    likes = build_matrix(
+        np.array([[0, 0], [1, 0], [2, 0], [3, 0], [0, 1], [1, 1]]), shape=(4, 2)
+    )
+
+    likes = drop_popular_tweets(likes, max_likers=2)
+    suggestions = collect(compute_suggestions(follows, likes, co_like_weight=1.0))
+
+    assert suggestions == {0: [(0, 1, 1.0)], 1: [(0, 0, 1.0)]}
+
+
+@pytest.mark.parametrize("limit", [0, -1, SUGGESTIONS_TOP_K + 1])
+async def test_suggestions_limit_validation(ac: AsyncClient, limit: int):
+    response = await ac.get(
+        url=f"/users/me/suggestions?limit={limit}", headers={"api-key": "test"}
+    )
+
+    assert response.status_code == 422
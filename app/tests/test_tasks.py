@@ -0,0 +1,21 @@
+from sqlalchemy import text
+from src import tasks
+
+
+async def test_score_refresh_skips_when_another_worker_holds_lock(db, monkeypatch):
+    calls = []
+
+    async def refresh_tweet_scores(db, window_days):
+        calls.append(window_days)
+        await db.commit()
+
+    monkeypatch.setattr(tasks, "refresh_tweet_scores", refresh_tweet_scores)
+
+    async with db.bind.connect() as other_worker:
+        await other_worker.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), {"key": tasks.SCORES_LOCK_KEY}
+        )
+        assert not await tasks.refresh_scores_locked(db=db, window_days=7)
+
+    assert await tasks.refresh_scores_locked(db=db, window_days=7)
+    assert calls == [7]